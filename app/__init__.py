@@ -1,24 +1,14 @@
 """
 Hot Spot Wi-Fi Manager
-Flask application initialization
+Core Wi-Fi, diagnostics and database modules. They do not import Flask, so
+the CLI and background tools start quickly; the web application is in
+app.web and is only built when app.app or app.auth is first used.
 """
-from flask import Flask
-from flask_httpauth import HTTPBasicAuth
-import os
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.urandom(24)
-auth = HTTPBasicAuth()
 
-# Authentication credentials
-USERS = {
-    "JLBMaritime": "Admin"
-}
-
-@auth.verify_password
-def verify_password(username, password):
-    if username in USERS and USERS[username] == password:
-        return username
-    return None
-
-from app import routes
+def __getattr__(name):
+    # Lazy access to the Flask app for `from app import app`
+    if name in ('app', 'auth'):
+        from app import web
+        return getattr(web, name)
+    raise AttributeError(f"module 'app' has no attribute '{name}'")
@@ -0,0 +1,220 @@
+"""
+Static Asset Pipeline
+Copies the web interface's static files to content-hashed names with gzip
+and brotli variants, so they can be cached forever and sent compressed
+without compressing on every request.
+
+Run `python3 -m app.assets` to build ahead of time; run.py builds on
+startup, and only writes what changed. Importing the web app writes nothing:
+it serves whatever the last build left.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from app import config
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without it only gzip variants are built
+    brotli = None
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(APP_DIR, 'static')
+
+# Assets referenced by the web interface, relative to the static directory
+ASSETS = ('css/style.css', 'js/app.js', 'logo.png')
+
+# Already-compressed formats like PNG gain nothing from another pass
+COMPRESSIBLE = ('.css', '.js', '.html', '.svg', '.json', '.txt')
+
+# Preferred first when the client accepts several
+ENCODINGS = ('br', 'gzip')
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+HASH_LENGTH = 12
+MANIFEST_NAME = 'manifest.json'
+
+
+def build_dir():
+    """Directory the hashed files and their variants are written to"""
+    return config.ASSET_BUILD_DIR or os.path.join(STATIC_DIR, 'build')
+
+
+def hashed_name(name, digest):
+    """'js/app.js' -> 'js/app.<digest>.js'"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+
+def compress(data, encoding):
+    """Compress data at the highest level; files are built once, not per request"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    # mtime=0 keeps the output, and so the file, identical across builds
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _write(path, data):
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _prune(directory, name, keep):
+    """Remove earlier builds of an asset"""
+    stem, ext = os.path.splitext(os.path.basename(name))
+    pattern = re.compile(rf"{re.escape(stem)}\.[0-9a-f]{{{HASH_LENGTH}}}{re.escape(ext)}(\.gz|\.br)?$")
+    folder = os.path.join(directory, os.path.dirname(name))
+    for entry in os.listdir(folder):
+        if pattern.match(entry) and not entry.startswith(os.path.basename(keep)):
+            os.unlink(os.path.join(folder, entry))
+
+
+def build(static_dir=None, output_dir=None):
+    """Build hashed copies and compressed variants of ASSETS
+
+    Returns the manifest: {name: {'path': hashed name, 'etag': digest,
+    'encodings': [...]}}. Missing source files are left out, so the page
+    falls back to the plain static URL for them.
+    """
+    static_dir = static_dir or STATIC_DIR
+    output_dir = output_dir or build_dir()
+    manifest = {}
+    for name in ASSETS:
+        try:
+            with open(os.path.join(static_dir, name), 'rb') as f:
+                data = f.read()
+        except OSError:
+            continue
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        path = hashed_name(name, digest)
+        target = os.path.join(output_dir, path)
+        _write(target, data)
+
+        encodings = []
+        if name.endswith(COMPRESSIBLE):
+            for encoding in ENCODINGS:
+                if encoding == 'br' and brotli is None:
+                    continue
+                compressed = compress(data, encoding)
+                # Not worth a variant unless it is actually smaller
+                if len(compressed) < len(data):
+                    _write(target + SUFFIXES[encoding], compressed)
+                    encodings.append(encoding)
+        _prune(output_dir, name, path)
+        manifest[name] = {'path': path, 'etag': digest, 'encodings': encodings}
+
+    _write_manifest(output_dir, manifest)
+    return manifest
+
+
+def _write_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def load_manifest(output_dir=None):
+    """Manifest written by the last build, or {} if there is none"""
+    try:
+        with open(os.path.join(output_dir or build_dir(), MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def negotiate(accept_encoding, available):
+    """Best of the available encodings the client accepts, or None for identity
+
+    accept_encoding is the raw Accept-Encoding header; codings with q=0 are
+    refused.
+    """
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        quality = 1.0
+        match = re.search(r'q=([0-9.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding] = quality
+    for encoding in ENCODINGS:
+        if encoding in available and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+class AssetIndex:
+    """Lookup from hashed path to the file to send, built once at startup"""
+
+    def __init__(self, manifest=None, output_dir=None):
+        self.output_dir = output_dir or build_dir()
+        self.manifest = manifest if manifest is not None else load_manifest(self.output_dir)
+        self._by_path = {entry['path']: (name, entry) for name, entry in self.manifest.items()}
+
+    def url_path(self, name):
+        """Hashed path of an asset, or None if it was not built"""
+        entry = self.manifest.get(name)
+        return entry['path'] if entry else None
+
+    def resolve(self, path, accept_encoding):
+        """(file path, original name, encoding or None, etag) or None if unknown"""
+        found = self._by_path.get(path)
+        if found is None:
+            return None
+        name, entry = found
+        encoding = negotiate(accept_encoding, entry['encodings'])
+        file_path = os.path.join(self.output_dir, entry['path'])
+        etag = entry['etag']
+        if encoding:
+            file_path += SUFFIXES[encoding]
+            # Each representation gets its own strong validator
+            etag = f"{etag}-{encoding}"
+        return file_path, name, encoding, etag
+
+
+_index = None
+
+
+def get_index():
+    """The process-wide index, loaded from the last build on first use"""
+    global _index
+    if _index is None:
+        _index = AssetIndex()
+    return _index
+
+
+def build_index():
+    """Build the assets and make them the process-wide index, falling back to
+    the last build if the build directory is not writable (an empty index
+    means plain static URLs)"""
+    global _index
+    try:
+        _index = AssetIndex(build())
+    except OSError as e:
+        print(f"Error building static assets: {e}")
+        _index = AssetIndex()
+    return _index
+
+
+if __name__ == '__main__':
+    result = build()
+    for asset, info in sorted(result.items()):
+        variants = ', '.join(info['encodings']) or 'uncompressed only'
+        print(f"{asset} -> {info['path']} ({variants})")
+    if brotli is None:
+        print("brotli module not installed, brotli variants skipped")
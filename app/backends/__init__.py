@@ -0,0 +1,46 @@
+"""
+NetworkManager Backends
+Pluggable implementations of the low-level WiFi operations used by wifi_manager
+"""
+import threading
+
+from app import config
+from app.backends.nmcli import NmcliBackend
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name=None, interface=None):
+    """Create a backend by name ('dbus', 'nmcli' or 'auto')"""
+    name = name or config.WIFI_BACKEND
+    interface = interface or config.WIFI_INTERFACE
+
+    if name in ('dbus', 'auto'):
+        try:
+            from app.backends.nm_dbus import NetworkManagerDBusBackend
+            return NetworkManagerDBusBackend(interface, config.DBUS_ADDRESS or None)
+        except Exception as e:
+            # dbus-python missing or NetworkManager unreachable
+            if name == 'dbus':
+                raise
+            print(f"D-Bus backend unavailable, falling back to nmcli: {e}")
+
+    return NmcliBackend(interface)
+
+
+def get_backend():
+    """Get the process-wide backend, creating it on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """Replace the process-wide backend (used by tests and tools)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
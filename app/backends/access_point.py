@@ -0,0 +1,44 @@
+"""
+Access Point Model
+Per-BSSID scan entries shared by all backends
+"""
+
+
+def channel_from_frequency(frequency):
+    """IEEE 802.11 channel number for a centre frequency in MHz (0 if unknown)"""
+    if frequency == 2484:
+        return 14
+    if 2412 <= frequency <= 2472:
+        return (frequency - 2407) // 5
+    if 5000 <= frequency < 5925:
+        return (frequency - 5000) // 5
+    if 5950 <= frequency <= 7125:
+        return (frequency - 5950) // 5
+    return 0
+
+
+def band_from_frequency(frequency):
+    """Band label ('2.4 GHz', '5 GHz' or '6 GHz') for a frequency in MHz"""
+    if frequency < 3000:
+        return '2.4 GHz'
+    if frequency < 5925:
+        return '5 GHz'
+    return '6 GHz'
+
+
+def access_point(ssid, bssid, signal, security, frequency, rate):
+    """Build one scan entry
+
+    signal is 0-100, frequency in MHz, rate the maximum bitrate in Mbit/s
+    and security the raw security description ('' for open networks).
+    """
+    return {
+        'ssid': ssid,
+        'bssid': bssid.upper(),
+        'signal': int(signal),
+        'security': security,
+        'frequency': int(frequency),
+        'channel': channel_from_frequency(int(frequency)),
+        'band': band_from_frequency(int(frequency)),
+        'rate': rate,
+    }
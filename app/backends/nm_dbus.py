@@ -0,0 +1,276 @@
+"""
+NetworkManager D-Bus Backend
+Talks to NetworkManager directly over one persistent D-Bus connection
+"""
+import threading
+import time
+
+import dbus
+import dbus.bus
+
+from app.backends.access_point import access_point
+from app.connect_timing import PhaseTimer
+
+NM_BUS_NAME = 'org.freedesktop.NetworkManager'
+NM_PATH = '/org/freedesktop/NetworkManager'
+NM_SETTINGS_PATH = '/org/freedesktop/NetworkManager/Settings'
+NM_IFACE = 'org.freedesktop.NetworkManager'
+NM_SETTINGS_IFACE = 'org.freedesktop.NetworkManager.Settings'
+NM_CONNECTION_IFACE = 'org.freedesktop.NetworkManager.Settings.Connection'
+NM_DEVICE_IFACE = 'org.freedesktop.NetworkManager.Device'
+NM_WIRELESS_IFACE = 'org.freedesktop.NetworkManager.Device.Wireless'
+NM_AP_IFACE = 'org.freedesktop.NetworkManager.AccessPoint'
+NM_ACTIVE_IFACE = 'org.freedesktop.NetworkManager.Connection.Active'
+PROPS_IFACE = 'org.freedesktop.DBus.Properties'
+
+# NMDeviceState value once association and authentication are done
+DEVICE_STATE_IP_CONFIG = 70
+
+# NMActiveConnectionState values
+ACTIVE_STATE_ACTIVATED = 2
+ACTIVE_STATE_DEACTIVATED = 4
+
+NM_802_11_AP_FLAGS_PRIVACY = 0x1
+
+CONNECT_TIMEOUT = 30
+
+
+def _ssid_to_str(raw):
+    """Convert an SSID byte array from D-Bus into a string"""
+    return bytes(int(b) for b in raw).decode('utf-8', errors='replace')
+
+
+class NetworkManagerDBusBackend:
+    """NetworkManager access without forking, via the system D-Bus"""
+
+    name = 'dbus'
+
+    def __init__(self, interface='wlan0', bus_address=None):
+        self.interface = interface
+        if bus_address:
+            self.bus = dbus.bus.BusConnection(bus_address)
+        else:
+            self.bus = dbus.SystemBus()
+        self._lock = threading.RLock()
+        self._nm = dbus.Interface(self.bus.get_object(NM_BUS_NAME, NM_PATH), NM_IFACE)
+        self._settings = dbus.Interface(
+            self.bus.get_object(NM_BUS_NAME, NM_SETTINGS_PATH), NM_SETTINGS_IFACE
+        )
+        self._device_path = self._nm.GetDeviceByIpIface(interface)
+
+    def _get(self, path, iface, prop):
+        """Read a single property of a NetworkManager object"""
+        obj = self.bus.get_object(NM_BUS_NAME, path)
+        return obj.Get(iface, prop, dbus_interface=PROPS_IFACE)
+
+    def _get_all(self, path, iface):
+        """Read all properties of a NetworkManager object"""
+        obj = self.bus.get_object(NM_BUS_NAME, path)
+        return obj.GetAll(iface, dbus_interface=PROPS_IFACE)
+
+    def _wireless(self):
+        return dbus.Interface(self.bus.get_object(NM_BUS_NAME, self._device_path), NM_WIRELESS_IFACE)
+
+    def _find_connections(self, ssid):
+        """Return settings paths of saved wifi profiles matching an SSID or name"""
+        matches = []
+        for path in self._settings.ListConnections():
+            conn = dbus.Interface(self.bus.get_object(NM_BUS_NAME, path), NM_CONNECTION_IFACE)
+            settings = conn.GetSettings()
+            if settings['connection'].get('type') != '802-11-wireless':
+                continue
+            wireless = settings.get('802-11-wireless', {})
+            profile_ssid = _ssid_to_str(wireless.get('ssid', []))
+            if profile_ssid == ssid or settings['connection'].get('id') == ssid:
+                matches.append(path)
+        return matches
+
+    def _wait_for_activation(self, active_path, timer, timeout=CONNECT_TIMEOUT):
+        """Block until an active connection is up, returns (success, error)
+
+        The device state tells association apart from IP configuration, which
+        are timed as separate phases.
+        """
+        timer.start('associate')
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                state = int(self._get(active_path, NM_ACTIVE_IFACE, 'State'))
+            except dbus.exceptions.DBusException:
+                # The active connection object disappears when activation fails
+                return False, "Connection activation failed"
+            if state == ACTIVE_STATE_ACTIVATED:
+                return True, ""
+            if state == ACTIVE_STATE_DEACTIVATED:
+                return False, "Connection activation failed"
+            if timer.current == 'associate':
+                try:
+                    device_state = int(self._get(self._device_path, NM_DEVICE_IFACE, 'State'))
+                except dbus.exceptions.DBusException:
+                    device_state = 0
+                if device_state >= DEVICE_STATE_IP_CONFIG:
+                    timer.start('ip_config')
+            time.sleep(0.1)
+        return False, "Connection timed out"
+
+    def _access_points(self):
+        """(path, properties) of every access point currently visible"""
+        access_points = []
+        for ap_path in self._wireless().GetAllAccessPoints():
+            try:
+                access_points.append((ap_path, self._get_all(ap_path, NM_AP_IFACE)))
+            except dbus.exceptions.DBusException:
+                # Access points can vanish between listing and reading
+                continue
+        return access_points
+
+    def _find_access_point(self, ssid, bssid):
+        """Object path of the access point with a given BSSID, or '/' if not visible"""
+        for ap_path, props in self._access_points():
+            if str(props.get('HwAddress', '')).upper() == bssid.upper() \
+                    and _ssid_to_str(props.get('Ssid', [])) == ssid:
+                return ap_path
+        return '/'
+
+    def scan_networks(self):
+        """Return one entry per access point (BSSID) from the last scan"""
+        with self._lock:
+            try:
+                visible = self._access_points()
+            except dbus.exceptions.DBusException:
+                return []
+
+            access_points = []
+            for _, props in visible:
+                security = []
+                if int(props.get('RsnFlags', 0)):
+                    security.append('WPA2')
+                if int(props.get('WpaFlags', 0)):
+                    security.append('WPA1')
+                if not security and int(props.get('Flags', 0)) & NM_802_11_AP_FLAGS_PRIVACY:
+                    security.append('WEP')
+                access_points.append(access_point(
+                    _ssid_to_str(props.get('Ssid', [])),
+                    str(props.get('HwAddress', '')),
+                    int(props.get('Strength', 0)),
+                    ' '.join(security),
+                    int(props.get('Frequency', 0)),
+                    int(props.get('MaxBitrate', 0)) / 1000
+                ))
+            return access_points
+
+    def _last_scan(self):
+        """Timestamp (ms) of the last completed scan, -1 if unknown"""
+        try:
+            return int(self._get(self._device_path, NM_WIRELESS_IFACE, 'LastScan'))
+        except dbus.exceptions.DBusException:
+            return -1
+
+    def rescan(self, timeout=15):
+        """Run a new scan and return its rows once it has completed"""
+        with self._lock:
+            before = self._last_scan()
+            try:
+                self._wireless().RequestScan(dbus.Dictionary({}, signature='sv'))
+                requested = True
+            except dbus.exceptions.DBusException:
+                # NetworkManager rejects scans requested too close together,
+                # in which case the current access point list is recent anyway
+                requested = False
+
+        # LastScan changes as soon as NetworkManager has new results
+        deadline = time.monotonic() + timeout
+        while requested and before != -1 and time.monotonic() < deadline:
+            if self._last_scan() != before:
+                break
+            time.sleep(0.1)
+
+        return self.scan_networks()
+
+    def get_current_connection(self):
+        """Get the active connection on the interface"""
+        with self._lock:
+            try:
+                active_path = self._get(self._device_path, NM_DEVICE_IFACE, 'ActiveConnection')
+                if active_path == '/':
+                    return None
+                active = self._get_all(active_path, NM_ACTIVE_IFACE)
+                connection_name = str(active.get('Id', ''))
+                conn = dbus.Interface(
+                    self.bus.get_object(NM_BUS_NAME, active['Connection']), NM_CONNECTION_IFACE
+                )
+                wireless = conn.GetSettings().get('802-11-wireless', {})
+            except dbus.exceptions.DBusException:
+                return None
+
+            ssid = _ssid_to_str(wireless['ssid']) if 'ssid' in wireless else connection_name
+            return {'ssid': ssid, 'connection_name': connection_name}
+
+    def get_link_rate(self):
+        """Current transmit bitrate in Mbit/s, or None when not associated"""
+        try:
+            bitrate = int(self._get(self._device_path, NM_WIRELESS_IFACE, 'Bitrate'))
+        except dbus.exceptions.DBusException:
+            return None
+        # Bitrate is reported in kbit/s
+        return bitrate / 1000 if bitrate else None
+
+    def connect(self, ssid, password=None, bssid=None, timer=None):
+        """Connect to a network, optionally via a specific access point
+
+        Phases are timed on `timer` (a PhaseTimer). Returns (success, error message).
+        """
+        timer = timer or PhaseTimer()
+        with self._lock:
+            try:
+                timer.start('profile_lookup')
+                existing = self._find_connections(ssid)
+                # Passing the access point as the specific object pins this
+                # activation to it without changing the saved profile
+                ap_path = self._find_access_point(ssid, bssid) if bssid else '/'
+
+                if password and existing:
+                    # Replace any existing profile so the new password is used
+                    timer.start('profile_delete')
+                    for path in existing:
+                        dbus.Interface(
+                            self.bus.get_object(NM_BUS_NAME, path), NM_CONNECTION_IFACE
+                        ).Delete()
+                    existing = []
+
+                if existing:
+                    active_path = self._nm.ActivateConnection(existing[0], self._device_path, ap_path)
+                else:
+                    settings = {
+                        'connection': {'id': ssid, 'type': '802-11-wireless'},
+                        '802-11-wireless': {
+                            'ssid': dbus.ByteArray(ssid.encode('utf-8')),
+                            'mode': 'infrastructure',
+                        },
+                    }
+                    if password:
+                        settings['802-11-wireless-security'] = {'key-mgmt': 'wpa-psk', 'psk': password}
+                    _, active_path = self._nm.AddAndActivateConnection(
+                        settings, self._device_path, ap_path
+                    )
+            except dbus.exceptions.DBusException as e:
+                timer.stop()
+                return False, e.get_dbus_message() or str(e)
+
+        # Activation takes up to CONNECT_TIMEOUT; scans and status reads
+        # must not wait behind it
+        try:
+            return self._wait_for_activation(active_path, timer)
+        finally:
+            timer.stop()
+
+    def delete_connection(self, ssid):
+        """Delete a saved connection profile, returns True if one was removed"""
+        with self._lock:
+            try:
+                paths = self._find_connections(ssid)
+                for path in paths:
+                    dbus.Interface(self.bus.get_object(NM_BUS_NAME, path), NM_CONNECTION_IFACE).Delete()
+            except dbus.exceptions.DBusException:
+                return False
+            return bool(paths)
@@ -0,0 +1,165 @@
+"""
+nmcli Backend
+Drives NetworkManager by running the nmcli command-line tool
+"""
+from app.backends.access_point import access_point
+from app.commands import run_command
+from app.connect_timing import PhaseTimer
+
+SCAN_FIELDS = "SSID,BSSID,SIGNAL,SECURITY,FREQ,RATE"
+
+
+def split_terse(line):
+    """Split a line of nmcli terse (-t) output, honouring backslash escapes"""
+    fields = ['']
+    escaped = False
+    for char in line:
+        if escaped:
+            fields[-1] += char
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == ':':
+            fields.append('')
+        else:
+            fields[-1] += char
+    return fields
+
+
+class NmcliBackend:
+    """NetworkManager access through one nmcli process per operation"""
+
+    name = 'nmcli'
+
+    def __init__(self, interface='wlan0'):
+        self.interface = interface
+
+    def _parse_scan(self, stdout):
+        """Parse terse nmcli scan output into access point entries"""
+        access_points = []
+        for line in stdout.split('\n'):
+            parts = split_terse(line)
+            if len(parts) < len(SCAN_FIELDS.split(',')):
+                continue
+            ssid, bssid, signal, security, freq, rate = (p.strip() for p in parts[:6])
+            try:
+                access_points.append(access_point(
+                    ssid, bssid, int(signal or 0), security,
+                    int(freq.split()[0]) if freq else 0,
+                    float(rate.split()[0]) if rate else 0.0
+                ))
+            except ValueError:
+                continue
+        return access_points
+
+    def scan_networks(self):
+        """Return one entry per access point (BSSID) from the last scan"""
+        args = ['nmcli', '-t', '-f', SCAN_FIELDS, 'device', 'wifi', 'list', 'ifname', self.interface]
+        stdout, stderr, returncode = run_command(args, read_only=True)
+
+        if returncode != 0:
+            return []
+        return self._parse_scan(stdout)
+
+    def rescan(self, timeout=15):
+        """Run a new scan and return its access points once it has completed"""
+        # --rescan yes makes nmcli wait for the scan to finish before listing
+        args = ['nmcli', '--wait', int(timeout), '-t', '-f', SCAN_FIELDS,
+                'device', 'wifi', 'list', '--rescan', 'yes', 'ifname', self.interface]
+        stdout, stderr, returncode = run_command(args)
+
+        if returncode != 0:
+            return []
+        return self._parse_scan(stdout)
+
+    def get_current_connection(self):
+        """Get the active connection on the interface"""
+        args = ['nmcli', '-t', '-f', 'NAME,TYPE,DEVICE', 'connection', 'show', '--active']
+        stdout, stderr, returncode = run_command(args, read_only=True)
+
+        if returncode != 0:
+            return None
+
+        for line in stdout.split('\n'):
+            if self.interface in line:
+                parts = split_terse(line)
+                if len(parts) >= 1:
+                    connection_name = parts[0].strip()
+
+                    # Get more details about the connection
+                    detail_args = ['nmcli', '-t', '-f', '802-11-wireless.ssid',
+                                   'connection', 'show', connection_name]
+                    detail_out, _, detail_code = run_command(detail_args, read_only=True)
+
+                    if detail_code == 0 and detail_out:
+                        ssid = detail_out.split(':')[-1].strip()
+                        return {'ssid': ssid, 'connection_name': connection_name}
+                    else:
+                        return {'ssid': connection_name, 'connection_name': connection_name}
+
+        return None
+
+    def get_link_rate(self):
+        """Current transmit bitrate in Mbit/s, or None when not associated"""
+        args = ['nmcli', '-t', '-f', 'IN-USE,RATE', 'device', 'wifi', 'list',
+                'ifname', self.interface, '--rescan', 'no']
+        stdout, _, returncode = run_command(args, read_only=True)
+
+        if returncode != 0:
+            return None
+        for line in stdout.split('\n'):
+            in_use, _, rate = line.partition(':')
+            if in_use.strip() == '*':
+                try:
+                    return float(rate.split()[0])
+                except (IndexError, ValueError):
+                    return None
+        return None
+
+    def connect(self, ssid, password=None, bssid=None, timer=None):
+        """Connect to a network, optionally via a specific access point
+
+        Phases are timed on `timer` (a PhaseTimer). nmcli does not report
+        progress, so association and DHCP are timed together as 'activate'.
+        Returns (success, error message).
+        """
+        timer = timer or PhaseTimer()
+        timer.start('profile_lookup')
+        _, _, check_code = run_command(['nmcli', 'connection', 'show', ssid], read_only=True)
+
+        # If password is provided, delete any existing connection first
+        # This ensures the new password is used
+        if password:
+            if check_code == 0:
+                # Delete existing connection
+                timer.start('profile_delete')
+                run_command(['nmcli', 'connection', 'delete', ssid])
+
+            # Create new connection with password
+            connect_args = ['nmcli', 'device', 'wifi', 'connect', ssid,
+                           'password', password, 'ifname', self.interface]
+            if bssid:
+                connect_args += ['bssid', bssid]
+        elif check_code == 0:
+            # For open networks, reuse the existing connection
+            connect_args = ['nmcli', 'connection', 'up', ssid, 'ifname', self.interface]
+            if bssid:
+                connect_args += ['ap', bssid]
+        else:
+            # Create new connection for open network
+            connect_args = ['nmcli', 'device', 'wifi', 'connect', ssid, 'ifname', self.interface]
+            if bssid:
+                connect_args += ['bssid', bssid]
+
+        timer.start('activate')
+        stdout, stderr, returncode = run_command(connect_args)
+        timer.stop()
+
+        if returncode == 0:
+            return True, ""
+        return False, stderr
+
+    def delete_connection(self, ssid):
+        """Delete a saved connection profile, returns True if one was removed"""
+        _, _, returncode = run_command(['nmcli', 'connection', 'delete', ssid])
+        return returncode == 0
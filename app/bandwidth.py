@@ -0,0 +1,293 @@
+"""
+Bandwidth Test Engine
+iperf-style TCP throughput test and the matching server. The sender streams
+a zero-filled file with sendfile() and the receiver reads into one reusable
+memoryview buffer, so neither side copies data through Python.
+
+Each test uses two connections to the server's port: a control connection
+carrying one JSON line each way, and a data connection that starts with the
+test's cookie and then carries the payload in one direction.
+"""
+import json
+import secrets
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+from app import config
+
+PROTOCOL_VERSION = 1
+DIRECTIONS = ('download', 'upload')
+BUFFER_SIZE = 256 * 1024
+PAYLOAD_FILE_SIZE = 4 * 1024 * 1024
+
+# Bytes per sendfile() call; the deadline is checked between calls, so this
+# bounds how far a test overruns on a slow link (64 KiB is 0.5 s at 1 Mbit/s)
+SEND_CHUNK = 64 * 1024
+MAX_LINE = 1024
+
+# Offset of tcpi_total_retrans in struct tcp_info (linux/tcp.h)
+TCP_INFO_TOTAL_RETRANS = 100
+
+_payload_lock = threading.Lock()
+_payload = None
+
+
+class BandwidthError(Exception):
+    """The test could not be run, e.g. the server is unreachable or busy"""
+
+
+def _payload_file():
+    """Open file of zeros streamed by sendfile(); created once per process"""
+    global _payload
+    with _payload_lock:
+        if _payload is None:
+            _payload = tempfile.TemporaryFile(prefix='wifi-manager-bandwidth-')
+            _payload.truncate(PAYLOAD_FILE_SIZE)
+        return _payload
+
+
+def total_retransmits(sock):
+    """Segments the kernel has retransmitted on a TCP socket, or None if unknown"""
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, TCP_INFO_TOTAL_RETRANS + 4)
+    except (AttributeError, OSError):
+        return None
+    if len(info) < TCP_INFO_TOTAL_RETRANS + 4:
+        return None
+    return struct.unpack_from('I', info, TCP_INFO_TOTAL_RETRANS)[0]
+
+
+def _read_line(sock):
+    """Read one newline-terminated line without reading past it"""
+    line = bytearray()
+    while not line.endswith(b'\n'):
+        if len(line) > MAX_LINE:
+            raise BandwidthError("Protocol line too long")
+        byte = sock.recv(1)
+        if not byte:
+            raise BandwidthError("Connection closed")
+        line += byte
+    return line.decode().strip()
+
+
+def _send_json(sock, data):
+    sock.sendall((json.dumps(data) + '\n').encode())
+
+
+def _read_json(sock):
+    try:
+        return json.loads(_read_line(sock))
+    except ValueError:
+        raise BandwidthError("Invalid protocol message")
+
+
+def send_for(sock, duration):
+    """Send payload for duration seconds with sendfile(), returns bytes sent"""
+    payload = _payload_file()
+    deadline = time.monotonic() + duration
+    sent = offset = 0
+    while time.monotonic() < deadline:
+        count = sock.sendfile(payload, offset, min(SEND_CHUNK, PAYLOAD_FILE_SIZE - offset))
+        sent += count
+        offset = (offset + count) % PAYLOAD_FILE_SIZE
+    return sent
+
+
+def receive_all(sock):
+    """Receive until the sender closes, returns (bytes, seconds, intervals)
+
+    Intervals are [start, end, bytes] for each second of the transfer.
+    """
+    view = memoryview(bytearray(BUFFER_SIZE))
+    started = time.monotonic()
+    mark = 1.0
+    intervals = []
+    interval_bytes = total = 0
+    while True:
+        received = sock.recv_into(view)
+        if not received:
+            break
+        elapsed = time.monotonic() - started
+        while elapsed >= mark:
+            intervals.append([mark - 1, mark, interval_bytes])
+            interval_bytes = 0
+            mark += 1
+        interval_bytes += received
+        total += received
+    elapsed = time.monotonic() - started
+    if interval_bytes or not intervals:
+        intervals.append([mark - 1, max(elapsed, mark - 1), interval_bytes])
+    return total, elapsed, intervals
+
+
+def mbps(byte_count, seconds):
+    """Megabits per second, rounded to 0.01"""
+    return round(byte_count * 8 / seconds / 1e6, 2) if seconds > 0 else 0.0
+
+
+class BandwidthServer:
+    """Answers bandwidth tests, one at a time, until stopped"""
+
+    def __init__(self, host=None, port=None, max_duration=None):
+        self.host = host if host is not None else config.BANDWIDTH_SERVER_HOST
+        self.port = config.BANDWIDTH_PORT if port is None else port
+        self.max_duration = max_duration or config.BANDWIDTH_MAX_DURATION
+        self._busy = threading.Lock()
+        self._tests = {}
+        self._listener = None
+        self._thread = None
+
+    def listen(self):
+        """Bind the listening socket, returns the port (useful with port 0)"""
+        if self._listener is None:
+            self._listener = socket.create_server((self.host, self.port))
+            self.port = self._listener.getsockname()[1]
+        return self.port
+
+    def start(self):
+        """Accept tests in a daemon thread, returns the bound port"""
+        self.listen()
+        self._thread = threading.Thread(target=self.serve_forever, name='bandwidth-server', daemon=True)
+        self._thread.start()
+        return self.port
+
+    def serve_forever(self):
+        """Accept connections until stop() is called"""
+        self.listen()
+        while True:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                # Listener closed by stop()
+                return
+            threading.Thread(target=self._handle, args=(conn,), name='bandwidth-conn', daemon=True).start()
+
+    def stop(self):
+        """Stop accepting tests"""
+        if self._listener is not None:
+            self._listener.close()
+
+    def _handle(self, conn):
+        try:
+            conn.settimeout(self.max_duration + 10)
+            line = _read_line(conn)
+            if line.startswith('{'):
+                self._control(conn, json.loads(line))
+            else:
+                self._data(conn, line)
+        except (BandwidthError, OSError, ValueError) as e:
+            print(f"Bandwidth test connection failed: {e}")
+        finally:
+            conn.close()
+
+    def _control(self, conn, request):
+        direction = request.get('direction')
+        try:
+            duration = float(request.get('duration', 0))
+        except (TypeError, ValueError):
+            duration = 0
+        if request.get('version') != PROTOCOL_VERSION or direction not in DIRECTIONS:
+            _send_json(conn, {'error': 'Unsupported test'})
+            return
+        if not 0 < duration <= self.max_duration:
+            _send_json(conn, {'error': f'Duration must be between 0 and {self.max_duration} seconds'})
+            return
+        if not self._busy.acquire(blocking=False):
+            _send_json(conn, {'error': 'Server busy with another test'})
+            return
+
+        cookie = secrets.token_hex(16)
+        test = {'direction': direction, 'duration': duration, 'done': threading.Event(), 'result': None}
+        self._tests[cookie] = test
+        try:
+            _send_json(conn, {'cookie': cookie})
+            if not test['done'].wait(duration + 10):
+                _send_json(conn, {'error': 'Data connection timed out'})
+                return
+            _send_json(conn, test['result'])
+        finally:
+            self._tests.pop(cookie, None)
+            self._busy.release()
+
+    def _data(self, conn, cookie):
+        test = self._tests.get(cookie)
+        if test is None or test['done'].is_set():
+            return
+        try:
+            if test['direction'] == 'upload':
+                total, seconds, intervals = receive_all(conn)
+                test['result'] = {'bytes': total, 'seconds': seconds, 'intervals': intervals}
+            else:
+                sent = send_for(conn, test['duration'])
+                conn.shutdown(socket.SHUT_WR)
+                # Wait for the client to read everything, so retransmits are final
+                conn.recv(1)
+                test['result'] = {'bytes': sent, 'retransmits': total_retransmits(conn)}
+        except OSError as e:
+            test['result'] = {'error': str(e)}
+        finally:
+            test['done'].set()
+
+
+def run_test(host, port=None, duration=5, direction='download', connect_timeout=5):
+    """Run one bandwidth test against a server, returns the result dict
+
+    Raises BandwidthError if the server cannot be reached or refuses the test.
+    """
+    if direction not in DIRECTIONS:
+        raise BandwidthError(f"Direction must be one of {', '.join(DIRECTIONS)}")
+    port = port or config.BANDWIDTH_PORT
+    try:
+        control = socket.create_connection((host, port), timeout=connect_timeout)
+    except OSError as e:
+        raise BandwidthError(f"Cannot connect to {host}:{port}: {e}")
+
+    with control:
+        control.settimeout(duration + 15)
+        _send_json(control, {'version': PROTOCOL_VERSION, 'direction': direction, 'duration': duration})
+        reply = _read_json(control)
+        if 'error' in reply:
+            raise BandwidthError(reply['error'])
+
+        try:
+            data = socket.create_connection((host, port), timeout=connect_timeout)
+        except OSError as e:
+            raise BandwidthError(f"Cannot open data connection to {host}:{port}: {e}")
+        with data:
+            data.settimeout(duration + 15)
+            data.sendall((reply['cookie'] + '\n').encode())
+            if direction == 'upload':
+                send_for(data, duration)
+                data.shutdown(socket.SHUT_WR)
+                # The server closes once it has received everything
+                data.recv(1)
+                retransmits = total_retransmits(data)
+                remote = _read_json(control)
+                if 'error' in remote:
+                    raise BandwidthError(remote['error'])
+                total, seconds, intervals = remote['bytes'], remote['seconds'], remote['intervals']
+            else:
+                total, seconds, intervals = receive_all(data)
+                data.close()
+                remote = _read_json(control)
+                if 'error' in remote:
+                    raise BandwidthError(remote['error'])
+                retransmits = remote.get('retransmits')
+
+    return {
+        'direction': direction,
+        'host': host,
+        'port': port,
+        'bytes': total,
+        'seconds': round(seconds, 3),
+        'mbps': mbps(total, seconds),
+        'retransmits': retransmits,
+        'intervals': [
+            {'start': round(start, 2), 'end': round(end, 2), 'bytes': count,
+             'mbps': mbps(count, end - start)}
+            for start, end, count in intervals
+        ],
+    }
@@ -0,0 +1,370 @@
+"""
+Channel Analyzer
+Per-channel occupancy and interference scores built from wlan0's scan
+results over time, and a channel recommendation for the hotspot on wlan1
+that can be applied on demand or during a maintenance window
+"""
+import collections
+import os
+import threading
+import time
+
+from app import commands, config, hostapd, netinfo
+from app.wifi_manager import scan_access_points
+
+BAND_24 = '2.4 GHz'
+BAND_5 = '5 GHz'
+
+# 2.4 GHz channels are 5 MHz apart but 20 MHz wide, so an access point
+# interferes with its neighbours up to four channels away, less so further out
+OVERLAP_24 = {0: 1.0, 1: 0.8, 2: 0.6, 3: 0.4, 4: 0.2}
+
+# Beacons hostapd announces the switch for before moving (CSA), so
+# clients follow without reassociating
+CHANNEL_SWITCH_COUNT = 5
+
+
+def channel_band(channel):
+    """Band of a 2.4 or 5 GHz channel number"""
+    return BAND_24 if channel <= 14 else BAND_5
+
+
+def channel_frequency(channel):
+    """Centre frequency in MHz of a 2.4 or 5 GHz channel"""
+    if channel == 14:
+        return 2484
+    if channel <= 13:
+        return 2407 + channel * 5
+    return 5000 + channel * 5
+
+
+def overlap(channel, other):
+    """How much an access point on other interferes with channel (0-1)"""
+    if channel_band(channel) != channel_band(other):
+        return 0.0
+    if channel_band(channel) == BAND_5:
+        # 5 GHz channels do not overlap; wider APs are only seen by their primary
+        return 1.0 if channel == other else 0.0
+    return OVERLAP_24.get(abs(channel - other), 0.0)
+
+
+def own_bssid(interface=None):
+    """MAC address of the hotspot interface, so the hotspot does not count against itself"""
+    try:
+        with open(netinfo.sysfs_net_path(interface or config.HOTSPOT_INTERFACE, 'address')) as f:
+            return f.read().strip().upper()
+    except OSError:
+        return None
+
+
+def score_scan(access_points, channels, exclude=None):
+    """Occupancy and interference of each channel in one scan
+
+    Returns {channel: (co-channel APs, interference score, strongest signal)}.
+    The score sums every overlapping access point weighted by its signal
+    (0-100) and overlap, so one strong neighbour counts as 1.
+    """
+    neighbours = [
+        ap for ap in access_points
+        if ap['band'] in (BAND_24, BAND_5) and ap['channel'] and ap['bssid'] != exclude
+    ]
+    result = {}
+    for channel in channels:
+        aps = score = 0
+        strongest = None
+        for ap in neighbours:
+            weight = overlap(channel, ap['channel'])
+            if not weight:
+                continue
+            score += weight * ap['signal'] / 100
+            if ap['channel'] == channel:
+                aps += 1
+                strongest = max(strongest or 0, ap['signal'])
+        result[channel] = (aps, score, strongest)
+    return result
+
+
+def parse_window(window):
+    """'HH:MM-HH:MM' as (start, end) minutes after midnight, or None if empty"""
+    if not window:
+        return None
+    try:
+        start, end = window.split('-')
+        return tuple(int(t.split(':')[0]) * 60 + int(t.split(':')[1]) for t in (start, end))
+    except (ValueError, IndexError):
+        print(f"Ignoring invalid maintenance window '{window}', expected HH:MM-HH:MM")
+        return None
+
+
+def in_window(window, now=None):
+    """Whether local time is inside a (start, end) window, which may wrap midnight"""
+    if window is None:
+        return False
+    local = time.localtime(now)
+    minute = local.tm_hour * 60 + local.tm_min
+    start, end = window
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+
+def read_conf(path=None):
+    """hostapd.conf settings as a dict, or {} if it cannot be read"""
+    settings = {}
+    try:
+        with open(path or config.HOSTAPD_CONF) as f:
+            for line in f:
+                key, sep, value = line.strip().partition('=')
+                if sep and not key.startswith('#'):
+                    settings[key] = value
+    except OSError:
+        pass
+    return settings
+
+
+def write_conf_channel(channel, path=None):
+    """Set channel (and hw_mode to match its band) in hostapd.conf"""
+    path = path or config.HOSTAPD_CONF
+    updates = {'channel': str(channel), 'hw_mode': 'g' if channel_band(channel) == BAND_24 else 'a'}
+    with open(path) as f:
+        lines = f.readlines()
+    seen = set()
+    for i, line in enumerate(lines):
+        key = line.partition('=')[0].strip()
+        if key in updates:
+            lines[i] = f"{key}={updates[key]}\n"
+            seen.add(key)
+    lines.extend(f"{key}={value}\n" for key, value in updates.items() if key not in seen)
+    write_conf(''.join(lines), path)
+
+
+def write_conf(contents, path=None):
+    """Replace hostapd.conf in one step, so hostapd never reads half a file"""
+    path = path or config.HOSTAPD_CONF
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(contents)
+    os.replace(tmp, path)
+
+
+def current_channel():
+    """Channel the hotspot is on, from hostapd or else its config file"""
+    try:
+        for line in hostapd.request('STATUS').split('\n'):
+            key, _, value = line.partition('=')
+            if key == 'channel':
+                return int(value)
+    except (hostapd.HostapdError, ValueError):
+        pass
+    try:
+        return int(read_conf().get('channel', ''))
+    except ValueError:
+        return None
+
+
+def apply_channel(channel, allow_restart=True):
+    """Move the hotspot to a channel, returns (success, message)
+
+    Within a band hostapd is asked to switch live, announcing the move to
+    associated clients; otherwise (or if the driver cannot) hostapd is
+    restarted, which disconnects them, unless allow_restart is False.
+    hostapd.conf only keeps the new channel once the hotspot is on it.
+    """
+    if channel not in config.CHANNEL_CANDIDATES or channel_band(channel) not in config.HOTSPOT_BANDS:
+        return False, f"Channel {channel} is not a candidate for the hotspot"
+    previous = current_channel()
+
+    if previous is not None and channel_band(previous) == channel_band(channel):
+        try:
+            hostapd.request(f"CHAN_SWITCH {CHANNEL_SWITCH_COUNT} {channel_frequency(channel)}")
+        except hostapd.HostapdError as e:
+            print(f"Live channel switch failed: {e}")
+        else:
+            try:
+                write_conf_channel(channel)
+            except OSError as e:
+                print(f"Cannot save channel {channel} to {config.HOSTAPD_CONF}: {e}")
+                return True, f"Hotspot switching to channel {channel}, but it reverts when hostapd restarts"
+            return True, f"Hotspot switching to channel {channel}"
+
+    if not allow_restart:
+        return False, f"Hotspot not moved, channel {channel} needs a hostapd restart"
+    # hostapd reads the channel from its config when it starts
+    try:
+        with open(config.HOSTAPD_CONF) as f:
+            original = f.read()
+        write_conf_channel(channel)
+    except OSError as e:
+        return False, f"Cannot update {config.HOSTAPD_CONF}: {e}"
+    _, stderr, returncode = commands.run_command(['systemctl', 'restart', 'hostapd'], timeout=30)
+    if returncode != 0:
+        try:
+            write_conf(original)
+        except OSError as e:
+            print(f"Cannot restore {config.HOSTAPD_CONF}: {e}")
+        return False, f"Restarting hostapd on channel {channel} failed: {stderr.strip()}"
+    return True, f"Hotspot restarted on channel {channel}"
+
+
+class ChannelAnalyzer:
+    """Keeps per-channel scores from recent scans and recommends a hotspot channel
+
+    A sample is taken from the shared scan results every interval, so no
+    extra scans are run. During the maintenance window, if enough samples
+    show a clearly better channel, one move is attempted per window.
+    """
+
+    def __init__(self, interval=None, history=None):
+        self.interval = interval or config.CHANNEL_SAMPLE_INTERVAL
+        self.history = history or config.CHANNEL_HISTORY
+        self._lock = threading.Lock()
+        self._samples = collections.deque(maxlen=int(self.history / self.interval) + 1)
+        self._last_applied = None
+        self._last_attempt = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling in a daemon thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='channel-analyzer', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the sampling thread"""
+        self._stop.set()
+
+    def observe(self, access_points, now=None):
+        """Record one scan's per-channel scores"""
+        now = now or time.time()
+        channels = self._channels(access_points, current_channel())
+        scores = score_scan(access_points, channels, own_bssid())
+        with self._lock:
+            self._samples.append((now, scores))
+            while self._samples and now - self._samples[0][0] > self.history:
+                self._samples.popleft()
+
+    def _channels(self, access_points, current):
+        # Candidates and the hotspot's channel, plus every channel seen in
+        # use for the occupancy view
+        channels = {ap['channel'] for ap in access_points if ap['band'] in (BAND_24, BAND_5) and ap['channel']}
+        channels.update(config.CHANNEL_CANDIDATES)
+        if current:
+            channels.add(current)
+        return sorted(channels)
+
+    def report(self):
+        """Per-channel averages over the history and the recommended channel
+
+        With no samples yet (e.g. in the CLI), the current scan results are
+        sampled once first.
+        """
+        with self._lock:
+            empty = not self._samples
+        if empty:
+            self.observe(scan_access_points())
+        with self._lock:
+            samples = list(self._samples)
+            last_applied = self._last_applied
+            last_attempt = self._last_attempt
+
+        totals = {}
+        for _, scores in samples:
+            for channel, (aps, score, strongest) in scores.items():
+                total = totals.setdefault(channel, {'aps': 0, 'score': 0.0, 'peak': 0.0, 'strongest': None, 'n': 0})
+                total['aps'] += aps
+                total['score'] += score
+                total['peak'] = max(total['peak'], score)
+                if strongest is not None:
+                    total['strongest'] = max(total['strongest'] or 0, strongest)
+                total['n'] += 1
+
+        channels = []
+        for channel, total in sorted(totals.items()):
+            channels.append({
+                'channel': channel,
+                'band': channel_band(channel),
+                'candidate': channel in config.CHANNEL_CANDIDATES,
+                'aps': round(total['aps'] / total['n'], 1),
+                'score': round(total['score'] / total['n'], 2),
+                'peak_score': round(total['peak'], 2),
+                'strongest_signal': total['strongest'],
+            })
+
+        def best(entries):
+            ranked = sorted(entries, key=lambda c: (c['score'], c['peak_score'], c['aps']))
+            return ranked[0]['channel'] if ranked else None
+
+        candidates = [c for c in channels if c['candidate']]
+        by_band = {band: best(c for c in candidates if c['band'] == band) for band in (BAND_24, BAND_5)}
+        recommended = best(c for c in candidates if c['band'] in config.HOTSPOT_BANDS)
+
+        current = current_channel()
+        scores = {c['channel']: c['score'] for c in channels}
+        switch = (
+            recommended is not None and current is not None and recommended != current
+            and scores.get(current) is not None
+            and scores[current] - scores[recommended] >= config.CHANNEL_SWITCH_MIN_GAIN
+        )
+        return {
+            'samples': len(samples),
+            'since': samples[0][0] if samples else None,
+            'current_channel': current,
+            'current_score': scores.get(current),
+            'channels': channels,
+            'recommended': by_band,
+            'recommended_channel': recommended,
+            'switch_recommended': switch,
+            'maintenance_window': config.CHANNEL_MAINTENANCE_WINDOW or None,
+            'last_applied': last_applied,
+            'last_attempt': last_attempt,
+        }
+
+    def apply(self, channel, allow_restart=True):
+        """Move the hotspot to a channel and remember when, returns (success, message)"""
+        success, message = apply_channel(channel, allow_restart)
+        if success:
+            with self._lock:
+                self._last_applied = {'channel': channel, 'time': time.time()}
+        return success, message
+
+    def _maybe_apply(self, now):
+        window = parse_window(config.CHANNEL_MAINTENANCE_WINDOW)
+        if not in_window(window, now):
+            return
+        with self._lock:
+            last = [entry['time'] for entry in (self._last_applied, self._last_attempt) if entry]
+            if len(self._samples) < config.CHANNEL_MIN_SAMPLES:
+                return
+        # At most one try per window, whether or not it worked
+        if last and now - max(last) < 24 * 3600 - self.interval:
+            return
+        report = self.report()
+        if not report['switch_recommended']:
+            return
+        # A restart would drop whoever is still using the hotspot, so it
+        # needs hostapd to confirm there is no one
+        try:
+            idle = not hostapd.stations()
+        except hostapd.HostapdError as e:
+            print(f"Cannot list hotspot clients: {e}")
+            idle = False
+        channel = report['recommended_channel']
+        success, message = self.apply(channel, allow_restart=idle)
+        with self._lock:
+            self._last_attempt = {'channel': channel, 'time': now, 'success': success, 'message': message}
+        print(f"Maintenance channel change: {message}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                self.observe(scan_access_points(), started)
+                self._maybe_apply(started)
+            except Exception as e:
+                print(f"Error analyzing channels: {e}")
+            self._stop.wait(max(0, self.interval - (time.time() - started)))
+
+
+channel_analyzer = ChannelAnalyzer()
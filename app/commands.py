@@ -0,0 +1,224 @@
+"""
+Command Runner
+The one place external commands are run. Commands are argument lists (never
+a shell), read-only queries are shared between identical calls, at most
+COMMAND_MAX_CONCURRENCY run at once and a command that times out is killed
+with its whole process group. Long-running watchers are started and stopped
+here too. Latency, errors and callers are recorded in
+app.metrics.
+"""
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from app import config, metrics
+
+DEFAULT_TIMEOUT = 30
+
+# nmcli objects and verbs kept in metric labels; anything else (SSIDs,
+# interface names, field lists) is dropped to keep label values bounded
+NMCLI_KEYWORDS = {
+    'general', 'networking', 'radio', 'connection', 'device', 'agent', 'monitor',
+    'show', 'status', 'list', 'up', 'down', 'add', 'modify', 'delete', 'reload',
+    'wifi', 'connect', 'disconnect', 'rescan', 'hotspot', 'all',
+}
+
+# Options whose value is the next argument
+VALUE_OPTIONS = {'-f', '--fields', '-w', '--wait', '-g', '--get-values', '-c', '--count', '-W', '-i'}
+
+
+def command_label(args):
+    """Short, bounded description of a command for metrics, e.g. 'nmcli device wifi list'"""
+    if not args:
+        return 'unknown'
+    tool = os.path.basename(args[0])
+    words = [tool]
+    skip = False
+    for arg in args[1:]:
+        if skip:
+            skip = False
+            continue
+        if arg.startswith('-'):
+            skip = arg in VALUE_OPTIONS
+            continue
+        if tool == 'nmcli' and arg in NMCLI_KEYWORDS:
+            words.append(arg)
+        elif tool != 'nmcli' and len(words) < 2 and arg.isalpha():
+            words.append(arg)
+        else:
+            break
+    return ' '.join(words)
+
+
+def _caller():
+    """Name of the function that called run_command"""
+    try:
+        return sys._getframe(2).f_code.co_name
+    except ValueError:
+        return 'unknown'
+
+
+def _argv(args):
+    if isinstance(args, str):
+        raise TypeError("commands take an argument list, not a shell command line")
+    return [str(arg) for arg in args]
+
+
+def _kill_group(process, sig=signal.SIGKILL):
+    """Signal a command started in its own session and everything it started"""
+    try:
+        os.killpg(process.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+_slots = threading.BoundedSemaphore(config.COMMAND_MAX_CONCURRENCY)
+
+
+def _run(args, timeout, label, caller):
+    started = time.perf_counter()
+    try:
+        with _slots:
+            # A new session puts the command and anything it starts in its own
+            # process group, so a timeout can kill all of them
+            process = subprocess.Popen(
+                args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                start_new_session=True
+            )
+            try:
+                stdout, stderr = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                _kill_group(process)
+                process.communicate()
+                metrics.command_errors.inc(label, 'timeout')
+                return "", "Command timed out", 1
+        if process.returncode != 0:
+            metrics.command_errors.inc(label, 'exit')
+        return stdout.strip(), stderr.strip(), process.returncode
+    except Exception as e:
+        metrics.command_errors.inc(label, 'error')
+        return "", str(e), 1
+    finally:
+        metrics.command_duration.observe(time.perf_counter() - started, label, caller)
+
+
+class _Pending:
+    """Result of a read-only command, shared by callers while it runs and for MEMO_TTL after"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.expires = None
+
+
+_memo = {}
+_memo_lock = threading.Lock()
+_scope = threading.local()
+
+
+def invalidate():
+    """Forget every shared result, e.g. after NetworkManager reports a change"""
+    with _memo_lock:
+        _memo.clear()
+    if getattr(_scope, 'results', None):
+        _scope.results.clear()
+
+
+def begin_scope():
+    """Share read-only results on this thread until end_scope(), whatever their age"""
+    _scope.results = {}
+
+
+def end_scope():
+    """End the scope started by begin_scope()"""
+    _scope.results = None
+
+
+def bind_scope(fn):
+    """Wrap fn to share the calling thread's scope when it runs on another thread"""
+    results = getattr(_scope, 'results', None)
+    if results is None:
+        return fn
+
+    def scoped():
+        previous = getattr(_scope, 'results', None)
+        _scope.results = results
+        try:
+            return fn()
+        finally:
+            _scope.results = previous
+    return scoped
+
+
+def _shared(key, run):
+    """Run a read-only command once for every caller asking for it at the same time"""
+    now = time.monotonic()
+    with _memo_lock:
+        pending = _memo.get(key)
+        owner = pending is None or (pending.done.is_set() and pending.expires <= now)
+        if owner:
+            for stale in [k for k, p in _memo.items() if p.done.is_set() and p.expires <= now]:
+                del _memo[stale]
+            pending = _memo[key] = _Pending()
+
+    if not owner:
+        metrics.command_memo_hits.inc(command_label(key))
+        pending.done.wait()
+        return pending.result
+
+    try:
+        pending.result = run()
+    finally:
+        pending.expires = time.monotonic() + config.COMMAND_MEMO_TTL
+        pending.done.set()
+    return pending.result
+
+
+def run_command(args, timeout=DEFAULT_TIMEOUT, read_only=False):
+    """Execute a command given as an argument list, returns (stdout, stderr, returncode)
+
+    Identical read-only commands share one result: while one is running,
+    for COMMAND_MEMO_TTL seconds after, and for the rest of a request
+    scope (see begin_scope). Any other command may change what those
+    queries report, so it clears the shared results.
+    """
+    args = _argv(args)
+    label = command_label(args)
+    caller = _caller()
+    if not read_only:
+        try:
+            return _run(args, timeout, label, caller)
+        finally:
+            invalidate()
+
+    key = tuple(args)
+    scoped = getattr(_scope, 'results', None)
+    if scoped is not None and key in scoped:
+        metrics.command_memo_hits.inc(label)
+        return scoped[key]
+    result = _shared(key, lambda: _run(args, timeout, label, caller))
+    if scoped is not None:
+        scoped[key] = result
+    return result
+
+
+def start_process(args):
+    """Start a long-running command (such as a monitor) whose stdout is read line by line
+
+    Like run_command, args is an argument list and the command gets its own
+    process group. It is not counted against COMMAND_MAX_CONCURRENCY, since
+    it runs for as long as the caller wants; end it with stop_process().
+    Raises OSError if it cannot be started.
+    """
+    return subprocess.Popen(
+        _argv(args), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1,
+        start_new_session=True
+    )
+
+
+def stop_process(process):
+    """Terminate a command from start_process() along with anything it started"""
+    _kill_group(process, signal.SIGTERM)
@@ -0,0 +1,149 @@
+"""
+Configuration Module
+Runtime settings for the WiFi Manager, overridable via WIFI_MANAGER_* environment variables
+"""
+import os
+
+
+def _env(name, default):
+    """Read a WIFI_MANAGER_<name> environment variable"""
+    return os.environ.get(f'WIFI_MANAGER_{name}', default)
+
+
+# Interface used for the internet uplink (wlan1 runs the hotspot)
+WIFI_INTERFACE = _env('INTERFACE', 'wlan0')
+
+# NetworkManager backend: 'dbus', 'nmcli' or 'auto' (D-Bus with nmcli fallback)
+WIFI_BACKEND = _env('BACKEND', 'auto')
+
+# Optional D-Bus address to use instead of the system bus (e.g. a test bus)
+DBUS_ADDRESS = _env('DBUS_ADDRESS', '')
+
+# Seconds a scan result is served from cache before nmcli/D-Bus is asked again
+SCAN_CACHE_TTL = float(_env('SCAN_CACHE_TTL', '10'))
+
+# Longest time to wait for a requested rescan to complete
+SCAN_TIMEOUT = float(_env('SCAN_TIMEOUT', '15'))
+
+# Seconds between connection state checks while status stream clients are connected
+STATUS_POLL_INTERVAL = float(_env('STATUS_POLL_INTERVAL', '5'))
+
+# Roots of the kernel interfaces read by app.netinfo (overridable for fixture trees)
+SYSFS_NET_ROOT = _env('SYSFS_NET_ROOT', '/sys/class/net')
+PROCFS_NET_ROOT = _env('PROCFS_NET_ROOT', '/proc/net')
+
+# Overall time budget for /api/diagnostics and the longest any single probe command may run
+DIAGNOSTICS_DEADLINE = float(_env('DIAGNOSTICS_DEADLINE', '5'))
+DIAGNOSTICS_PROBE_TIMEOUT = float(_env('DIAGNOSTICS_PROBE_TIMEOUT', '5'))
+
+# External commands: most run at once, and seconds an identical read-only
+# query (e.g. nmcli ... connection show --active) reuses the previous result
+COMMAND_MAX_CONCURRENCY = int(_env('COMMAND_MAX_CONCURRENCY', '4'))
+COMMAND_MEMO_TTL = float(_env('COMMAND_MEMO_TTL', '1'))
+
+# Upper bound on echo requests per host for a single ping test
+PING_MAX_COUNT = int(_env('PING_MAX_COUNT', '100'))
+
+# Background link quality sampler (RSSI, link rate, gateway RTT and loss)
+LINK_SAMPLER_ENABLED = _env('LINK_SAMPLER', '1') == '1'
+LINK_SAMPLE_INTERVAL = int(_env('LINK_SAMPLE_INTERVAL', '30'))
+
+# (resolution seconds, retention seconds) from finest to coarsest: raw samples
+# for a day, 5-minute averages for a week, hourly averages for 90 days
+LINK_HISTORY_TIERS = [
+    (LINK_SAMPLE_INTERVAL, 24 * 3600),
+    (300, 7 * 24 * 3600),
+    (3600, 90 * 24 * 3600),
+]
+
+# Most points returned by one /api/history query
+LINK_HISTORY_MAX_POINTS = int(_env('LINK_HISTORY_MAX_POINTS', '500'))
+
+# Signal bonus given to usable 5/6 GHz access points when picking the best AP of an SSID
+BAND_PREFERENCE_BONUS = int(_env('BAND_PREFERENCE_BONUS', '10'))
+
+# Pin connections to the best access point of the SSID unless one is given
+PIN_BEST_BSSID = _env('PIN_BEST_BSSID', '0') == '1'
+
+# Failover supervisor: reconnects wlan0 to the best saved network when the
+# link or upstream reachability is lost. Off by default, since it cannot tell
+# a lost link from one the user disconnected on purpose
+FAILOVER_ENABLED = _env('FAILOVER', '0') == '1'
+FAILOVER_CHECK_INTERVAL = float(_env('FAILOVER_CHECK_INTERVAL', '2'))
+FAILOVER_FAILURE_THRESHOLD = int(_env('FAILOVER_FAILURE_THRESHOLD', '2'))
+FAILOVER_HOLDDOWN = float(_env('FAILOVER_HOLDDOWN', '30'))
+FAILOVER_UPSTREAM_TARGETS = [t for t in _env('FAILOVER_UPSTREAM_TARGETS', '8.8.8.8,1.1.1.1').split(',') if t]
+
+# Connect phase timing: how long to wait for an address after connecting, and
+# the name looked up to time the first DNS query (empty to skip)
+CONNECT_ADDRESS_TIMEOUT = float(_env('CONNECT_ADDRESS_TIMEOUT', '10'))
+CONNECT_DNS_PROBE_HOST = _env('CONNECT_DNS_PROBE_HOST', 'connectivity-check.ubuntu.com')
+CONNECT_DNS_TIMEOUT = float(_env('CONNECT_DNS_TIMEOUT', '5'))
+
+# Network state mirror fed by `nmcli monitor` and `ip monitor` (see
+# app/net_state.py), and seconds between full resyncs as a safety net
+NET_STATE_ENABLED = _env('NET_STATE', '1') == '1'
+NET_STATE_RESYNC_INTERVAL = float(_env('NET_STATE_RESYNC_INTERVAL', '300'))
+
+# Hotspot interface, hostapd's control socket directory and dnsmasq's lease file
+HOTSPOT_INTERFACE = _env('HOTSPOT_INTERFACE', 'wlan1')
+HOSTAPD_CTRL_DIR = _env('HOSTAPD_CTRL_DIR', '/var/run/hostapd')
+DNSMASQ_LEASES_FILE = _env('DNSMASQ_LEASES_FILE', '/var/lib/misc/dnsmasq.leases')
+
+# hostapd's configuration file, where the hotspot's channel is saved
+HOSTAPD_CONF = _env('HOSTAPD_CONF', '/etc/hostapd/hostapd.conf')
+
+# Channel analyzer (see app/channels.py): seconds between samples of the scan
+# results, seconds of samples kept, channels the hotspot may use, bands its
+# radio supports ('2.4' and/or '5'), how much lower (in strong-neighbour
+# units) a channel's score must be to move to it, and the local HH:MM-HH:MM
+# window in which it is moved automatically (empty: only when asked)
+CHANNEL_ANALYZER_ENABLED = _env('CHANNEL_ANALYZER', '1') == '1'
+CHANNEL_SAMPLE_INTERVAL = float(_env('CHANNEL_SAMPLE_INTERVAL', '300'))
+CHANNEL_HISTORY = float(_env('CHANNEL_HISTORY', str(24 * 3600)))
+CHANNEL_CANDIDATES = [int(c) for c in _env('CHANNEL_CANDIDATES', '1,6,11,36,40,44,48,149,153,157,161').split(',') if c]
+HOTSPOT_BANDS = [f"{b} GHz" for b in _env('HOTSPOT_BANDS', '2.4').split(',') if b]
+CHANNEL_SWITCH_MIN_GAIN = float(_env('CHANNEL_SWITCH_MIN_GAIN', '0.5'))
+CHANNEL_MIN_SAMPLES = int(_env('CHANNEL_MIN_SAMPLES', '12'))
+CHANNEL_MAINTENANCE_WINDOW = _env('CHANNEL_MAINTENANCE_WINDOW', '')
+
+# Throughput meter: seconds between counter samples, the sliding windows rates
+# are reported over, and seconds without a reader before sampling stops
+THROUGHPUT_SAMPLE_INTERVAL = float(_env('THROUGHPUT_SAMPLE_INTERVAL', '1'))
+THROUGHPUT_WINDOWS = [int(w) for w in _env('THROUGHPUT_WINDOWS', '10,60').split(',') if w]
+THROUGHPUT_IDLE_TIMEOUT = float(_env('THROUGHPUT_IDLE_TIMEOUT', '300'))
+
+# Bandwidth test (see app/bandwidth.py): port of the test server, the address
+# the built-in server listens on when enabled, and the longest test allowed
+BANDWIDTH_PORT = int(_env('BANDWIDTH_PORT', '5201'))
+BANDWIDTH_SERVER_ENABLED = _env('BANDWIDTH_SERVER', '0') == '1'
+BANDWIDTH_SERVER_HOST = _env('BANDWIDTH_SERVER_HOST', '0.0.0.0')
+BANDWIDTH_MAX_DURATION = float(_env('BANDWIDTH_MAX_DURATION', '30'))
+
+# DNS resolver probe (see app/dns_probe.py): extra resolvers compared with the
+# configured ones, the name timed when cached, the domain random uncached names
+# are made under, seconds to wait per query and cached queries per resolver.
+# No extra resolvers by default, so diagnostics only query the network's own
+DNS_PROBE_PUBLIC_SERVERS = [s for s in _env('DNS_PROBE_PUBLIC_SERVERS', '').split(',') if s]
+DNS_PROBE_NAME = _env('DNS_PROBE_NAME', 'google.com')
+DNS_PROBE_COLD_DOMAIN = _env('DNS_PROBE_COLD_DOMAIN', 'example.com')
+DNS_PROBE_TIMEOUT = float(_env('DNS_PROBE_TIMEOUT', '1'))
+DNS_PROBE_CACHED_QUERIES = int(_env('DNS_PROBE_CACHED_QUERIES', '3'))
+
+# Directory the static asset pipeline (see app/assets.py) writes hashed and
+# precompressed files to; empty means app/static/build
+ASSET_BUILD_DIR = _env('ASSET_BUILD_DIR', '')
+
+# Web server: 'dev' runs Flask's built-in server, 'production' runs cheroot
+# with a bounded worker pool (see app/serving.py)
+SERVER_MODE = _env('SERVER', 'dev')
+SERVER_THREADS = int(_env('SERVER_THREADS', '16'))
+# Workers that slow (nmcli, scan, ping) and streaming (SSE) requests may occupy;
+# together they must be fewer than SERVER_THREADS, the rest are kept for fast
+# requests
+SERVER_SLOW_SLOTS = int(_env('SERVER_SLOW_SLOTS', '4'))
+SERVER_STREAM_SLOTS = int(_env('SERVER_STREAM_SLOTS', '6'))
+# Socket read / keep-alive idle timeout, and time allowed to drain on SIGTERM
+SERVER_SOCKET_TIMEOUT = int(_env('SERVER_SOCKET_TIMEOUT', '10'))
+SERVER_DRAIN_TIMEOUT = int(_env('SERVER_DRAIN_TIMEOUT', '20'))
+SERVER_BACKLOG = int(_env('SERVER_BACKLOG', '64'))
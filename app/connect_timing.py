@@ -0,0 +1,109 @@
+"""
+Connect Timing
+Times the phases of each connect attempt and summarizes them per SSID
+"""
+import time
+from datetime import datetime, timedelta
+
+from app.database import get_connect_attempts
+from app.icmp import percentile
+
+# Order phases are reported in; backends only time the phases they can observe
+PHASES = (
+    'ap_select',        # picking the best access point from the scan
+    'profile_lookup',   # finding an existing saved profile
+    'profile_delete',   # removing the old profile before a password change
+    'activate',         # nmcli: association, authentication and DHCP together
+    'associate',        # D-Bus: association and authentication
+    'ip_config',        # D-Bus: DHCP and IP configuration
+    'address',          # until wlan0 has an IPv4 address
+    'dns',              # first name lookup on the new network
+)
+
+
+class PhaseTimer:
+    """Times consecutive phases of one operation
+
+    start() ends the running phase (if any) and begins the next one.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget all phases and restart the total"""
+        self.phases = {}
+        self._current = None
+        self._started = None
+        self._created = time.perf_counter()
+
+    def start(self, name):
+        """End the running phase and start timing `name`"""
+        self.stop()
+        self._current = name
+        self._started = time.perf_counter()
+
+    def stop(self):
+        """End the running phase"""
+        if self._current is not None:
+            elapsed = (time.perf_counter() - self._started) * 1000
+            self.phases[self._current] = round(self.phases.get(self._current, 0) + elapsed, 1)
+            self._current = None
+
+    @property
+    def current(self):
+        """Name of the running phase, or None"""
+        return self._current
+
+    @property
+    def total_ms(self):
+        return round((time.perf_counter() - self._created) * 1000, 1)
+
+
+def summarize_durations(values):
+    """Count and percentiles of a list of durations in ms"""
+    ordered = sorted(values)
+    if not ordered:
+        return {'count': 0}
+    return {
+        'count': len(ordered),
+        'p50_ms': round(percentile(ordered, 50), 1),
+        'p90_ms': round(percentile(ordered, 90), 1),
+        'p99_ms': round(percentile(ordered, 99), 1),
+        'max_ms': ordered[-1],
+    }
+
+
+def connect_timings(ssid=None, days=30, history=20):
+    """Per-SSID connect timing summaries with the most recent attempts
+
+    Percentiles of the total and of each phase are computed over successful
+    attempts only, so failures that time out do not skew them.
+    """
+    attempts = get_connect_attempts(ssid, datetime.now() - timedelta(days=days))
+
+    networks = {}
+    for attempt in attempts:
+        network = networks.setdefault(attempt['ssid'], {
+            'attempts': 0, 'successes': 0, 'totals': [], 'phases': {}, 'history': []
+        })
+        network['attempts'] += 1
+        if len(network['history']) < history:
+            network['history'].append(attempt)
+        if not attempt['success']:
+            continue
+        network['successes'] += 1
+        if attempt['duration_ms'] is None:
+            continue
+        network['totals'].append(attempt['duration_ms'])
+        for phase, ms in (attempt['phases'] or {}).items():
+            network['phases'].setdefault(phase, []).append(ms)
+
+    for network in networks.values():
+        network['total'] = summarize_durations(network.pop('totals'))
+        phases = network['phases']
+        network['phases'] = {
+            phase: summarize_durations(phases[phase])
+            for phase in sorted(phases, key=lambda p: PHASES.index(p) if p in PHASES else len(PHASES))
+        }
+    return networks
@@ -1,85 +1,317 @@
 """
-Database management for saved WiFi networks
+Database management for saved WiFi networks and link history
 """
+import json
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-import os
+
+from app import metrics
 
 DB_PATH = 'wifi_manager.db'
 
-def init_db():
-    """Initialize the database with required tables"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
+# Connections kept open and shared between request threads
+POOL_SIZE = 4
+
+SCHEMA = [
+    '''
         CREATE TABLE IF NOT EXISTS saved_networks (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             ssid TEXT UNIQUE NOT NULL,
             connected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-    ''')
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS idx_saved_networks_last_used
+        ON saved_networks (last_used DESC)
+    ''',
+    # Link quality time series; older rows are rolled up into coarser
+    # resolutions (seconds per sample) by downsample_link_samples
+    '''
+        CREATE TABLE IF NOT EXISTS link_samples (
+            ts INTEGER NOT NULL,
+            resolution INTEGER NOT NULL,
+            rssi REAL,
+            link_rate REAL,
+            rtt_ms REAL,
+            loss REAL,
+            PRIMARY KEY (ts, resolution)
+        ) WITHOUT ROWID
+    ''',
+    # One row per connect attempt, used to rank saved networks for failover
+    '''
+        CREATE TABLE IF NOT EXISTS connect_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ssid TEXT NOT NULL,
+            attempted_at TIMESTAMP NOT NULL,
+            success INTEGER NOT NULL,
+            duration_ms REAL,
+            phases TEXT
+        )
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS idx_connect_attempts_ssid
+        ON connect_attempts (ssid, attempted_at)
+    ''',
+]
+
+class ConnectionPool:
+    """A fixed set of persistent SQLite connections shared between threads
+    
+    Each connection is used by one thread at a time. Connections run in WAL
+    mode so readers never wait for a writer, and each keeps its own cache of
+    prepared statements for the queries below.
+    """
+    
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False,
+                               cached_statements=64)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        return conn
+    
+    @contextmanager
+    def connection(self, query='other'):
+        """Borrow a connection, committing on success and rolling back on error
+        
+        Time spent waiting for a connection and running the block are
+        recorded in app.metrics under `query`.
+        """
+        waited = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._idle.get()
+        
+        started = time.perf_counter()
+        metrics.db_pool_wait.observe(started - waited)
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._idle.put(conn)
+            metrics.db_query_duration.observe(time.perf_counter() - started, query)
     
-    conn.commit()
-    conn.close()
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+
+_pool = None
+_pool_lock = threading.Lock()
+_initialized_path = None
+
+def get_pool():
+    """Get the connection pool for DB_PATH, creating the schema on first use"""
+    global _pool, _initialized_path
+    if _pool is None or _pool.path != DB_PATH:
+        with _pool_lock:
+            if _pool is None or _pool.path != DB_PATH:
+                if _pool is not None:
+                    _pool.close()
+                _pool = ConnectionPool(DB_PATH)
+    if _initialized_path != DB_PATH:
+        with _pool_lock:
+            if _initialized_path != DB_PATH:
+                with _pool.connection('init_db') as conn:
+                    for statement in SCHEMA:
+                        conn.execute(statement)
+                _initialized_path = DB_PATH
+    return _pool
+
+def init_db():
+    """Initialize the database with required tables
+    
+    Safe to call more than once; the schema is only created once per process.
+    """
+    get_pool()
 
 def add_saved_network(ssid):
     """Add a network to saved networks or update last_used if exists"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
+    add_saved_networks([ssid])
+
+def add_saved_networks(ssids):
+    """Add several networks (or update their last_used) in one transaction"""
+    now = datetime.now()
     try:
-        cursor.execute('''
-            INSERT INTO saved_networks (ssid, connected_at, last_used)
-            VALUES (?, ?, ?)
-            ON CONFLICT(ssid) DO UPDATE SET last_used = ?
-        ''', (ssid, datetime.now(), datetime.now(), datetime.now()))
-        conn.commit()
+        with get_pool().connection('add_saved_networks') as conn:
+            conn.executemany('''
+                INSERT INTO saved_networks (ssid, connected_at, last_used)
+                VALUES (?, ?, ?)
+                ON CONFLICT(ssid) DO UPDATE SET last_used = ?
+            ''', [(ssid, now, now, now) for ssid in ssids])
     except Exception as e:
         print(f"Error adding saved network: {e}")
-    finally:
-        conn.close()
 
 def get_saved_networks():
     """Get all saved networks ordered by last used"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT ssid, connected_at, last_used
-        FROM saved_networks
-        ORDER BY last_used DESC
-    ''')
-    
-    networks = cursor.fetchall()
-    conn.close()
+    with get_pool().connection('get_saved_networks') as conn:
+        networks = conn.execute('''
+            SELECT ssid, connected_at, last_used
+            FROM saved_networks
+            ORDER BY last_used DESC
+        ''').fetchall()
     
     return [{'ssid': row[0], 'connected_at': row[1], 'last_used': row[2]} 
             for row in networks]
 
+def count_saved_networks():
+    """Number of saved networks"""
+    with get_pool().connection('count_saved_networks') as conn:
+        return conn.execute('SELECT COUNT(*) FROM saved_networks').fetchone()[0]
+
 def forget_network(ssid):
     """Remove a network from saved networks"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
+    return forget_networks([ssid])
+
+def forget_networks(ssids):
+    """Remove several networks from saved networks in one transaction"""
     try:
-        cursor.execute('DELETE FROM saved_networks WHERE ssid = ?', (ssid,))
-        conn.commit()
+        with get_pool().connection('forget_networks') as conn:
+            conn.executemany('DELETE FROM saved_networks WHERE ssid = ?',
+                             [(ssid,) for ssid in ssids])
         return True
     except Exception as e:
         print(f"Error forgetting network: {e}")
         return False
-    finally:
-        conn.close()
 
 def network_exists(ssid):
     """Check if a network is in saved networks"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    with get_pool().connection('network_exists') as conn:
+        row = conn.execute('SELECT 1 FROM saved_networks WHERE ssid = ?', (ssid,)).fetchone()
+    
+    return row is not None
+
+def record_connect_attempt(ssid, success, duration_ms=None, phases=None):
+    """Record the outcome of a connect attempt, with its phase timings in ms"""
+    try:
+        with get_pool().connection('record_connect_attempt') as conn:
+            conn.execute('''
+                INSERT INTO connect_attempts (ssid, attempted_at, success, duration_ms, phases)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (ssid, datetime.now(), int(bool(success)), duration_ms,
+                  json.dumps(phases) if phases is not None else None))
+    except Exception as e:
+        print(f"Error recording connect attempt: {e}")
+
+def get_connect_attempts(ssid=None, since=None):
+    """Connect attempts, newest first, optionally for one SSID and after `since`"""
+    with get_pool().connection('get_connect_attempts') as conn:
+        rows = conn.execute('''
+            SELECT ssid, attempted_at, success, duration_ms, phases
+            FROM connect_attempts
+            WHERE (? IS NULL OR ssid = ?) AND (? IS NULL OR attempted_at >= ?)
+            ORDER BY attempted_at DESC
+        ''', (ssid, ssid, since, since)).fetchall()
+    
+    return [{'ssid': row[0], 'time': row[1], 'success': bool(row[2]), 'duration_ms': row[3],
+             'phases': json.loads(row[4]) if row[4] else None}
+            for row in rows]
+
+def get_connect_success_rates(since):
+    """Connect success rate per SSID for attempts after `since` (a datetime)"""
+    with get_pool().connection('get_connect_success_rates') as conn:
+        rows = conn.execute('''
+            SELECT ssid, COUNT(*), SUM(success)
+            FROM connect_attempts
+            WHERE attempted_at >= ?
+            GROUP BY ssid
+        ''', (since,)).fetchall()
+    
+    return {row[0]: {'attempts': row[1], 'success_rate': row[2] / row[1]} for row in rows}
+
+LINK_METRICS = ('rssi', 'link_rate', 'rtt_ms', 'loss')
+
+def add_link_sample(ts, resolution, rssi, link_rate, rtt_ms, loss):
+    """Store one link quality sample"""
+    add_link_samples([(ts, resolution, rssi, link_rate, rtt_ms, loss)])
+
+def add_link_samples(samples):
+    """Store (ts, resolution, rssi, link_rate, rtt_ms, loss) samples in one transaction"""
+    try:
+        with get_pool().connection('add_link_samples') as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO link_samples (ts, resolution, rssi, link_rate, rtt_ms, loss)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(int(sample[0]),) + tuple(sample[1:]) for sample in samples])
+    except Exception as e:
+        print(f"Error adding link sample: {e}")
+
+def get_link_history(metric, start, end, bucket):
+    """Average a link metric into buckets of `bucket` seconds between start and end"""
+    if metric not in LINK_METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+    
+    # metric is checked against LINK_METRICS above, so formatting it in is safe
+    with get_pool().connection('get_link_history') as conn:
+        rows = conn.execute(f'''
+            SELECT (ts / ?) * ? AS bucket_ts, AVG({metric})
+            FROM link_samples
+            WHERE ts BETWEEN ? AND ? AND {metric} IS NOT NULL
+            GROUP BY bucket_ts
+            ORDER BY bucket_ts
+        ''', (bucket, bucket, int(start), int(end))).fetchall()
     
-    cursor.execute('SELECT COUNT(*) FROM saved_networks WHERE ssid = ?', (ssid,))
-    count = cursor.fetchone()[0]
-    conn.close()
+    return [[row[0], round(row[1], 2)] for row in rows]
+
+def downsample_link_samples(now, tiers):
+    """Roll old link samples up into coarser resolutions
     
-    return count > 0
+    tiers is a list of (resolution, keep_seconds) from finest to coarsest.
+    Rows of each tier older than keep_seconds are averaged into the next
+    tier's resolution; the coarsest tier's old rows are deleted.
+    """
+    try:
+        with get_pool().connection('downsample_link_samples') as conn:
+            for index, (resolution, keep) in enumerate(tiers):
+                if index == len(tiers) - 1:
+                    conn.execute('''
+                        DELETE FROM link_samples WHERE resolution = ? AND ts < ?
+                    ''', (resolution, int(now - keep)))
+                    continue
+                
+                # Only whole buckets of the coarser resolution are rolled up
+                next_resolution = tiers[index + 1][0]
+                cutoff = int(now - keep) // next_resolution * next_resolution
+                conn.execute('''
+                    INSERT OR REPLACE INTO link_samples (ts, resolution, rssi, link_rate, rtt_ms, loss)
+                    SELECT (ts / ?) * ?, ?, AVG(rssi), AVG(link_rate), AVG(rtt_ms), AVG(loss)
+                    FROM link_samples
+                    WHERE resolution = ? AND ts < ?
+                    GROUP BY ts / ?
+                ''', (next_resolution, next_resolution, next_resolution,
+                      resolution, cutoff, next_resolution))
+                conn.execute('''
+                    DELETE FROM link_samples WHERE resolution = ? AND ts < ?
+                ''', (resolution, cutoff))
+    except Exception as e:
+        print(f"Error downsampling link samples: {e}")
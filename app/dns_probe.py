@@ -0,0 +1,162 @@
+"""
+DNS Resolver Probe
+Times raw UDP queries against each resolver concurrently: one for a name the
+resolver has to look up (cold) and repeated ones for a name it has cached
+"""
+import os
+import secrets
+import socket
+import statistics
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import config
+
+DNS_HEADER = struct.Struct('!HHHHHH')
+QTYPE_A = 1
+QCLASS_IN = 1
+FLAG_RD = 0x0100
+FLAG_QR = 0x8000
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+RCODE_NAMES = {1: 'FORMERR', 2: 'SERVFAIL', 4: 'NOTIMP', 5: 'REFUSED'}
+
+
+def build_query(name, query_id, qtype=QTYPE_A):
+    """DNS query packet for name with recursion desired"""
+    question = b''.join(
+        bytes([len(label)]) + label.encode('idna') for label in name.rstrip('.').split('.')
+    ) + b'\0'
+    return DNS_HEADER.pack(query_id, FLAG_RD, 1, 0, 0, 0) + question + struct.pack('!HH', qtype, QCLASS_IN)
+
+
+def parse_response(data, query_id):
+    """(rcode, answer count) of a response to query_id, or None if it is not one"""
+    if len(data) < DNS_HEADER.size:
+        return None
+    response_id, flags, _, answers, _, _ = DNS_HEADER.unpack_from(data)
+    if response_id != query_id or not flags & FLAG_QR:
+        return None
+    return flags & 0x000F, answers
+
+
+def parse_server(server):
+    """(address, port) of a resolver given as 'addr', 'addr:port' or '[v6]:port'"""
+    if server.startswith('['):
+        host, _, port = server[1:].partition(']:')
+        return host, int(port or 53)
+    if server.count(':') == 1:
+        host, port = server.split(':')
+        return host, int(port)
+    return server, 53
+
+
+def query(server, name, timeout):
+    """Send one query, returns (latency ms or None on timeout, error or None)
+
+    NXDOMAIN counts as a successful answer; SERVFAIL, REFUSED and other
+    error codes are returned as the error.
+    """
+    host, port = parse_server(server)
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    query_id = int.from_bytes(os.urandom(2), 'big')
+    packet = build_query(name, query_id)
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect((host, port))
+            started = time.perf_counter()
+            sock.send(packet)
+            deadline = started + timeout
+            while True:
+                sock.settimeout(max(0.001, deadline - time.perf_counter()))
+                parsed = parse_response(sock.recv(4096), query_id)
+                if parsed is not None:
+                    break
+        except socket.timeout:
+            return None, 'timeout'
+        except OSError as e:
+            return None, str(e)
+    latency = round((time.perf_counter() - started) * 1000, 2)
+    rcode = parsed[0]
+    if rcode not in (RCODE_NOERROR, RCODE_NXDOMAIN):
+        return latency, RCODE_NAMES.get(rcode, f'rcode {rcode}')
+    return latency, None
+
+
+def probe_server(server, cached_name=None, cold_domain=None, cached_queries=None, timeout=None):
+    """Cold and cached lookup latency of one resolver
+
+    The cached name is looked up once to make sure the resolver has it,
+    then cached_queries more times; the cold query is for a random name
+    under cold_domain, which no resolver can have cached.
+    """
+    cached_name = cached_name or config.DNS_PROBE_NAME
+    cold_domain = cold_domain or config.DNS_PROBE_COLD_DOMAIN
+    cached_queries = cached_queries or config.DNS_PROBE_CACHED_QUERIES
+    timeout = timeout or config.DNS_PROBE_TIMEOUT
+
+    result = {'server': server, 'cold_ms': None, 'cached_ms': None, 'queries': 0,
+              'timeouts': 0, 'failures': 0, 'errors': []}
+
+    def record(latency, error):
+        result['queries'] += 1
+        if error == 'timeout':
+            result['timeouts'] += 1
+        elif error:
+            result['failures'] += 1
+            if error not in result['errors']:
+                result['errors'].append(error)
+        return None if error else latency
+
+    # Warm-up: a resolver that does not answer this is not asked again
+    if record(*query(server, cached_name, timeout)) is None and result['timeouts']:
+        result['status'] = 'unreachable'
+        return result
+
+    result['cold_ms'] = record(*query(server, f"{secrets.token_hex(6)}.{cold_domain}", timeout))
+    cached = []
+    for _ in range(cached_queries):
+        latency, error = query(server, cached_name, timeout)
+        if record(latency, error) is not None:
+            cached.append(latency)
+        elif error == 'timeout':
+            # Keeps a lossy resolver's probe within a few timeouts
+            break
+    if cached:
+        result['cached_ms'] = round(statistics.median(cached), 2)
+
+    if result['cached_ms'] is None:
+        result['status'] = 'failing'
+    elif result['timeouts'] or result['failures']:
+        result['status'] = 'unreliable'
+    else:
+        result['status'] = 'ok'
+    return result
+
+
+def rank_key(result):
+    """Sort key putting reliable resolvers first, then the fastest"""
+    order = {'ok': 0, 'unreliable': 1, 'failing': 2, 'unreachable': 3}
+    cold = result['cold_ms'] if result['cold_ms'] is not None else float('inf')
+    cached = result['cached_ms'] if result['cached_ms'] is not None else float('inf')
+    return order[result['status']], cached + cold
+
+
+def probe_resolvers(servers, **options):
+    """Probe several resolvers at once
+
+    Returns {'results': [...] best first, 'recommended': server or None}.
+    """
+    servers = list(dict.fromkeys(servers))
+    if not servers:
+        return {'results': [], 'recommended': None}
+    with ThreadPoolExecutor(max_workers=len(servers), thread_name_prefix='dns-probe') as executor:
+        results = list(executor.map(lambda server: probe_server(server, **options), servers))
+    results.sort(key=rank_key)
+    best = results[0]
+    return {
+        'results': results,
+        'recommended': best['server'] if best['status'] in ('ok', 'unreliable') else None,
+    }
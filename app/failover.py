@@ -0,0 +1,261 @@
+"""
+Failover Supervisor
+Watches wlan0 and upstream reachability, and reconnects to the best saved
+network within seconds when the current one is lost
+"""
+import collections
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app import config, icmp, netinfo
+from app.database import get_connect_success_rates, get_saved_networks
+from app.wifi_manager import (
+    ap_score, connect_to_network, get_current_connection, rescan_networks, scan_access_points
+)
+
+# Candidates tried per failover before waiting for the hold-down to pass
+MAX_ATTEMPTS = 3
+
+# Connect history used for success rates
+SUCCESS_RATE_WINDOW = timedelta(days=30)
+
+# Weights of the candidate score components (each scaled to 0-100)
+SIGNAL_WEIGHT = 0.6
+SUCCESS_WEIGHT = 0.3
+RECENCY_WEIGHT = 0.1
+
+# Success rate assumed for networks without connect history
+DEFAULT_SUCCESS_RATE = 0.5
+
+# Decisions kept for /api/failover
+LOG_SIZE = 50
+
+# Reported when no upstream probe could run (e.g. ICMP sockets not permitted),
+# which says nothing about the link and is not counted as a failure
+UPSTREAM_UNKNOWN = 'upstream unknown'
+
+
+def _parse_timestamp(value):
+    """Parse a TIMESTAMP column value, returns None if it cannot be parsed"""
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def check_link():
+    """Check wlan0 is up with an address, returns a failure reason or None"""
+    if netinfo.interface_operstate(config.WIFI_INTERFACE) != 'up':
+        return 'link down'
+    if not netinfo.interface_ipv4(config.WIFI_INTERFACE):
+        return 'no address'
+    return None
+
+
+def check_upstream():
+    """Check the gateway or an upstream target answers, returns a failure reason or None
+
+    All targets are pinged at once, so one lost reply to a single target is
+    not mistaken for an outage. Returns UPSTREAM_UNKNOWN if no target could
+    be pinged at all.
+    """
+    targets = list(config.FAILOVER_UPSTREAM_TARGETS)
+    gateway = netinfo.default_gateway(config.WIFI_INTERFACE)
+    if gateway:
+        targets.insert(0, gateway)
+    if not targets:
+        return None
+
+    results = icmp.ping_many(targets, count=1, timeout=1.0)
+    if any(result.get('received') for result in results.values()):
+        return None
+    if all(result['type'] == 'error' for result in results.values()):
+        errors = sorted({result['error'] for result in results.values()})
+        print(f"Upstream check could not run: {'; '.join(errors)}")
+        return UPSTREAM_UNKNOWN
+    return 'upstream unreachable'
+
+
+def rank_candidates(access_points, saved, success_rates, now=None):
+    """Score the saved networks that are visible, best first
+
+    The score combines the signal of the SSID's best access point, the
+    network's past connect success rate and how recently it was used.
+    """
+    now = now or datetime.now()
+    best_by_ssid = {}
+    for ap in access_points:
+        if ap['ssid'] and (ap['ssid'] not in best_by_ssid or ap_score(ap) > ap_score(best_by_ssid[ap['ssid']])):
+            best_by_ssid[ap['ssid']] = ap
+
+    candidates = []
+    for network in saved:
+        ap = best_by_ssid.get(network['ssid'])
+        if ap is None:
+            continue
+        history = success_rates.get(network['ssid'])
+        success_rate = history['success_rate'] if history else DEFAULT_SUCCESS_RATE
+        last_used = _parse_timestamp(network['last_used'])
+        # Full recency score when used within the last hour, none after ~4 days
+        hours = (now - last_used).total_seconds() / 3600 if last_used else None
+        recency = max(0.0, 100.0 - max(0.0, hours - 1)) if hours is not None else 0.0
+
+        score = (SIGNAL_WEIGHT * min(ap_score(ap), 100)
+                 + SUCCESS_WEIGHT * success_rate * 100
+                 + RECENCY_WEIGHT * recency)
+        candidates.append({
+            'ssid': network['ssid'],
+            'bssid': ap['bssid'],
+            'signal': ap['signal'],
+            'success_rate': round(success_rate, 2),
+            'attempts': history['attempts'] if history else 0,
+            'score': round(score, 1),
+        })
+
+    candidates.sort(key=lambda c: c['score'], reverse=True)
+    return candidates
+
+
+class FailoverSupervisor:
+    """Reconnects to the best saved network when the current one fails
+
+    The link is checked every interval from sysfs and rtnetlink, which is
+    cheap; upstream reachability is checked with a single ICMP echo per
+    target. After `threshold` consecutive failures the visible saved networks
+    are ranked and tried in order. Every decision is logged and kept for
+    /api/failover.
+    """
+
+    def __init__(self, interval=None, threshold=None, holddown=None):
+        self.interval = interval or config.FAILOVER_CHECK_INTERVAL
+        self.threshold = threshold or config.FAILOVER_FAILURE_THRESHOLD
+        self.holddown = holddown if holddown is not None else config.FAILOVER_HOLDDOWN
+        self.failures = 0
+        self.last_failover = None
+        self.last_check = None
+        self.last_reason = None
+        self._log = collections.deque(maxlen=LOG_SIZE)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start supervising in a daemon thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='failover', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the supervisor thread"""
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _record(self, decision):
+        decision['time'] = datetime.now().isoformat(timespec='seconds')
+        with self._lock:
+            self._log.append(decision)
+        chosen = decision.get('chosen') or 'none'
+        print(f"Failover ({decision['reason']}): {decision['action']}, network {chosen}")
+
+    def decisions(self):
+        """Logged failover decisions, newest first"""
+        with self._lock:
+            return list(reversed(self._log))
+
+    def status(self):
+        """Supervisor state and decision log"""
+        return {
+            'enabled': config.FAILOVER_ENABLED,
+            'running': self.running,
+            'consecutive_failures': self.failures,
+            'last_check': self.last_check,
+            'last_failure': self.last_reason,
+            'decisions': self.decisions(),
+        }
+
+    def check(self):
+        """Run one health check, returns the failure reason or None if healthy
+        
+        An upstream check that could not run leaves the failure count as it
+        was and is not reported as a failure.
+        """
+        reason = check_link() or check_upstream()
+        self.last_check = datetime.now().isoformat(timespec='seconds')
+        self.last_reason = reason
+        if reason == UPSTREAM_UNKNOWN:
+            return None
+        self.failures = self.failures + 1 if reason else 0
+        return reason
+
+    def failover(self, reason):
+        """Rank visible saved networks and connect to the best that works"""
+        started = time.monotonic()
+        self.last_failover = started
+        current = get_current_connection()
+        decision = {
+            'reason': reason,
+            'from': current['ssid'] if current else None,
+            'candidates': [],
+            'attempts': [],
+            'chosen': None,
+        }
+
+        saved = get_saved_networks()
+        if not saved:
+            decision['action'] = 'no saved networks'
+            self._record(decision)
+            return decision
+
+        # A fresh scan, so networks that just went away are not tried
+        try:
+            rescan_networks()
+        except Exception as e:
+            print(f"Failover rescan failed, using cached scan: {e}")
+        candidates = rank_candidates(
+            scan_access_points(), saved,
+            get_connect_success_rates(datetime.now() - SUCCESS_RATE_WINDOW)
+        )
+        decision['candidates'] = candidates
+
+        for candidate in candidates[:MAX_ATTEMPTS]:
+            success, message = connect_to_network(candidate['ssid'], bssid=candidate['bssid'])
+            decision['attempts'].append({
+                'ssid': candidate['ssid'], 'success': success, 'message': message
+            })
+            if success:
+                decision['chosen'] = candidate['ssid']
+                break
+
+        if decision['chosen']:
+            decision['action'] = 'reconnected'
+        elif candidates:
+            decision['action'] = 'all candidates failed'
+        else:
+            decision['action'] = 'no saved network in range'
+        decision['duration_s'] = round(time.monotonic() - started, 2)
+        self._record(decision)
+        return decision
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                reason = self.check()
+                held_down = self.last_failover is not None \
+                    and started - self.last_failover < self.holddown
+                if reason and self.failures >= self.threshold and not held_down:
+                    if self.failover(reason)['chosen']:
+                        self.failures = 0
+            except Exception as e:
+                print(f"Error in failover supervisor: {e}")
+            self._stop.wait(max(0, self.interval - (time.monotonic() - started)))
+
+
+failover_supervisor = FailoverSupervisor()
@@ -0,0 +1,111 @@
+"""
+hostapd Control Interface
+Talks to the hotspot's hostapd over its control socket in-process, and reads
+dnsmasq's DHCP leases, without running hostapd_cli or iw
+"""
+import itertools
+import os
+import socket
+import tempfile
+
+from app import config
+
+_client_ids = itertools.count()
+
+
+class HostapdError(Exception):
+    """hostapd's control socket is missing, unreachable or refused a command"""
+
+
+def control_path(interface=None):
+    """Path of hostapd's control socket for an interface"""
+    return os.path.join(config.HOSTAPD_CTRL_DIR, interface or config.HOTSPOT_INTERFACE)
+
+
+def request(command, interface=None, timeout=1.0):
+    """Send one control command and return hostapd's reply as text"""
+    path = control_path(interface)
+    # Replies are sent to the client's own bound address
+    local = os.path.join(tempfile.gettempdir(), f'wifi-manager-hostapd-{os.getpid()}-{next(_client_ids)}')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        sock.settimeout(timeout)
+        sock.bind(local)
+        sock.connect(path)
+        sock.send(command.encode())
+        reply = sock.recv(65536).decode(errors='replace')
+    except OSError as e:
+        raise HostapdError(f"hostapd control socket {path}: {e}") from e
+    finally:
+        sock.close()
+        try:
+            os.unlink(local)
+        except OSError:
+            pass
+    if reply.startswith('FAIL') or reply.startswith('UNKNOWN COMMAND'):
+        raise HostapdError(f"hostapd refused '{command}': {reply.strip()}")
+    return reply
+
+
+def parse_station(reply):
+    """Parse a STA-FIRST/STA-NEXT reply into a dict, or None at the end of the list"""
+    lines = reply.strip().split('\n')
+    if not lines or not lines[0].strip():
+        return None
+    station = {'mac': lines[0].strip().lower()}
+    for line in lines[1:]:
+        key, sep, value = line.partition('=')
+        if sep:
+            station[key.strip()] = value.strip()
+    return station
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def stations(interface=None):
+    """Stations associated with the hotspot, with their byte and packet counters
+
+    Counters are from the access point's side: rx_bytes is what the station
+    sent, tx_bytes what it received.
+    """
+    result = []
+    station = parse_station(request('STA-FIRST', interface))
+    while station:
+        result.append({
+            'mac': station['mac'],
+            'rx_bytes': _int(station.get('rx_bytes')),
+            'tx_bytes': _int(station.get('tx_bytes')),
+            'rx_packets': _int(station.get('rx_packets')),
+            'tx_packets': _int(station.get('tx_packets')),
+            'signal_dbm': _int(station.get('signal')),
+            'connected_s': _int(station.get('connected_time')),
+            'inactive_ms': _int(station.get('inactive_msec')),
+        })
+        try:
+            station = parse_station(request(f"STA-NEXT {station['mac']}", interface))
+        except HostapdError:
+            # hostapd answers FAIL after the last station
+            break
+    return result
+
+
+def dhcp_leases(path=None):
+    """dnsmasq leases as {mac: {'ip': ..., 'hostname': ...}}"""
+    leases = {}
+    try:
+        with open(path or config.DNSMASQ_LEASES_FILE) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 4:
+                    leases[fields[1].lower()] = {
+                        'ip': fields[2],
+                        'hostname': None if fields[3] == '*' else fields[3],
+                    }
+    except OSError:
+        pass
+    return leases
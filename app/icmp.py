@@ -0,0 +1,202 @@
+"""
+ICMP Ping Engine
+Pings many hosts concurrently from one in-process ICMP socket and streams each reply
+"""
+import math
+import random
+import select
+import socket
+import struct
+import time
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+ICMP_HEADER = struct.Struct('!BBHHH')
+PAYLOAD_SIZE = 56
+
+
+def _checksum(data):
+    """RFC 1071 internet checksum"""
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _echo_request(ident, seq):
+    """Build an ICMP echo request packet"""
+    payload = bytes(PAYLOAD_SIZE)
+    header = ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    return ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, _checksum(header + payload), ident, seq) + payload
+
+
+def open_icmp_socket():
+    """Open an ICMP socket, returns (socket, is_raw)
+
+    Unprivileged datagram ICMP sockets are preferred (allowed by
+    net.ipv4.ping_group_range); raw sockets need root.
+    """
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+    except PermissionError:
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+
+
+def resolve(host):
+    """Resolve a host name to an IPv4 address"""
+    return socket.getaddrinfo(host, None, socket.AF_INET)[0][4][0]
+
+
+def percentile(sorted_values, pct):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * pct / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(rtts, sent):
+    """Loss, min/avg/max/mdev, jitter and percentiles for a list of RTTs in ms
+
+    Jitter is the mean absolute difference between consecutive replies.
+    """
+    received = len(rtts)
+    stats = {
+        'sent': sent,
+        'received': received,
+        'packet_loss': round(100.0 * (sent - received) / sent, 1) if sent else 0.0,
+    }
+    if not rtts:
+        return stats
+
+    ordered = sorted(rtts)
+    avg = sum(rtts) / received
+    stats.update({
+        'min_ms': round(ordered[0], 3),
+        'avg_ms': round(avg, 3),
+        'max_ms': round(ordered[-1], 3),
+        'mdev_ms': round(math.sqrt(sum((r - avg) ** 2 for r in rtts) / received), 3),
+        'jitter_ms': round(sum(abs(b - a) for a, b in zip(rtts, rtts[1:])) / (received - 1), 3)
+        if received > 1 else 0.0,
+        'p50_ms': round(percentile(ordered, 50), 3),
+        'p90_ms': round(percentile(ordered, 90), 3),
+        'p99_ms': round(percentile(ordered, 99), 3),
+    })
+    return stats
+
+
+def iter_ping(hosts, count=4, interval=1.0, timeout=2.0):
+    """Ping all hosts concurrently, yielding events as they happen
+
+    Events are dicts with a 'type' of:
+      'error'   - host could not be resolved or pinged
+      'reply'   - echo reply received ('seq', 'rtt_ms')
+      'timeout' - no reply for 'seq' within the timeout
+      'summary' - final statistics for one host (see summarize)
+    """
+    targets = []
+    for host in hosts:
+        try:
+            targets.append((host, resolve(host)))
+        except (OSError, UnicodeError) as e:
+            yield {'type': 'error', 'host': host, 'error': f"Cannot resolve host: {e}"}
+    if not targets:
+        return
+
+    try:
+        sock, raw = open_icmp_socket()
+    except OSError as e:
+        for host, _ in targets:
+            yield {'type': 'error', 'host': host, 'error': f"Cannot open ICMP socket: {e}"}
+        return
+
+    # Hosts that resolve to the same address share one probe stream
+    hosts_by_address = {}
+    for host, address in targets:
+        hosts_by_address.setdefault(address, []).append(host)
+
+    # Every raw socket sees every echo reply, so concurrent pings (the link
+    # sampler, failover and the ping API) tell theirs apart by a random
+    # ident and sequence start; datagram sockets are filtered by the kernel
+    ident = random.getrandbits(16)
+    first_seq = random.getrandbits(16)
+    rtts = {address: [] for address in hosts_by_address}
+    sent = {address: 0 for address in hosts_by_address}
+    pending = {}  # (address, wire seq) -> (seq, sent_at)
+    seq = 0
+    next_send = time.monotonic()
+
+    try:
+        while seq < count or pending:
+            now = time.monotonic()
+
+            if seq < count and now >= next_send:
+                wire_seq = (first_seq + seq) & 0xFFFF
+                packet = _echo_request(ident, wire_seq)
+                for address, names in hosts_by_address.items():
+                    try:
+                        sock.sendto(packet, (address, 0))
+                        pending[(address, wire_seq)] = (seq, time.monotonic())
+                        sent[address] += 1
+                    except OSError as e:
+                        for host in names:
+                            yield {'type': 'error', 'host': host, 'error': str(e)}
+                seq += 1
+                next_send = now + interval
+
+            for key, (probe_seq, sent_at) in list(pending.items()):
+                if now - sent_at >= timeout:
+                    del pending[key]
+                    for host in hosts_by_address[key[0]]:
+                        yield {'type': 'timeout', 'host': host, 'address': key[0], 'seq': probe_seq}
+
+            wake = [sent_at + timeout for _, sent_at in pending.values()]
+            if seq < count:
+                wake.append(next_send)
+            if not wake:
+                break
+            ready, _, _ = select.select([sock], [], [], max(0.0, min(wake) - time.monotonic()))
+            if not ready:
+                continue
+
+            data, (address, _) = sock.recvfrom(2048)
+            received_at = time.monotonic()
+            if raw:
+                # Raw sockets include the IP header and see every ICMP packet
+                data = data[(data[0] & 0x0F) * 4:]
+            if len(data) < ICMP_HEADER.size:
+                continue
+            icmp_type, _, _, reply_ident, reply_seq = ICMP_HEADER.unpack_from(data)
+            if icmp_type != ICMP_ECHO_REPLY or (raw and reply_ident != ident):
+                continue
+            probe = pending.pop((address, reply_seq), None)
+            if probe is None:
+                continue
+            probe_seq, sent_at = probe
+            rtt = (received_at - sent_at) * 1000
+            rtts[address].append(rtt)
+            for host in hosts_by_address[address]:
+                yield {'type': 'reply', 'host': host, 'address': address,
+                       'seq': probe_seq, 'rtt_ms': round(rtt, 3)}
+    finally:
+        sock.close()
+
+    for host, address in targets:
+        summary = summarize(rtts[address], sent[address])
+        summary.update({'type': 'summary', 'host': host, 'address': address})
+        yield summary
+
+
+def ping_many(hosts, count=4, interval=1.0, timeout=2.0):
+    """Ping hosts concurrently and return {host: summary}, errors included"""
+    results = {}
+    for event in iter_ping(hosts, count, interval, timeout):
+        if event['type'] == 'summary':
+            results[event['host']] = event
+        elif event['type'] == 'error':
+            results.setdefault(event['host'], event)
+    return results
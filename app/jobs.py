@@ -0,0 +1,240 @@
+"""
+Radio Job Queue
+Runs operations that change an interface's radio state (connect, forget,
+rescan) one at a time per interface, as background jobs clients can poll,
+stream or cancel
+"""
+import collections
+import queue
+import threading
+import time
+import uuid
+
+from app import commands
+
+# Finished jobs kept for polling, per interface
+FINISHED_JOBS_KEPT = 50
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised when waiting for a job that was cancelled before it ran"""
+
+
+class Job:
+    """One queued radio operation
+
+    `fn` returns (success, message) like the wifi_manager functions, or any
+    other value for a job that succeeds. `result` is a dict the function can
+    fill in while it runs (such as connect timings) and is served with the job.
+    """
+
+    def __init__(self, kind, fn, params=None, on_done=None, result=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params or {}
+        self.state = QUEUED
+        self.message = ''
+        self.result = result if result is not None else {}
+        self.value = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.revision = 0
+        self._fn = fn
+        self._on_done = on_done
+        self._changed = threading.Condition()
+
+    def _set(self, **changes):
+        with self._changed:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.revision += 1
+            self._changed.notify_all()
+
+    @property
+    def done(self):
+        return self.state in FINISHED_STATES
+
+    def wait_for_change(self, revision, timeout=None):
+        """Block until the job changes after `revision`, returns the new revision"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.revision != revision, timeout)
+            return self.revision
+
+    def wait(self, timeout=None):
+        """Block until the job finishes, returns what its function returned
+
+        Raises JobCancelled if it was cancelled, or the function's exception.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self.done, timeout)
+        if self.state == CANCELLED:
+            raise JobCancelled(self.message)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    def to_dict(self):
+        """JSON-serializable view of the job"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'state': self.state,
+            'message': self.message,
+            'result': self.result,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class InterfaceExecutor:
+    """Runs jobs for one interface strictly one after another
+
+    A single worker thread drains the queue, so a connect, a forget and a
+    rescan on the same interface can never overlap. Calls made from inside a
+    running job run inline instead of queueing behind themselves.
+    """
+
+    def __init__(self, interface):
+        self.interface = interface
+        self._queue = queue.Queue()
+        self._jobs = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._thread = None
+        self.current = None
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name=f'radio-{self.interface}', daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, kind, fn, params=None, on_done=None, result=None):
+        """Queue fn as a job, returns the Job"""
+        job = Job(kind, fn, params, on_done, result)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._queue.put(job)
+        self._ensure_worker()
+        return job
+
+    def run(self, kind, fn, params=None):
+        """Run fn as a job and wait for it, returns what fn returned
+
+        Raises JobCancelled if the job is cancelled while queued.
+        """
+        if getattr(self._local, 'in_job', False):
+            return fn()
+        # The caller is blocked until the job is done, so the job can share
+        # its command results (see app.commands.begin_scope)
+        return self.submit(kind, commands.bind_scope(fn), params).wait()
+
+    def get(self, job_id):
+        """Job by id, or None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        """All known jobs, newest first"""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def pending(self):
+        """Number of jobs waiting to run"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.state == QUEUED)
+
+    def cancel(self, job_id):
+        """Cancel a queued job, returns (success, message)
+
+        A running operation cannot be interrupted safely halfway (NetworkManager
+        would be left mid-activation), so only queued jobs can be cancelled.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return False, "Job not found"
+        with job._changed:
+            if job.state != QUEUED:
+                return False, f"Job is already {job.state}"
+            job.state = CANCELLED
+            job.message = "Cancelled"
+            job.finished = time.time()
+            job.revision += 1
+            job._changed.notify_all()
+        return True, "Job cancelled"
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            del self._jobs[job_id]
+
+    def _run(self):
+        self._local.in_job = True
+        while True:
+            job = self._queue.get()
+            with job._changed:
+                if job.state == CANCELLED:
+                    continue
+                job.state = RUNNING
+                job.started = time.time()
+                job.revision += 1
+                job._changed.notify_all()
+
+            self.current = job
+            value = error = None
+            try:
+                value = job._fn()
+                if isinstance(value, tuple):
+                    success, message = value
+                else:
+                    success, message = True, ''
+                state = SUCCEEDED if success else FAILED
+            except Exception as e:
+                print(f"Error running {job.kind} job: {e}")
+                state, message, error = FAILED, str(e), e
+            self.current = None
+            job._set(state=state, message=message, value=value, error=error,
+                     finished=time.time())
+
+            if job._on_done:
+                try:
+                    job._on_done(job)
+                except Exception as e:
+                    print(f"Error in {job.kind} job callback: {e}")
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(interface):
+    """The process-wide executor of an interface"""
+    with _executors_lock:
+        if interface not in _executors:
+            _executors[interface] = InterfaceExecutor(interface)
+        return _executors[interface]
+
+
+def find_job(job_id):
+    """Look a job up on every interface, returns (job, executor) or (None, None)"""
+    with _executors_lock:
+        executors = list(_executors.values())
+    for executor in executors:
+        job = executor.get(job_id)
+        if job is not None:
+            return job, executor
+    return None, None
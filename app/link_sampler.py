@@ -0,0 +1,91 @@
+"""
+Link Quality Sampler
+Background thread recording wlan0 signal, link rate, gateway RTT and loss over time
+"""
+import threading
+import time
+
+from app import config, icmp, netinfo
+from app.backends import get_backend
+from app.database import add_link_sample, downsample_link_samples, get_link_history, LINK_METRICS
+
+DOWNSAMPLE_EVERY = 3600
+
+
+def take_sample():
+    """Measure the current link quality, returns a dict of metrics (None when unknown)"""
+    link = netinfo.wireless_link(config.WIFI_INTERFACE)
+    sample = {
+        'rssi': link['signal_dbm'] if link else None,
+        'link_rate': get_backend().get_link_rate(),
+        'rtt_ms': None,
+        'loss': None,
+    }
+
+    gateway = netinfo.default_gateway(config.WIFI_INTERFACE)
+    if gateway:
+        stats = icmp.ping_many([gateway], count=3, interval=0.2, timeout=1.0).get(gateway, {})
+        if 'sent' in stats:
+            sample['loss'] = stats['packet_loss']
+            sample['rtt_ms'] = stats.get('avg_ms')
+    return sample
+
+
+class LinkSampler:
+    """Records a link sample every interval and periodically downsamples old data"""
+
+    def __init__(self, interval=None, tiers=None):
+        self.interval = interval or config.LINK_SAMPLE_INTERVAL
+        self.tiers = tiers or config.LINK_HISTORY_TIERS
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling in a daemon thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='link-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the sampling thread"""
+        self._stop.set()
+
+    def _run(self):
+        last_downsample = 0
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                sample = take_sample()
+                add_link_sample(started, self.tiers[0][0], **sample)
+                if started - last_downsample >= DOWNSAMPLE_EVERY:
+                    downsample_link_samples(started, self.tiers)
+                    last_downsample = started
+            except Exception as e:
+                print(f"Error sampling link quality: {e}")
+            self._stop.wait(max(0, self.interval - (time.time() - started)))
+
+
+def get_history(metric, start=None, end=None, max_points=None):
+    """Time series of a metric as [[unix_ts, value], ...]
+
+    Defaults to the last 24 hours. Points are averaged into buckets wide
+    enough that at most max_points are returned.
+    """
+    if metric not in LINK_METRICS:
+        raise ValueError(f"Unknown metric '{metric}', expected one of {', '.join(LINK_METRICS)}")
+    end = int(end) if end is not None else int(time.time())
+    start = int(start) if start is not None else end - 24 * 3600
+    max_points = max_points or config.LINK_HISTORY_MAX_POINTS
+
+    bucket = max(config.LINK_SAMPLE_INTERVAL, -(-(end - start) // max_points))
+    return {
+        'metric': metric,
+        'from': start,
+        'to': end,
+        'bucket': bucket,
+        'points': get_link_history(metric, start, end, bucket),
+    }
+
+
+link_sampler = LinkSampler()
@@ -0,0 +1,163 @@
+"""
+Metrics Module
+In-process counters and histograms exposed in the Prometheus text format
+"""
+import threading
+import time
+
+# Default histogram buckets in seconds
+COMMAND_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        """Add amount to the series with these label values"""
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f'{self.name}{_format_labels(self.labels, label_values)} {_format_number(value)}'
+
+
+class Histogram:
+    """Cumulative histogram of observed values (seconds) with optional labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=HTTP_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """Record one observation for the series with these label values"""
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *label_values):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, label_values)
+
+    def samples(self):
+        with self._lock:
+            snapshot = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for label_values, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labels, label_values, f'le="{_format_number(float(bound))}"')
+                yield f'{self.name}_bucket{le} {cumulative}'
+            le = _format_labels(self.labels, label_values, 'le="+Inf"')
+            yield f'{self.name}_bucket{le} {count}'
+            labels = _format_labels(self.labels, label_values)
+            yield f'{self.name}_sum{labels} {_format_number(total)}'
+            yield f'{self.name}_count{labels} {count}'
+
+
+class _Timer:
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+        return False
+
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def register(metric):
+    """Add a metric to the registry rendered at /metrics, returns it"""
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+# Metrics shared across modules
+
+command_duration = register(Histogram(
+    'wifi_manager_command_duration_seconds', 'Duration of external commands',
+    ('command', 'caller'), COMMAND_BUCKETS
+))
+command_errors = register(Counter(
+    'wifi_manager_command_errors_total',
+    'External commands that exited non-zero, timed out or could not start',
+    ('command', 'reason')
+))
+command_memo_hits = register(Counter(
+    'wifi_manager_command_memo_hits_total',
+    'Read-only commands answered from a shared result instead of being run', ('command',)
+))
+db_query_duration = register(Histogram(
+    'wifi_manager_db_query_duration_seconds', 'Duration of SQLite queries', ('query',), DB_BUCKETS
+))
+db_pool_wait = register(Histogram(
+    'wifi_manager_db_pool_wait_seconds', 'Time waiting for a pooled SQLite connection', (), DB_BUCKETS
+))
+http_request_duration = register(Histogram(
+    'wifi_manager_http_request_duration_seconds',
+    'Time to produce HTTP responses (streams: until the stream starts)',
+    ('method', 'route', 'status'), HTTP_BUCKETS
+))
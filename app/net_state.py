@@ -0,0 +1,255 @@
+"""
+Network State Mirror
+In-memory model of wlan0's device state, active connection, address, gateway
+and DNS servers, kept current by long-lived `nmcli monitor` and `ip monitor`
+processes instead of running nmcli on every request
+"""
+import copy
+import queue
+import threading
+import time
+
+from app import commands, config, netinfo
+from app.backends import get_backend
+
+# Long-lived watchers; their output lines say what changed, not the new state
+MONITOR_COMMANDS = {
+    'nmcli': ['nmcli', 'monitor'],
+    'ip': ['ip', '-o', 'monitor', 'address', 'route'],
+}
+
+# Seconds to let a burst of events settle before resyncing from NetworkManager
+RESYNC_DEBOUNCE = 0.2
+
+RESTART_BACKOFF_MAX = 30
+
+
+def empty_state():
+    return {
+        'device_state': None,
+        'connection': None,
+        'ip': None,
+        'gateway': None,
+        'dns_servers': [],
+        'updated_at': None,
+    }
+
+
+def read_device(interface):
+    """Device state and DNS servers of an interface from nmcli
+
+    The address is not read here: the kernel's (see netinfo) is the one
+    kept current by `ip monitor` events.
+    """
+    args = ['nmcli', '-t', '-f', 'GENERAL.STATE,IP4.DNS', 'device', 'show', interface]
+    stdout, _, returncode = commands.run_command(args, timeout=config.DIAGNOSTICS_PROBE_TIMEOUT, read_only=True)
+    device = {'device_state': None, 'dns_servers': []}
+    if returncode != 0:
+        return device
+
+    for line in stdout.split('\n'):
+        key, _, value = line.partition(':')
+        value = value.strip()
+        if key == 'GENERAL.STATE':
+            device['device_state'] = value
+        elif key.startswith('IP4.DNS') and value:
+            device['dns_servers'].append(value)
+    return device
+
+
+def is_relevant(source, line, interface):
+    """Whether a monitor line may have changed the mirrored state"""
+    if not line.strip():
+        return False
+    if source == 'ip':
+        # Address and route changes on other interfaces (e.g. the hotspot) are ignored
+        return f' {interface} ' in f' {line} '
+    # nmcli prefixes device events with the device name; events for other
+    # devices are ignored, connection and global state changes are not
+    device, sep, _ = line.partition(': ')
+    return not (sep and device != interface and netinfo.interface_exists(device))
+
+
+class NetworkState:
+    """Mirror of the uplink's network state, updated from monitor events
+
+    While the watchers are running, reads are served from memory without
+    running any commands. Until the first sync completes, or while a
+    watcher is being restarted, `live` is False and callers should query
+    NetworkManager directly.
+    """
+
+    def __init__(self, interface=None, monitors=None):
+        self.interface = interface or config.WIFI_INTERFACE
+        self.monitors = monitors or MONITOR_COMMANDS
+        self._lock = threading.Lock()
+        self._state = empty_state()
+        self._synced = False
+        self._down = set(self.monitors)
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._processes = {}
+        self._subscribers = set()
+        self._listeners = []
+
+    @property
+    def live(self):
+        """True while the mirror is synced and every watcher is running"""
+        with self._lock:
+            return self._synced and not self._down
+
+    def snapshot(self):
+        """Copy of the mirrored state"""
+        with self._lock:
+            return copy.deepcopy(self._state)
+
+    def get(self, key):
+        """One field of the mirrored state"""
+        with self._lock:
+            return copy.deepcopy(self._state[key])
+
+    def start(self):
+        """Sync once and start the watcher and resync threads"""
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._resync_loop, name='net-state', daemon=True)]
+        for source in self.monitors:
+            self._threads.append(threading.Thread(
+                target=self._watch, args=(source,), name=f'net-state-{source}', daemon=True
+            ))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stop the watchers"""
+        self._stop.set()
+        self._dirty.set()
+        for process in list(self._processes.values()):
+            commands.stop_process(process)
+
+    def subscribe(self):
+        """Register a subscriber, returns a queue that receives each changed snapshot"""
+        q = queue.Queue(maxsize=4)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        """Remove a subscriber queue"""
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def add_listener(self, callback):
+        """Call callback(snapshot) from the watcher thread whenever the state changes"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def resync(self):
+        """Rebuild the whole state from NetworkManager and the kernel"""
+        device = read_device(self.interface)
+        state = {
+            'device_state': device['device_state'],
+            'connection': get_backend().get_current_connection(),
+            'ip': netinfo.interface_ipv4(self.interface),
+            'gateway': netinfo.default_gateway(self.interface),
+            'dns_servers': device['dns_servers'],
+        }
+        self._update(state, synced=True)
+
+    def _update(self, changes, synced=None):
+        with self._lock:
+            changed = any(self._state[key] != value for key, value in changes.items())
+            self._state.update(changes)
+            if changed or self._state['updated_at'] is None:
+                self._state['updated_at'] = time.time()
+            if synced is not None:
+                self._synced = synced
+            snapshot = copy.deepcopy(self._state) if changed else None
+            subscribers = list(self._subscribers)
+            listeners = list(self._listeners)
+        if snapshot is None:
+            return
+
+        for q in subscribers:
+            try:
+                q.put_nowait(snapshot)
+            except queue.Full:
+                # Slow subscriber: drop its oldest snapshot, only the latest matters
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+                q.put_nowait(snapshot)
+        for callback in listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Error in network state listener: {e}")
+
+    def _on_line(self, source, line):
+        if not is_relevant(source, line, self.interface):
+            return
+        # Shared results of earlier nmcli queries are out of date now
+        commands.invalidate()
+        if source == 'ip':
+            # Address and route changes are read back in-process straight away
+            self._update({
+                'ip': netinfo.interface_ipv4(self.interface),
+                'gateway': netinfo.default_gateway(self.interface),
+            })
+        # Connection, device state and DNS come from NetworkManager
+        self._dirty.set()
+
+    def _resync_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.resync()
+            except Exception as e:
+                print(f"Error syncing network state: {e}")
+            self._dirty.wait(config.NET_STATE_RESYNC_INTERVAL)
+            # Let the rest of a burst of events arrive before syncing again
+            self._stop.wait(RESYNC_DEBOUNCE)
+            self._dirty.clear()
+
+    def _watch(self, source):
+        backoff = 1
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                process = commands.start_process(self.monitors[source])
+            except OSError as e:
+                print(f"Cannot start {source} monitor: {e}")
+                process = None
+            else:
+                self._processes[source] = process
+                if self._stop.is_set():
+                    # stop() ran before the process was registered
+                    commands.stop_process(process)
+                with self._lock:
+                    self._down.discard(source)
+                # Anything may have changed while the watcher was down
+                self._dirty.set()
+                for line in process.stdout:
+                    try:
+                        self._on_line(source, line.rstrip('\n'))
+                    except Exception as e:
+                        print(f"Error handling {source} monitor event: {e}")
+                process.wait()
+
+            with self._lock:
+                self._down.add(source)
+                # Events were missed, so the next resync is needed before reads are trusted
+                self._synced = False
+            if self._stop.is_set():
+                return
+            if time.monotonic() - started > RESTART_BACKOFF_MAX:
+                backoff = 1
+            print(f"{source} monitor exited, restarting in {backoff}s")
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+
+
+# Shared by every request thread in the web server process
+network_state = NetworkState()
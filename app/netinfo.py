@@ -0,0 +1,167 @@
+"""
+Network Introspection Module
+Reads interface, address, route and wireless state in-process from
+rtnetlink, /sys/class/net and /proc/net without running any commands
+"""
+import os
+import socket
+import struct
+
+from app import config
+
+# rtnetlink constants (linux/netlink.h, linux/rtnetlink.h, linux/if_addr.h)
+NETLINK_ROUTE = 0
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x01
+NLM_F_DUMP = 0x300
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+
+NLMSG_HDR = struct.Struct('=IHHII')
+IFADDRMSG = struct.Struct('=BBBBI')
+RTATTR_HDR = struct.Struct('=HH')
+
+RTF_UP = 0x0001
+RTF_GATEWAY = 0x0002
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def _read(path):
+    """Read a small sysfs/procfs file, returns None if it does not exist"""
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def sysfs_net_path(ifname, *parts):
+    """Path of a file under /sys/class/net/<ifname>"""
+    return os.path.join(config.SYSFS_NET_ROOT, ifname, *parts)
+
+
+def interface_exists(ifname):
+    """Check whether a network interface exists"""
+    return os.path.exists(sysfs_net_path(ifname))
+
+
+def interface_operstate(ifname):
+    """RFC 2863 operational state of an interface ('up', 'down', ...) or None"""
+    return _read(sysfs_net_path(ifname, 'operstate'))
+
+
+def default_gateway(ifname=None):
+    """Default IPv4 gateway from /proc/net/route (lowest metric wins), or None"""
+    content = _read(os.path.join(config.PROCFS_NET_ROOT, 'route'))
+    if not content:
+        return None
+
+    best = None
+    for line in content.split('\n')[1:]:
+        fields = line.split()
+        if len(fields) < 8:
+            continue
+        iface, destination, gateway, flags = fields[0], fields[1], fields[2], int(fields[3], 16)
+        metric = int(fields[6])
+        if destination != '00000000' or not (flags & RTF_UP and flags & RTF_GATEWAY):
+            continue
+        if ifname and iface != ifname:
+            continue
+        if best is None or metric < best[0]:
+            # Addresses are stored as host-order (little-endian) hex
+            best = (metric, socket.inet_ntoa(struct.pack('<I', int(gateway, 16))))
+    return best[1] if best else None
+
+
+def wireless_link(ifname):
+    """Link quality, signal and noise for an interface from /proc/net/wireless"""
+    content = _read(os.path.join(config.PROCFS_NET_ROOT, 'wireless'))
+    if not content:
+        return None
+
+    for line in content.split('\n')[2:]:
+        name, _, rest = line.partition(':')
+        if name.strip() != ifname:
+            continue
+        fields = rest.split()
+        if len(fields) < 4:
+            return None
+        return {
+            'quality': int(float(fields[1])),
+            'signal_dbm': int(float(fields[2])),
+            'noise_dbm': int(float(fields[3])),
+        }
+    return None
+
+
+def _parse_attrs(data, offset, end):
+    """Parse rtattr TLVs into a {type: payload} dict"""
+    attrs = {}
+    while offset + RTATTR_HDR.size <= end:
+        length, attr_type = RTATTR_HDR.unpack_from(data, offset)
+        if length < RTATTR_HDR.size:
+            break
+        attrs[attr_type] = data[offset + RTATTR_HDR.size:offset + length]
+        offset += _align(length)
+    return attrs
+
+
+def ipv4_addresses():
+    """Dump all IPv4 addresses over rtnetlink as a list of dicts"""
+    addresses = []
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE) as sock:
+        sock.bind((0, 0))
+        request = NLMSG_HDR.pack(
+            NLMSG_HDR.size + IFADDRMSG.size, RTM_GETADDR, NLM_F_REQUEST | NLM_F_DUMP, 1, 0
+        ) + IFADDRMSG.pack(socket.AF_INET, 0, 0, 0, 0)
+        sock.send(request)
+
+        done = False
+        while not done:
+            data = sock.recv(65536)
+            offset = 0
+            while offset + NLMSG_HDR.size <= len(data):
+                msg_len, msg_type, _, _, _ = NLMSG_HDR.unpack_from(data, offset)
+                if msg_len < NLMSG_HDR.size:
+                    done = True
+                    break
+                if msg_type == NLMSG_DONE:
+                    done = True
+                    break
+                if msg_type == NLMSG_ERROR:
+                    raise OSError("rtnetlink address dump failed")
+                if msg_type == RTM_NEWADDR:
+                    body = offset + NLMSG_HDR.size
+                    family, prefixlen, _, _, index = IFADDRMSG.unpack_from(data, body)
+                    attrs = _parse_attrs(data, body + IFADDRMSG.size, offset + msg_len)
+                    raw = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)
+                    if family == socket.AF_INET and raw:
+                        label = attrs.get(IFA_LABEL, b'').rstrip(b'\0').decode()
+                        addresses.append({
+                            'index': index,
+                            'ifname': label.split(':')[0] or socket.if_indextoname(index),
+                            'address': socket.inet_ntoa(raw),
+                            'prefixlen': prefixlen,
+                        })
+                offset += _align(msg_len)
+    return addresses
+
+
+def interface_ipv4(ifname, with_prefix=False):
+    """First IPv4 address of an interface ("10.0.0.5/24" with_prefix), or None"""
+    try:
+        for entry in ipv4_addresses():
+            if entry['ifname'] == ifname:
+                if with_prefix:
+                    return f"{entry['address']}/{entry['prefixlen']}"
+                return entry['address']
+    except OSError:
+        pass
+    return None
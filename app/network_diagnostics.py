@@ -2,77 +2,136 @@
 Network Diagnostics Module
 Handles ping tests and network status information
 """
-import subprocess
-import re
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from app import bandwidth, config, dns_probe, icmp, netinfo
+from app.commands import run_command
+from app.net_state import network_state
 
-def run_command(command):
-    """Execute a shell command and return output"""
+def default_ping_targets():
+    """Gateway, configured DNS servers and 8.8.8.8, without duplicates"""
+    targets = []
+    gateway = netinfo.default_gateway()
+    if gateway:
+        targets.append(gateway)
+    for dns in get_dns_servers():
+        if dns != "None configured" and dns not in targets:
+            targets.append(dns)
+    if '8.8.8.8' not in targets:
+        targets.append('8.8.8.8')
+    return targets
+
+def clamp_ping_count(count):
+    """Coerce a requested ping count into 1..PING_MAX_COUNT"""
     try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        return result.stdout.strip(), result.stderr.strip(), result.returncode
-    except subprocess.TimeoutExpired:
-        return "", "Command timed out", 1
-    except Exception as e:
-        return "", str(e), 1
+        count = int(count)
+    except (TypeError, ValueError):
+        count = 4
+    return max(1, min(count, config.PING_MAX_COUNT))
+
+def format_ping_event(event):
+    """One line of ping-style text for an icmp.iter_ping event"""
+    host = event['host']
+    if event['type'] == 'reply':
+        return f"Reply from {event['address']}: icmp_seq={event['seq'] + 1} time={event['rtt_ms']} ms"
+    if event['type'] == 'timeout':
+        return f"Request timeout for {host} icmp_seq={event['seq'] + 1}"
+    if event['type'] == 'error':
+        return f"{host}: {event['error']}"
+    line = (f"--- {host} ping statistics ---\n"
+            f"{event['sent']} packets transmitted, {event['received']} received, "
+            f"{event['packet_loss']:g}% packet loss")
+    if event['received']:
+        line += (f"\nrtt min/avg/max/mdev = {event['min_ms']}/{event['avg_ms']}/"
+                 f"{event['max_ms']}/{event['mdev_ms']} ms, jitter {event['jitter_ms']} ms, "
+                 f"p50/p90/p99 = {event['p50_ms']}/{event['p90_ms']}/{event['p99_ms']} ms")
+    return line
+
+def iter_ping_test(hosts, count=4):
+    """Stream ping events for several hosts at once (see app.icmp.iter_ping)"""
+    return icmp.iter_ping(hosts, clamp_ping_count(count))
+
+def ping_hosts(hosts, count=4):
+    """Ping several hosts concurrently, returns {host: statistics}"""
+    return icmp.ping_many(hosts, clamp_ping_count(count))
 
 def ping_test(host='8.8.8.8', count=4):
     """Run a ping test to specified host"""
-    command = f"ping -c {count} {host}"
-    stdout, stderr, returncode = run_command(command)
+    lines = []
+    summary = None
+    error = None
     
+    for event in iter_ping_test([host], count):
+        lines.append(format_ping_event(event))
+        if event['type'] == 'summary':
+            summary = event
+        elif event['type'] == 'error':
+            error = event['error']
+    
+    success = bool(summary and summary['received'])
     result = {
-        'success': returncode == 0,
+        'success': success,
         'host': host,
-        'output': stdout if returncode == 0 else stderr
+        'output': '\n'.join(lines) if success or not error else error
     }
     
-    # Parse ping statistics if successful
-    if returncode == 0:
-        # Extract packet loss
-        loss_match = re.search(r'(\d+)% packet loss', stdout)
-        if loss_match:
-            result['packet_loss'] = loss_match.group(1) + '%'
-        
-        # Extract min/avg/max/mdev times
-        time_match = re.search(r'min/avg/max/mdev = ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+) ms', stdout)
-        if time_match:
-            result['min_time'] = time_match.group(1) + ' ms'
-            result['avg_time'] = time_match.group(2) + ' ms'
-            result['max_time'] = time_match.group(3) + ' ms'
+    # Ping statistics if successful
+    if success:
+        result['packet_loss'] = f"{summary['packet_loss']:g}%"
+        result['min_time'] = f"{summary['min_ms']} ms"
+        result['avg_time'] = f"{summary['avg_ms']} ms"
+        result['max_time'] = f"{summary['max_ms']} ms"
+        result['jitter'] = f"{summary['jitter_ms']} ms"
+        result['statistics'] = summary
+    
+    return result
+
+def clamp_bandwidth_duration(duration):
+    """Coerce a requested test duration into 0.1..BANDWIDTH_MAX_DURATION seconds"""
+    try:
+        duration = float(duration)
+    except (TypeError, ValueError):
+        duration = 5
+    return max(0.1, min(duration, config.BANDWIDTH_MAX_DURATION))
+
+def parse_bandwidth_port(port):
+    """A requested bandwidth server port as an int, or None for the default
+    
+    Raises ValueError unless port is a whole number from 1 to 65535.
+    """
+    if port is None or port == '':
+        return None
+    if isinstance(port, bool) or not str(port).isdigit() or not 1 <= int(port) <= 65535:
+        raise ValueError("port must be a number from 1 to 65535")
+    return int(port)
+
+def bandwidth_test(host, port=None, duration=5, directions=bandwidth.DIRECTIONS):
+    """Measure throughput to a bandwidth test server, one direction after the other
     
+    Returns {'host', 'success', direction: result or {'error': ...}}.
+    """
+    duration = clamp_bandwidth_duration(duration)
+    result = {'host': host, 'success': True}
+    for direction in directions:
+        try:
+            result[direction] = bandwidth.run_test(host, port, duration, direction)
+        except (bandwidth.BandwidthError, OSError) as e:
+            result[direction] = {'error': str(e)}
+            result['success'] = False
     return result
 
 def get_interface_status():
     """Get status of network interfaces"""
     interfaces = {}
     
-    # Get wlan0 status
-    wlan0_cmd = "ip link show wlan0"
-    stdout, _, returncode = run_command(wlan0_cmd)
-    if returncode == 0:
-        interfaces['wlan0'] = {
-            'status': 'UP' if 'state UP' in stdout else 'DOWN',
-            'exists': True
-        }
-    else:
-        interfaces['wlan0'] = {'status': 'Not found', 'exists': False}
-    
-    # Get wlan1 status (hotspot interface)
-    wlan1_cmd = "ip link show wlan1"
-    stdout, _, returncode = run_command(wlan1_cmd)
-    if returncode == 0:
-        interfaces['wlan1'] = {
-            'status': 'UP' if 'state UP' in stdout else 'DOWN',
-            'exists': True
-        }
-    else:
-        interfaces['wlan1'] = {'status': 'Not found', 'exists': False}
+    # wlan0 is the uplink, wlan1 the hotspot interface
+    for ifname in ('wlan0', 'wlan1'):
+        if netinfo.interface_exists(ifname):
+            interfaces[ifname] = {
+                'status': 'UP' if netinfo.interface_operstate(ifname) == 'up' else 'DOWN',
+                'exists': True
+            }
+        else:
+            interfaces[ifname] = {'status': 'Not found', 'exists': False}
     
     return interfaces
 
@@ -80,9 +139,23 @@ def get_connection_stats():
     """Get WiFi connection statistics for wlan0"""
     stats = {}
     
+    if network_state.live:
+        state = network_state.snapshot()
+        stats['state'] = state['device_state']
+        if state['connection']:
+            stats['connection'] = state['connection']['connection_name']
+        # Same CIDR form as nmcli's IP4.ADDRESS below
+        ip_address = netinfo.interface_ipv4('wlan0', with_prefix=True)
+        if ip_address:
+            stats['ip_address'] = ip_address
+        link = netinfo.wireless_link('wlan0')
+        if link:
+            stats['signal_strength'] = f"{link['signal_dbm']} dBm"
+        return stats
+    
     # Get signal strength and other stats
-    command = "nmcli -t -f GENERAL.STATE,GENERAL.CONNECTION,IP4.ADDRESS,SIGNAL device show wlan0"
-    stdout, stderr, returncode = run_command(command)
+    args = ['nmcli', '-t', '-f', 'GENERAL.STATE,GENERAL.CONNECTION,IP4.ADDRESS,SIGNAL', 'device', 'show', 'wlan0']
+    stdout, stderr, returncode = run_command(args, timeout=config.DIAGNOSTICS_PROBE_TIMEOUT, read_only=True)
     
     if returncode == 0:
         for line in stdout.split('\n'):
@@ -95,29 +168,24 @@ def get_connection_stats():
                 elif 'IP4.ADDRESS' in key:
                     stats['ip_address'] = value.strip()
     
-    # Get signal strength from iwconfig
-    signal_cmd = "iwconfig wlan0 2>/dev/null | grep -i 'Signal level'"
-    stdout, _, returncode = run_command(signal_cmd)
-    if returncode == 0 and stdout:
-        signal_match = re.search(r'Signal level[=:](-?\d+)', stdout)
-        if signal_match:
-            stats['signal_strength'] = signal_match.group(1) + ' dBm'
+    # Get signal strength from /proc/net/wireless
+    link = netinfo.wireless_link('wlan0')
+    if link:
+        stats['signal_strength'] = f"{link['signal_dbm']} dBm"
     
     return stats
 
 def get_gateway():
     """Get default gateway"""
-    command = "ip route | grep default | awk '{print $3}'"
-    stdout, stderr, returncode = run_command(command)
-    
-    if returncode == 0 and stdout:
-        return stdout.split('\n')[0]
-    return "Unknown"
+    return netinfo.default_gateway() or "Unknown"
 
 def get_dns_servers():
     """Get DNS servers"""
-    command = "nmcli -t -f IP4.DNS device show wlan0"
-    stdout, stderr, returncode = run_command(command)
+    if network_state.live:
+        return network_state.get('dns_servers') or ["None configured"]
+    
+    args = ['nmcli', '-t', '-f', 'IP4.DNS', 'device', 'show', 'wlan0']
+    stdout, stderr, returncode = run_command(args, timeout=config.DIAGNOSTICS_PROBE_TIMEOUT, read_only=True)
     
     dns_servers = []
     if returncode == 0:
@@ -129,11 +197,74 @@ def get_dns_servers():
     
     return dns_servers if dns_servers else ["None configured"]
 
-def get_full_diagnostics():
-    """Get comprehensive network diagnostics"""
-    return {
-        'interfaces': get_interface_status(),
-        'connection_stats': get_connection_stats(),
-        'gateway': get_gateway(),
-        'dns_servers': get_dns_servers()
-    }
+def get_dns_latency(servers=None):
+    """Compare lookup latency of the configured DNS resolvers (plus DNS_PROBE_PUBLIC_SERVERS)
+    
+    Returns {'results': [...] fastest first, 'recommended': server or None};
+    each result says whether the server is one of the configured resolvers.
+    """
+    if servers is None:
+        configured = [s for s in get_dns_servers() if s not in ("None configured", "Timed out")]
+    else:
+        configured = list(servers)
+    report = dns_probe.probe_resolvers(configured + config.DNS_PROBE_PUBLIC_SERVERS)
+    for result in report['results']:
+        result['configured'] = result['server'] in configured
+    return report
+
+# (section name, probe, value reported when the probe misses the deadline)
+DIAGNOSTIC_PROBES = (
+    ('interfaces', get_interface_status, {}),
+    ('connection_stats', get_connection_stats, {}),
+    ('gateway', get_gateway, "Timed out"),
+    ('dns_servers', get_dns_servers, ["Timed out"]),
+    ('dns_latency', get_dns_latency, {}),
+)
+
+def iter_diagnostics(deadline=None):
+    """Run all diagnostic probes concurrently
+    
+    Yields (name, value, timed_out) for each section as soon as it completes.
+    Probes still running when the overall deadline expires are yielded last
+    with their fallback value and timed_out=True.
+    """
+    deadline = deadline or config.DIAGNOSTICS_DEADLINE
+    executor = ThreadPoolExecutor(max_workers=len(DIAGNOSTIC_PROBES),
+                                  thread_name_prefix='diagnostics')
+    futures = {executor.submit(probe): (name, fallback)
+               for name, probe, fallback in DIAGNOSTIC_PROBES}
+    pending = set(futures)
+    
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            pending.discard(future)
+            name, fallback = futures[future]
+            try:
+                yield name, future.result(), False
+            except Exception as e:
+                print(f"Diagnostic probe {name} failed: {e}")
+                yield name, fallback, False
+    except FuturesTimeout:
+        for future in pending:
+            name, fallback = futures[future]
+            yield name, fallback, True
+    finally:
+        # Don't wait for hung probes, their commands time out on their own
+        executor.shutdown(wait=False)
+
+def get_full_diagnostics(deadline=None):
+    """Get comprehensive network diagnostics
+    
+    Probes run concurrently under one deadline; the names of any that did
+    not finish in time are listed in 'timed_out'.
+    """
+    results = {}
+    timed_out = []
+    for name, value, late in iter_diagnostics(deadline):
+        results[name] = value
+        if late:
+            timed_out.append(name)
+    
+    diagnostics = {name: results[name] for name, _, _ in DIAGNOSTIC_PROBES}
+    diagnostics['timed_out'] = timed_out
+    return diagnostics
@@ -1,37 +1,152 @@
 """
 Flask routes for WiFi Manager web interface and API
 """
-from flask import render_template, jsonify, request
-from app import app, auth
+import mimetypes
+import time
+
+from flask import render_template, jsonify, request, Response, g, send_file, url_for
+from app import assets, commands, config, metrics
+from app.web import app, auth
 from app.wifi_manager import (
-    scan_networks, get_current_connection, get_connection_ip,
-    connect_to_network, forget_network, rescan_networks
+    scan_snapshot, scan_delta, scan_etag, scan_token, scan_access_points, get_current_connection,
+    get_connection_ip, connect_to_network, forget_network, submit_connect, submit_forget,
+    rescan_networks_versioned, radio_executor
+)
+from app.network_diagnostics import (
+    ping_test, ping_hosts, iter_ping_test, default_ping_targets,
+    get_full_diagnostics, iter_diagnostics, bandwidth_test, parse_bandwidth_port
 )
-from app.network_diagnostics import ping_test, get_full_diagnostics
-from app.database import get_saved_networks, init_db
+from app.database import get_saved_networks, count_saved_networks
+from app.link_sampler import get_history
+from app.failover import failover_supervisor
+from app.throughput import throughput_meter
+from app.channels import channel_analyzer
+from app.net_state import network_state
+from app.connect_timing import PhaseTimer, connect_timings
+from app.jobs import find_job
+from app.status_stream import StatusBroadcaster, sse_stream, format_sse
+
+def status_snapshot():
+    """Connection, IP and saved networks as pushed to the status stream"""
+    return {
+        'current': get_current_connection(),
+        'ip': get_connection_ip(),
+        'saved': get_saved_networks()
+    }
+
+# Single producer shared by every /api/events client
+status_broadcaster = StatusBroadcaster(status_snapshot, config.STATUS_POLL_INTERVAL)
+
+# Push connection changes seen by the network state mirror without waiting for the next poll
+network_state.add_listener(lambda snapshot: status_broadcaster.refresh_now())
 
-# Initialize database on startup
-init_db()
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Identical read-only commands run once per request
+    commands.begin_scope()
+
+@app.teardown_request
+def end_command_scope(exc):
+    commands.end_scope()
+
+@app.after_request
+def record_request_duration(response):
+    """Record how long each route took, by URL rule so label values stay bounded"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.http_request_duration.observe(
+            time.perf_counter() - started, request.method, route, str(response.status_code)
+        )
+    return response
 
 @app.route('/')
 @auth.login_required
 def index():
     """Serve the main web interface"""
-    return render_template('index.html')
+    response = Response(render_template('index.html'), mimetype='text/html')
+    # The page only changes when the assets it references do; revalidating it
+    # costs a 304 and every asset is then served from the browser's cache
+    response.add_etag()
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+# Fingerprinted URLs change whenever the content does, so they never need revalidating
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+@app.context_processor
+def asset_helpers():
+    def asset_url(name):
+        """Fingerprinted URL of a static file, or its plain URL if it was not built"""
+        path = assets.get_index().url_path(name)
+        if path:
+            return url_for('asset', path=path)
+        return url_for('static', filename=name)
+    return {'asset_url': asset_url}
+
+@app.route('/assets/<path:path>', methods=['GET'])
+def asset(path):
+    """Serve a fingerprinted static file, precompressed if the client accepts it
+
+    Like Flask's own static route, this needs no login.
+    """
+    found = assets.get_index().resolve(path, request.headers.get('Accept-Encoding'))
+    if found is None:
+        return Response('Not found', status=404, mimetype='text/plain')
+    file_path, name, encoding, etag = found
+    
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        response = send_file(file_path, mimetype=mimetype, etag=False, conditional=False)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
 
 @app.route('/api/scan', methods=['GET'])
 @auth.login_required
 def api_scan():
-    """API endpoint to scan for available networks"""
-    networks = scan_networks()
-    return jsonify({'success': True, 'networks': networks})
+    """API endpoint to scan for available networks
+    
+    Supports If-None-Match (304 when the scan hasn't changed) and
+    ?since=<version token>, which returns only added/removed/changed networks.
+    """
+    since = request.args.get('since')
+    if since:
+        networks, version, delta = scan_delta(since)
+    else:
+        (networks, version), delta = scan_snapshot(), None
+    
+    etag = scan_etag(version)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif delta is not None:
+        response = jsonify({'success': True, 'version': scan_token(version), 'full': False, **delta})
+    else:
+        response = jsonify({'success': True, 'version': scan_token(version), 'full': True, 'networks': networks})
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/access-points', methods=['GET'])
+@auth.login_required
+def api_access_points():
+    """API endpoint listing every visible access point (one per BSSID)"""
+    return jsonify({'success': True, 'access_points': scan_access_points()})
 
 @app.route('/api/rescan', methods=['POST'])
 @auth.login_required
 def api_rescan():
     """API endpoint to trigger a new scan"""
-    networks = rescan_networks()
-    return jsonify({'success': True, 'networks': networks})
+    networks, version = rescan_networks_versioned()
+    return jsonify({'success': True, 'version': scan_token(version), 'full': True, 'networks': networks})
 
 @app.route('/api/current', methods=['GET'])
 @auth.login_required
@@ -45,6 +160,16 @@ def api_current():
         'ip': ip
     })
 
+@app.route('/api/events', methods=['GET'])
+@auth.login_required
+def api_events():
+    """Server-Sent Events stream of connection and saved network changes"""
+    return Response(
+        sse_stream(status_broadcaster),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/saved', methods=['GET'])
 @auth.login_required
 def api_saved():
@@ -52,44 +177,194 @@ def api_saved():
     saved = get_saved_networks()
     return jsonify({'success': True, 'networks': saved})
 
+def _wants_wait(data):
+    """Whether a client asked to block until its job finishes (?wait=1 or "wait": true)"""
+    return bool(data.get('wait')) or request.args.get('wait') in ('1', 'true')
+
+def _job_accepted(job):
+    """202 response pointing a client at a queued job"""
+    response = jsonify({'success': True, 'message': f'{job.kind.capitalize()} queued', 'job': job.to_dict()})
+    response.status_code = 202
+    response.headers['Location'] = f'/api/jobs/{job.id}'
+    return response
+
 @app.route('/api/connect', methods=['POST'])
 @auth.login_required
 def api_connect():
-    """API endpoint to connect to a network"""
+    """API endpoint to connect to a network
+    
+    Queues a connect job and returns its id right away; with wait, blocks
+    until the connection attempt has finished.
+    """
     data = request.json
     ssid = data.get('ssid')
     password = data.get('password')
+    bssid = data.get('bssid')
     
     if not ssid:
         return jsonify({'success': False, 'message': 'SSID is required'}), 400
     
-    success, message = connect_to_network(ssid, password)
-    return jsonify({'success': success, 'message': message})
+    if _wants_wait(data):
+        timer = PhaseTimer()
+        success, message = connect_to_network(ssid, password, bssid, timer=timer)
+        status_broadcaster.refresh_now()
+        return jsonify({'success': success, 'message': message,
+                        'timings': {'total_ms': timer.total_ms, 'phases': timer.phases}})
+    
+    job = submit_connect(ssid, password, bssid, on_done=lambda job: status_broadcaster.refresh_now())
+    return _job_accepted(job)
+
+@app.route('/api/connect/timings', methods=['GET'])
+@auth.login_required
+def api_connect_timings():
+    """API endpoint for connect phase timings per SSID (?ssid=&days=30)"""
+    timings = connect_timings(request.args.get('ssid'), request.args.get('days', 30, type=int))
+    return jsonify({'success': True, 'networks': timings})
 
 @app.route('/api/forget', methods=['POST'])
 @auth.login_required
 def api_forget():
-    """API endpoint to forget a network"""
+    """API endpoint to forget a network
+    
+    Queues a forget job and returns its id right away; with wait, blocks
+    until it has finished.
+    """
     data = request.json
     ssid = data.get('ssid')
     
     if not ssid:
         return jsonify({'success': False, 'message': 'SSID is required'}), 400
     
-    success, message = forget_network(ssid)
-    return jsonify({'success': success, 'message': message})
+    if _wants_wait(data):
+        success, message = forget_network(ssid)
+        status_broadcaster.refresh_now()
+        return jsonify({'success': success, 'message': message})
+    
+    job = submit_forget(ssid, on_done=lambda job: status_broadcaster.refresh_now())
+    return _job_accepted(job)
+
+@app.route('/api/jobs', methods=['GET'])
+@auth.login_required
+def api_jobs():
+    """API endpoint listing recent wlan0 jobs, newest first"""
+    executor = radio_executor()
+    return jsonify({
+        'success': True,
+        'pending': executor.pending(),
+        'jobs': [job.to_dict() for job in executor.jobs()]
+    })
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@auth.login_required
+def api_job(job_id):
+    """API endpoint to poll one job"""
+    job, _ = find_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+@auth.login_required
+def api_job_events(job_id):
+    """Server-Sent Events stream of a job's state until it finishes"""
+    job, _ = find_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    
+    def generate():
+        revision = None
+        while True:
+            changed = job.wait_for_change(revision, timeout=15)
+            if changed == revision:
+                # Comment line keeps proxies from closing the idle connection
+                yield ': keepalive\n\n'
+                continue
+            revision = changed
+            yield format_sse('job', job.to_dict())
+            if job.done:
+                break
+        yield format_sse('done', {})
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@auth.login_required
+def api_job_cancel(job_id):
+    """API endpoint to cancel a queued job"""
+    job, executor = find_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    success, message = executor.cancel(job_id)
+    return jsonify({'success': success, 'message': message, 'job': job.to_dict()}), 200 if success else 409
 
 @app.route('/api/ping', methods=['POST'])
 @auth.login_required
 def api_ping():
     """API endpoint to run a ping test"""
     data = request.json
-    host = data.get('host', '8.8.8.8')
     count = data.get('count', 4)
     
+    # Several hosts are pinged concurrently and summarized per host
+    if 'hosts' in data:
+        hosts = data.get('hosts') or default_ping_targets()
+        results = ping_hosts(hosts, count)
+        success = any(r.get('received') for r in results.values())
+        return jsonify({'success': success, 'results': results})
+    
+    host = data.get('host', '8.8.8.8')
     result = ping_test(host, count)
     return jsonify(result)
 
+@app.route('/api/bandwidth', methods=['POST'])
+@auth.login_required
+def api_bandwidth():
+    """API endpoint to measure throughput to a bandwidth test server"""
+    data = request.json or {}
+    host = data.get('host')
+    if not host:
+        return jsonify({'success': False, 'message': 'host is required'}), 400
+    
+    direction = data.get('direction', 'both')
+    if direction == 'both':
+        directions = ('download', 'upload')
+    elif direction in ('download', 'upload'):
+        directions = (direction,)
+    else:
+        return jsonify({'success': False, 'message': "direction must be download, upload or both"}), 400
+    
+    try:
+        port = parse_bandwidth_port(data.get('port'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify(bandwidth_test(host, port, data.get('duration', 5), directions))
+
+@app.route('/api/ping/stream', methods=['GET'])
+@auth.login_required
+def api_ping_stream():
+    """Server-Sent Events stream of ping replies for one or more hosts
+    
+    Hosts are given as repeated ?host= parameters; without any, the gateway,
+    DNS servers and 8.8.8.8 are pinged.
+    """
+    hosts = request.args.getlist('host') or default_ping_targets()
+    count = request.args.get('count', 4)
+    
+    def generate():
+        for event in iter_ping_test(hosts, count):
+            yield format_sse(event['type'], event)
+        yield format_sse('done', {})
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/diagnostics', methods=['GET'])
 @auth.login_required
 def api_diagnostics():
@@ -97,17 +372,90 @@ def api_diagnostics():
     diagnostics = get_full_diagnostics()
     return jsonify({'success': True, 'diagnostics': diagnostics})
 
+@app.route('/api/diagnostics/stream', methods=['GET'])
+@auth.login_required
+def api_diagnostics_stream():
+    """Server-Sent Events stream of diagnostic sections as each one completes"""
+    def generate():
+        for name, value, timed_out in iter_diagnostics():
+            yield format_sse('section', {'name': name, 'value': value, 'timed_out': timed_out})
+        yield format_sse('done', {})
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/history', methods=['GET'])
+@auth.login_required
+def api_history():
+    """API endpoint for link quality history (?metric=&from=&to=, unix seconds)"""
+    try:
+        history = get_history(
+            request.args.get('metric', 'rssi'),
+            request.args.get('from', type=int),
+            request.args.get('to', type=int)
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    response = jsonify({'success': True, 'history': history})
+    response.headers['Cache-Control'] = 'private, max-age=30'
+    return response
+
+@app.route('/api/failover', methods=['GET'])
+@auth.login_required
+def api_failover():
+    """API endpoint for the failover supervisor state and its recent decisions"""
+    return jsonify({'success': True, 'failover': failover_supervisor.status()})
+
+@app.route('/api/throughput', methods=['GET'])
+@auth.login_required
+def api_throughput():
+    """API endpoint for per-interface traffic rates and hotspot stations"""
+    return jsonify(throughput_meter.snapshot())
+
+@app.route('/api/channels', methods=['GET'])
+@auth.login_required
+def api_channels():
+    """API endpoint for per-channel congestion and the recommended hotspot channel"""
+    return jsonify(channel_analyzer.report())
+
+@app.route('/api/channels/apply', methods=['POST'])
+@auth.login_required
+def api_channels_apply():
+    """API endpoint to move the hotspot to a channel (default: the recommended one)"""
+    data = request.json or {}
+    channel = data.get('channel')
+    if channel is None:
+        channel = channel_analyzer.report()['recommended_channel']
+        if channel is None:
+            return jsonify({'success': False, 'message': 'No channel to recommend yet'}), 400
+    try:
+        channel = int(channel)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'channel must be a number'}), 400
+    
+    success, message = channel_analyzer.apply(channel)
+    return jsonify({'success': success, 'channel': channel, 'message': message})
+
+@app.route('/metrics', methods=['GET'])
+@auth.login_required
+def metrics_endpoint():
+    """Command, database and request metrics in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/status', methods=['GET'])
 @auth.login_required
 def api_status():
     """API endpoint to get complete system status"""
     current = get_current_connection()
     ip = get_connection_ip()
-    saved = get_saved_networks()
     
     return jsonify({
         'success': True,
         'current': current,
         'ip': ip,
-        'saved_count': len(saved)
+        'saved_count': count_saved_networks()
     })
@@ -0,0 +1,121 @@
+"""
+Scan Cache Module
+Process-wide cache of WiFi scan results with single-flight rescans and versioned snapshots
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """A scan in progress that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ScanCache:
+    """Caches scan results for a TTL and coalesces concurrent scans into one
+
+    Every distinct result gets a new version number, and the last few
+    results are kept so callers can work out what changed since a version
+    they already have. Versions are handed out as tokens that include an
+    epoch which changes on every restart, so a version from a previous
+    process is never mistaken for a current one.
+    """
+
+    def __init__(self, ttl, history=16):
+        self.ttl = ttl
+        self.history = history
+        self.epoch = os.urandom(4).hex()
+        self.version = 0
+        self._lock = threading.Lock()
+        self._result = None
+        self._updated_at = 0.0
+        self._flights = {}
+        self._snapshots = OrderedDict()
+
+    def age(self):
+        """Seconds since the cached result was produced (None if empty)"""
+        if self._result is None:
+            return None
+        return time.monotonic() - self._updated_at
+
+    def get(self, fetch):
+        """Return the cached result, calling fetch() if it is missing or stale"""
+        return self.get_versioned(fetch)[0]
+
+    def get_versioned(self, fetch):
+        """Like get(), but returns (result, version)"""
+        with self._lock:
+            age = self.age()
+            if age is not None and age < self.ttl:
+                return self._result, self.version
+        return self.refresh_versioned(fetch)
+
+    def refresh(self, fetch, kind='list'):
+        """Run fetch() once for all concurrent callers of the same kind and cache its result"""
+        return self.refresh_versioned(fetch, kind)[0]
+
+    def refresh_versioned(self, fetch, kind='list'):
+        """Like refresh(), but returns (result, version)"""
+        with self._lock:
+            flight = self._flights.get(kind)
+            leader = flight is None
+            if leader:
+                flight = self._flights[kind] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            result = fetch()
+            with self._lock:
+                flight.result = (result, self._store(result))
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[kind]
+            flight.done.set()
+        return flight.result
+
+    def _store(self, result):
+        """Cache a result, bumping the version if it differs (lock must be held)"""
+        latest = next(reversed(self._snapshots.values()), None)
+        if not self._snapshots or result != latest:
+            self.version += 1
+            self._snapshots[self.version] = result
+            while len(self._snapshots) > self.history:
+                self._snapshots.popitem(last=False)
+        self._result = result
+        self._updated_at = time.monotonic()
+        return self.version
+
+    def token(self, version):
+        """Version token for clients, '<epoch>-<version>'"""
+        return f"{self.epoch}-{version}"
+
+    def version_from_token(self, token):
+        """Version number of a token, or None if it is malformed or from another process"""
+        epoch, _, version = str(token).rpartition('-')
+        if epoch != self.epoch or not version.isdigit():
+            return None
+        return int(version)
+
+    def snapshot(self, version):
+        """The result stored as a given version, or None if it is no longer kept"""
+        with self._lock:
+            return self._snapshots.get(version)
+
+    def invalidate(self):
+        """Drop the cached result so the next get() fetches again"""
+        with self._lock:
+            self._result = None
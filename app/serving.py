@@ -0,0 +1,162 @@
+"""
+Production Serving
+Runs the app on a multithreaded WSGI server (cheroot) with separate capacity
+for slow and streaming endpoints, keep-alive and a graceful drain on SIGTERM
+"""
+import fnmatch
+import signal
+import threading
+
+from app import config
+
+# Endpoints that block on nmcli, scans, pings or bandwidth tests for seconds at a time
+SLOW_PATHS = (
+    '/api/connect', '/api/forget', '/api/rescan', '/api/ping', '/api/diagnostics',
+    '/api/bandwidth', '/api/channels/apply',
+)
+
+# Server-Sent Events endpoints, which hold a worker for as long as they are open
+STREAM_PATHS = (
+    '/api/events', '/api/ping/stream', '/api/diagnostics/stream', '/api/jobs/*/events',
+)
+
+# Set on SIGTERM so open streams end and the server can drain
+draining = threading.Event()
+
+
+def request_class(path):
+    """Capacity class of a request path: 'stream', 'slow' or 'fast'"""
+    if any(fnmatch.fnmatchcase(path, pattern) for pattern in STREAM_PATHS):
+        return 'stream'
+    if path in SLOW_PATHS:
+        return 'slow'
+    return 'fast'
+
+
+class _Released:
+    """Response iterable that frees a capacity slot once the response is done
+
+    Streaming responses also stop early when the server starts draining.
+    """
+
+    def __init__(self, iterable, slot, stop_on_drain):
+        self._iterable = iterable
+        self._slot = slot
+        self._stop_on_drain = stop_on_drain
+        self._closed = False
+
+    def __iter__(self):
+        for chunk in self._iterable:
+            yield chunk
+            if self._stop_on_drain and draining.is_set():
+                break
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if hasattr(self._iterable, 'close'):
+                self._iterable.close()
+        finally:
+            self._slot.release()
+
+
+class CapacityLimiter:
+    """WSGI middleware dividing the server's worker threads into pools
+
+    Slow and streaming requests each have a bounded number of slots, so
+    however many of them arrive the remaining workers stay free for fast
+    requests. A request that finds no free slot is answered with 503 and a
+    Retry-After header straight away; waiting for one would tie up the
+    worker it is running on.
+    """
+
+    def __init__(self, wsgi_app, slow_slots, stream_slots):
+        self.wsgi_app = wsgi_app
+        self.slots = {
+            'slow': threading.BoundedSemaphore(slow_slots),
+            'stream': threading.BoundedSemaphore(stream_slots),
+        }
+
+    def __call__(self, environ, start_response):
+        kind = request_class(environ.get('PATH_INFO', ''))
+        slot = self.slots.get(kind)
+        if slot is None:
+            return self.wsgi_app(environ, start_response)
+
+        if draining.is_set() or not slot.acquire(blocking=False):
+            start_response('503 Service Unavailable', [
+                ('Content-Type', 'text/plain'), ('Retry-After', '5'),
+            ])
+            return [b'Server busy, try again shortly\n']
+
+        try:
+            iterable = self.wsgi_app(environ, start_response)
+        except BaseException:
+            slot.release()
+            raise
+        return _Released(iterable, slot, kind == 'stream')
+
+
+def check_capacity(threads, slow_slots, stream_slots):
+    """Raise ValueError unless some workers are left over for fast requests"""
+    if slow_slots + stream_slots >= threads:
+        raise ValueError(
+            f"{slow_slots} slow and {stream_slots} stream slots leave none of the "
+            f"{threads} server threads for fast requests"
+        )
+
+
+def create_server(wsgi_app, host, port):
+    """Build the cheroot server for wsgi_app
+
+    Raises ImportError without cheroot and ValueError if the slot settings
+    would leave no workers for fast requests.
+    """
+    check_capacity(config.SERVER_THREADS, config.SERVER_SLOW_SLOTS, config.SERVER_STREAM_SLOTS)
+    from cheroot import wsgi
+
+    limited = CapacityLimiter(wsgi_app, config.SERVER_SLOW_SLOTS, config.SERVER_STREAM_SLOTS)
+    return wsgi.Server(
+        (host, port), limited,
+        numthreads=config.SERVER_THREADS,
+        max=config.SERVER_THREADS,
+        request_queue_size=config.SERVER_BACKLOG,
+        # Idle keep-alive connections and stalled request reads are closed
+        # after this many seconds
+        timeout=config.SERVER_SOCKET_TIMEOUT,
+        shutdown_timeout=config.SERVER_DRAIN_TIMEOUT,
+    )
+
+
+def serve(wsgi_app, host, port, on_shutdown=None):
+    """Serve until SIGTERM or SIGINT, then drain in-flight requests and return
+
+    Raises ImportError if cheroot is not installed, ValueError if the slot
+    settings leave no workers for fast requests and OSError if the port
+    cannot be bound.
+    """
+    server = create_server(wsgi_app, host, port)
+    server.prepare()
+    stopper = []
+
+    def shutdown(signum, frame):
+        if stopper:
+            return
+        print(f"Received signal {signum}, draining requests...")
+        draining.set()
+        if on_shutdown:
+            on_shutdown()
+        # stop() waits for workers, so it must not run inside the signal handler
+        stopper.append(threading.Thread(target=server.stop, name='server-drain'))
+        stopper[0].start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    print(f"Serving on http://{host}:{port} with {config.SERVER_THREADS} worker threads")
+    server.serve()
+    if stopper:
+        stopper[0].join()
+    print("Server stopped")
@@ -2,6 +2,14 @@
 let currentSSID = null;
 let savedNetworkSSIDs = [];
 let updateInterval = null;
+let statusSource = null;
+let scanInterval = null;
+
+// Available networks by SSID, as of scan version scanVersion
+let availableNetworks = new Map();
+let availableElements = new Map();
+let scanVersion = null;
+let scanETag = null;
 
 // Initialize on page load
 document.addEventListener('DOMContentLoaded', function() {
@@ -14,12 +22,16 @@ function initializeApp() {
     loadAvailableNetworks();
     loadSavedNetworks();
     
-    // Start auto-update polling (every 5 seconds)
-    updateInterval = setInterval(updateStatus, 5000);
+    // Subscribe to server-pushed status changes (poll if SSE is unsupported)
+    subscribeToStatus();
+    
+    // Refresh available networks; unchanged scans cost a 304 or an empty delta
+    scanInterval = setInterval(loadAvailableNetworks, 30000);
     
     // Setup event listeners
     document.getElementById('scan-btn').addEventListener('click', rescanNetworks);
     document.getElementById('ping-btn').addEventListener('click', runPingTest);
+    document.getElementById('diag-btn').addEventListener('click', runDiagnostics);
     document.getElementById('modal-connect').addEventListener('click', connectFromModal);
     document.getElementById('modal-cancel').addEventListener('click', closeModal);
     
@@ -44,24 +56,29 @@ function updateStatus() {
     loadSavedNetworks();
 }
 
+// Receive status changes from the server as they happen
+function subscribeToStatus() {
+    if (!window.EventSource) {
+        updateInterval = setInterval(updateStatus, 5000);
+        return;
+    }
+    
+    statusSource = new EventSource('/api/events');
+    statusSource.addEventListener('status', function(e) {
+        const status = JSON.parse(e.data);
+        renderCurrentConnection(status.current, status.ip);
+        renderSavedNetworks(status.saved);
+    });
+    // EventSource reconnects on its own after errors
+}
+
 // Load current connection
 function loadCurrentConnection() {
     fetch('/api/current')
         .then(response => response.json())
         .then(data => {
             if (data.success) {
-                const ssidElement = document.getElementById('current-ssid');
-                const ipElement = document.getElementById('current-ip');
-                
-                if (data.current && data.current.ssid) {
-                    currentSSID = data.current.ssid;
-                    ssidElement.textContent = data.current.ssid;
-                    ipElement.textContent = data.ip;
-                } else {
-                    currentSSID = null;
-                    ssidElement.textContent = 'Not connected';
-                    ipElement.textContent = '-';
-                }
+                renderCurrentConnection(data.current, data.ip);
             }
         })
         .catch(error => {
@@ -69,72 +86,129 @@ function loadCurrentConnection() {
         });
 }
 
-// Load available networks
+// Render current connection
+function renderCurrentConnection(current, ip) {
+    const ssidElement = document.getElementById('current-ssid');
+    const ipElement = document.getElementById('current-ip');
+    
+    if (current && current.ssid) {
+        currentSSID = current.ssid;
+        ssidElement.textContent = current.ssid;
+        ipElement.textContent = ip;
+    } else {
+        currentSSID = null;
+        ssidElement.textContent = 'Not connected';
+        ipElement.textContent = '-';
+    }
+}
+
+// Load available networks, fetching only what changed since the last scan
 function loadAvailableNetworks() {
     const container = document.getElementById('available-networks');
-    container.innerHTML = '<div class="loading">Scanning for networks...</div>';
+    const headers = {};
+    let url = '/api/scan';
     
-    fetch('/api/scan')
-        .then(response => response.json())
+    if (scanVersion !== null) {
+        // The token names the server process too, so it is sent back as received
+        url += `?since=${encodeURIComponent(scanVersion)}`;
+        if (scanETag) {
+            headers['If-None-Match'] = scanETag;
+        }
+    } else {
+        container.innerHTML = '<div class="loading">Scanning for networks...</div>';
+    }
+    
+    fetch(url, { headers: headers, cache: 'no-store' })
+        .then(response => {
+            if (response.status === 304) {
+                return null;
+            }
+            scanETag = response.headers.get('ETag');
+            return response.json();
+        })
         .then(data => {
-            if (data.success && data.networks.length > 0) {
-                container.innerHTML = '';
-                data.networks.forEach(network => {
-                    // Skip if this is a saved network
-                    if (savedNetworkSSIDs.includes(network.ssid)) return;
-                    
-                    const networkElement = createNetworkElement(network, false);
-                    container.appendChild(networkElement);
-                });
-                
-                // Check if any networks were added
-                if (container.children.length === 0) {
-                    container.innerHTML = '<div class="loading">No other networks found</div>';
-                }
-            } else {
-                container.innerHTML = '<div class="loading">No networks found</div>';
+            if (data && data.success) {
+                applyScanResponse(data);
             }
         })
         .catch(error => {
             console.error('Error loading networks:', error);
-            container.innerHTML = '<div class="loading">Error loading networks</div>';
+            if (scanVersion === null) {
+                container.innerHTML = '<div class="loading">Error loading networks</div>';
+            }
         });
 }
 
+// Apply a full scan list or a delta to availableNetworks and re-render
+function applyScanResponse(data) {
+    if (data.full) {
+        availableNetworks = new Map(data.networks.map(n => [n.ssid, n]));
+    } else {
+        data.removed.forEach(ssid => availableNetworks.delete(ssid));
+        data.added.concat(data.changed).forEach(n => availableNetworks.set(n.ssid, n));
+    }
+    scanVersion = data.version;
+    renderAvailableNetworks();
+}
+
+// Render available networks, updating only the elements that changed
+function renderAvailableNetworks() {
+    const container = document.getElementById('available-networks');
+    
+    // Skip saved networks, strongest first
+    const networks = Array.from(availableNetworks.values())
+        .filter(n => !savedNetworkSSIDs.includes(n.ssid))
+        .sort((a, b) => parseInt(b.signal) - parseInt(a.signal));
+    
+    container.querySelectorAll('.loading').forEach(el => el.remove());
+    
+    const visible = new Set(networks.map(n => n.ssid));
+    availableElements.forEach((element, ssid) => {
+        if (!visible.has(ssid)) {
+            element.remove();
+            availableElements.delete(ssid);
+        }
+    });
+    
+    networks.forEach(network => {
+        const key = JSON.stringify(network);
+        let element = availableElements.get(network.ssid);
+        if (!element || element.dataset.key !== key) {
+            const replacement = createNetworkElement(network, false);
+            replacement.dataset.key = key;
+            if (element) {
+                element.replaceWith(replacement);
+            }
+            element = replacement;
+            availableElements.set(network.ssid, element);
+        }
+        // appendChild moves existing nodes, so this only reorders
+        container.appendChild(element);
+    });
+    
+    if (networks.length === 0) {
+        const message = availableNetworks.size > 0 ? 'No other networks found' : 'No networks found';
+        container.innerHTML = `<div class="loading">${message}</div>`;
+    }
+}
+
 // Rescan networks
 function rescanNetworks() {
     const btn = document.getElementById('scan-btn');
     btn.disabled = true;
     btn.textContent = 'Scanning...';
     
-    const container = document.getElementById('available-networks');
-    container.innerHTML = '<div class="loading">Scanning for networks...</div>';
-    
     fetch('/api/rescan', { method: 'POST' })
         .then(response => response.json())
         .then(data => {
-            if (data.success && data.networks.length > 0) {
-                container.innerHTML = '';
-                data.networks.forEach(network => {
-                    // Skip if this is a saved network
-                    if (savedNetworkSSIDs.includes(network.ssid)) return;
-                    
-                    const networkElement = createNetworkElement(network, false);
-                    container.appendChild(networkElement);
-                });
-                
-                // Check if any networks were added
-                if (container.children.length === 0) {
-                    container.innerHTML = '<div class="loading">No other networks found</div>';
-                }
+            if (data.success) {
+                scanETag = null;
+                applyScanResponse(data);
                 showToast('Scan complete', 'success');
-            } else {
-                container.innerHTML = '<div class="loading">No networks found</div>';
             }
         })
         .catch(error => {
             console.error('Error rescanning networks:', error);
-            container.innerHTML = '<div class="loading">Error scanning networks</div>';
             showToast('Scan failed', 'error');
         })
         .finally(() => {
@@ -150,18 +224,8 @@ function loadSavedNetworks() {
     fetch('/api/saved')
         .then(response => response.json())
         .then(data => {
-            if (data.success && data.networks.length > 0) {
-                // Update saved networks list for filtering
-                savedNetworkSSIDs = data.networks.map(n => n.ssid);
-                
-                container.innerHTML = '';
-                data.networks.forEach(network => {
-                    const networkElement = createNetworkElement(network, true);
-                    container.appendChild(networkElement);
-                });
-            } else {
-                savedNetworkSSIDs = [];
-                container.innerHTML = '<div class="loading">No saved networks</div>';
+            if (data.success) {
+                renderSavedNetworks(data.networks);
             }
         })
         .catch(error => {
@@ -170,6 +234,30 @@ function loadSavedNetworks() {
         });
 }
 
+// Render saved networks
+function renderSavedNetworks(networks) {
+    const container = document.getElementById('saved-networks');
+    
+    if (networks.length > 0) {
+        // Update saved networks list for filtering
+        savedNetworkSSIDs = networks.map(n => n.ssid);
+        
+        container.innerHTML = '';
+        networks.forEach(network => {
+            const networkElement = createNetworkElement(network, true);
+            container.appendChild(networkElement);
+        });
+    } else {
+        savedNetworkSSIDs = [];
+        container.innerHTML = '<div class="loading">No saved networks</div>';
+    }
+    
+    // Saved networks are hidden from the available list
+    if (scanVersion !== null) {
+        renderAvailableNetworks();
+    }
+}
+
 // Create network element
 function createNetworkElement(network, isSaved) {
     const div = document.createElement('div');
@@ -206,6 +294,15 @@ function createNetworkElement(network, isSaved) {
             securitySpan.textContent = network.security;
             detailsDiv.appendChild(securitySpan);
         }
+        
+        if (network.band) {
+            const bandSpan = document.createElement('span');
+            bandSpan.textContent = `${network.band} · Ch ${network.channel}`;
+            if (network.ap_count > 1) {
+                bandSpan.textContent += ` · ${network.ap_count} APs`;
+            }
+            detailsDiv.appendChild(bandSpan);
+        }
     }
     
     infoDiv.appendChild(ssidSpan);
@@ -271,6 +368,64 @@ function closeModal() {
     modal.classList.remove('show');
 }
 
+// Post a connect/forget request and wait for its background job to finish.
+// Resolves with { success, message } once the job is done.
+function runJob(url, body) {
+    return fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body)
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.job) {
+            return data;
+        }
+        return waitForJob(data.job.id);
+    });
+}
+
+// Wait for a job to finish, streaming its state (or polling without EventSource)
+function waitForJob(jobId) {
+    const result = job => ({ success: job.state === 'succeeded', message: job.message, job: job });
+    
+    if (!window.EventSource) {
+        return new Promise((resolve, reject) => {
+            const poll = () => {
+                fetch(`/api/jobs/${jobId}`)
+                    .then(response => response.json())
+                    .then(data => {
+                        if (!data.success) {
+                            reject(new Error(data.message));
+                        } else if (['succeeded', 'failed', 'cancelled'].includes(data.job.state)) {
+                            resolve(result(data.job));
+                        } else {
+                            setTimeout(poll, 1000);
+                        }
+                    })
+                    .catch(reject);
+            };
+            poll();
+        });
+    }
+    
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(`/api/jobs/${jobId}/events`);
+        let last = null;
+        source.addEventListener('job', e => {
+            last = JSON.parse(e.data);
+        });
+        source.addEventListener('done', () => {
+            source.close();
+            resolve(result(last));
+        });
+        source.onerror = () => {
+            source.close();
+            reject(new Error('Lost connection to job stream'));
+        };
+    });
+}
+
 // Connect to saved network (without password prompt)
 function connectToSavedNetwork(ssid) {
     if (!confirm(`Connect to "${ssid}"?`)) {
@@ -279,12 +434,7 @@ function connectToSavedNetwork(ssid) {
     
     showToast('Connecting...', 'success');
     
-    fetch('/api/connect', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ ssid: ssid, password: '' })
-    })
-    .then(response => response.json())
+    runJob('/api/connect', { ssid: ssid, password: '' })
     .then(data => {
         if (data.success) {
             showToast('Connected successfully', 'success');
@@ -313,12 +463,7 @@ function connectFromModal() {
     connectBtn.disabled = true;
     connectBtn.textContent = 'Connecting...';
     
-    fetch('/api/connect', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ ssid: ssid, password: password })
-    })
-    .then(response => response.json())
+    runJob('/api/connect', { ssid: ssid, password: password })
     .then(data => {
         if (data.success) {
             messageDiv.textContent = data.message;
@@ -354,12 +499,7 @@ function forgetNetwork(ssid) {
         return;
     }
     
-    fetch('/api/forget', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ ssid: ssid })
-    })
-    .then(response => response.json())
+    runJob('/api/forget', { ssid: ssid })
     .then(data => {
         if (data.success) {
             showToast('Network forgotten', 'success');
@@ -374,54 +514,143 @@ function forgetNetwork(ssid) {
     });
 }
 
-// Run ping test
+// Run ping test, streaming each reply as it arrives
 function runPingTest() {
     const btn = document.getElementById('ping-btn');
     const output = document.getElementById('diagnostics-output');
     const hostInput = document.getElementById('ping-host');
     
-    const host = hostInput.value.trim() || '8.8.8.8';
+    // Several hosts may be separated by commas or spaces; none pings the
+    // gateway, DNS servers and 8.8.8.8
+    const hosts = hostInput.value.split(/[\s,]+/).filter(h => h);
+    const params = new URLSearchParams({ count: 4 });
+    hosts.forEach(h => params.append('host', h));
+    
+    if (!window.EventSource) {
+        output.textContent = 'Ping test requires a browser with EventSource support';
+        return;
+    }
     
     btn.disabled = true;
     btn.textContent = 'Running...';
-    output.textContent = 'Running ping test...';
+    output.textContent = `Pinging ${hosts.length ? hosts.join(', ') : 'gateway, DNS servers and 8.8.8.8'}...\n\n`;
     
-    fetch('/api/ping', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ host: host, count: 4 })
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            let result = `Ping test to ${data.host}:\n\n`;
-            
-            if (data.packet_loss) {
-                result += `Packet Loss: ${data.packet_loss}\n`;
-            }
-            if (data.min_time) {
-                result += `Min: ${data.min_time}\n`;
-                result += `Avg: ${data.avg_time}\n`;
-                result += `Max: ${data.max_time}\n`;
-            }
-            
-            result += `\n${data.output}`;
-            output.textContent = result;
-            showToast('Ping test complete', 'success');
+    let anyReply = false;
+    const source = new EventSource(`/api/ping/stream?${params}`);
+    const finish = () => {
+        source.close();
+        btn.disabled = false;
+        btn.textContent = 'Run Ping Test';
+    };
+    
+    source.addEventListener('reply', function(e) {
+        const data = JSON.parse(e.data);
+        anyReply = true;
+        output.textContent += `${data.host}: icmp_seq=${data.seq + 1} time=${data.rtt_ms} ms\n`;
+    });
+    source.addEventListener('timeout', function(e) {
+        const data = JSON.parse(e.data);
+        output.textContent += `${data.host}: icmp_seq=${data.seq + 1} timed out\n`;
+    });
+    source.addEventListener('error', function(e) {
+        // Named 'error' events from the server carry data; connection errors don't
+        if (e.data) {
+            const data = JSON.parse(e.data);
+            output.textContent += `${data.host}: ${data.error}\n`;
         } else {
-            output.textContent = `Ping test failed:\n\n${data.output}`;
-            showToast('Ping test failed', 'error');
+            output.textContent += '\nPing stream interrupted';
+            showToast('Ping test error', 'error');
+            finish();
         }
-    })
-    .catch(error => {
-        console.error('Error running ping test:', error);
-        output.textContent = 'Error running ping test';
-        showToast('Ping test error', 'error');
-    })
-    .finally(() => {
+    });
+    source.addEventListener('summary', function(e) {
+        const data = JSON.parse(e.data);
+        let result = `\n${data.host}: Packet Loss: ${data.packet_loss}%`;
+        if (data.received) {
+            result += `, Min: ${data.min_ms} ms, Avg: ${data.avg_ms} ms, Max: ${data.max_ms} ms`;
+            result += `, Jitter: ${data.jitter_ms} ms, p90: ${data.p90_ms} ms`;
+        }
+        output.textContent += result + '\n';
+    });
+    source.addEventListener('done', function() {
+        showToast(anyReply ? 'Ping test complete' : 'Ping test failed', anyReply ? 'success' : 'error');
+        finish();
+    });
+}
+
+// Run network diagnostics, rendering each section as it arrives
+function runDiagnostics() {
+    const btn = document.getElementById('diag-btn');
+    const output = document.getElementById('diagnostics-output');
+    
+    if (!window.EventSource) {
+        output.textContent = 'Diagnostics require a browser with EventSource support';
+        return;
+    }
+    
+    btn.disabled = true;
+    btn.textContent = 'Running...';
+    output.textContent = 'Running diagnostics...\n';
+    
+    const source = new EventSource('/api/diagnostics/stream');
+    const finish = () => {
+        source.close();
         btn.disabled = false;
-        btn.textContent = 'Run Ping Test';
+        btn.textContent = 'Run Diagnostics';
+    };
+    
+    source.addEventListener('section', function(e) {
+        output.textContent += formatDiagnosticsSection(JSON.parse(e.data));
     });
+    source.addEventListener('done', function() {
+        showToast('Diagnostics complete', 'success');
+        finish();
+    });
+    source.onerror = function() {
+        // Without this EventSource would silently re-run the diagnostics
+        output.textContent += '\nDiagnostics stream interrupted';
+        showToast('Diagnostics error', 'error');
+        finish();
+    };
+}
+
+// Format one DNS resolver probe result as a line of text
+function formatDnsResult(result) {
+    const ms = (value) => value !== null ? `${value} ms` : '-';
+    let line = `  ${result.server}: cold ${ms(result.cold_ms)}, cached ${ms(result.cached_ms)}`;
+    if (result.configured) {
+        line += ' (configured)';
+    }
+    if (result.status !== 'ok') {
+        line += ` [${result.status}: ${result.timeouts} timeouts, ${result.failures} failures]`;
+    }
+    return line + '\n';
+}
+
+// Format one diagnostics section as text
+function formatDiagnosticsSection(section) {
+    if (section.timed_out) {
+        return `\n${section.name}: timed out\n`;
+    }
+    
+    const value = section.value;
+    switch (section.name) {
+        case 'interfaces':
+            return '\nInterface Status:\n' + Object.entries(value)
+                .map(([iface, info]) => `  ${iface}: ${info.status}\n`).join('');
+        case 'connection_stats':
+            return '\nConnection Statistics:\n' + Object.entries(value)
+                .map(([key, stat]) => `  ${key}: ${stat}\n`).join('');
+        case 'gateway':
+            return `\nGateway: ${value}\n`;
+        case 'dns_servers':
+            return `\nDNS Servers: ${value.join(', ')}\n`;
+        case 'dns_latency':
+            return '\nDNS Resolver Latency:\n' + (value.results || []).map(formatDnsResult).join('') +
+                (value.recommended ? `  Recommended: ${value.recommended}\n` : '');
+        default:
+            return `\n${section.name}: ${JSON.stringify(value)}\n`;
+    }
 }
 
 // Show toast notification
@@ -440,4 +669,10 @@ window.addEventListener('beforeunload', function() {
     if (updateInterval) {
         clearInterval(updateInterval);
     }
+    if (statusSource) {
+        statusSource.close();
+    }
+    if (scanInterval) {
+        clearInterval(scanInterval);
+    }
 });
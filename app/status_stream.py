@@ -0,0 +1,99 @@
+"""
+Status Stream Module
+One background producer that watches connection state and fans changes out to subscribers
+"""
+import json
+import queue
+import threading
+
+
+class StatusBroadcaster:
+    """Polls a snapshot function and pushes it to subscribers only when it changes
+
+    The producer thread runs only while at least one client is subscribed, so
+    the cost is the same for one open browser tab or twenty.
+    """
+
+    def __init__(self, producer, interval=5):
+        self.producer = producer
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._wake = threading.Event()
+        self._thread = None
+        self._last = None
+
+    def subscribe(self):
+        """Register a subscriber, returns a queue that receives snapshots"""
+        q = queue.Queue(maxsize=4)
+        with self._lock:
+            self._subscribers.add(q)
+            if self._last is not None:
+                q.put_nowait(self._last)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='status-stream', daemon=True)
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q):
+        """Remove a subscriber queue"""
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def refresh_now(self):
+        """Wake the producer so a change made by this process is pushed immediately"""
+        self._wake.set()
+
+    def _publish(self, snapshot):
+        with self._lock:
+            self._last = snapshot
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(snapshot)
+            except queue.Full:
+                # Slow client: drop its oldest snapshot, only the latest matters
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+                q.put_nowait(snapshot)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # Stop polling while nobody is listening
+                    self._thread = None
+                    self._last = None
+                    return
+            try:
+                snapshot = self.producer()
+            except Exception as e:
+                print(f"Error producing status snapshot: {e}")
+                snapshot = None
+            if snapshot is not None and snapshot != self._last:
+                self._publish(snapshot)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+def format_sse(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_stream(broadcaster, event='status', keepalive=15):
+    """Generator of Server-Sent Events for one client of a broadcaster"""
+    q = broadcaster.subscribe()
+    try:
+        while True:
+            try:
+                snapshot = q.get(timeout=keepalive)
+            except queue.Empty:
+                # Comment line keeps proxies from closing the idle connection
+                yield ': keepalive\n\n'
+                continue
+            yield format_sse(event, snapshot)
+    finally:
+        broadcaster.unsubscribe(q)
@@ -0,0 +1,164 @@
+"""
+Throughput Meter
+Samples the kernel's per-interface statistics counters in-process and turns
+them into byte, packet, error and drop rates over sliding windows, plus
+per-station rates for the hotspot's clients
+"""
+import collections
+import threading
+import time
+
+from app import config, hostapd, netinfo
+
+COUNTERS = (
+    'rx_bytes', 'tx_bytes', 'rx_packets', 'tx_packets',
+    'rx_errors', 'tx_errors', 'rx_dropped', 'tx_dropped',
+)
+
+
+def read_counters(ifname):
+    """Statistics counters of an interface from sysfs, or None if it does not exist"""
+    counters = {}
+    for name in COUNTERS:
+        try:
+            with open(netinfo.sysfs_net_path(ifname, 'statistics', name)) as f:
+                counters[name] = int(f.read())
+        except (OSError, ValueError):
+            return None
+    return counters
+
+
+def counter_rates(old, new, elapsed):
+    """Per-second rates between two counter readings
+
+    Bytes become bits per second. A counter that went backwards (the
+    interface was re-created) counts as zero rather than a negative rate.
+    """
+    rates = {}
+    for name in COUNTERS:
+        delta = max(0, new[name] - old[name])
+        if name.endswith('_bytes'):
+            rates[name[:-len('bytes')] + 'bps'] = round(delta * 8 / elapsed)
+        elif name.endswith('_packets'):
+            rates[name[:-len('packets')] + 'pps'] = round(delta / elapsed, 1)
+        else:
+            rates[name + '_per_s'] = round(delta / elapsed, 2)
+    return rates
+
+
+class ThroughputMeter:
+    """Keeps a short history of counter samples and computes windowed rates
+
+    The sampling thread starts on the first read and stops again after
+    idle_timeout seconds without one, so an unwatched system pays nothing.
+    """
+
+    def __init__(self, interfaces=None, interval=None, windows=None, idle_timeout=None):
+        self.interfaces = interfaces or [config.WIFI_INTERFACE, config.HOTSPOT_INTERFACE]
+        self.interval = interval or config.THROUGHPUT_SAMPLE_INTERVAL
+        self.windows = sorted(windows or config.THROUGHPUT_WINDOWS)
+        self.idle_timeout = idle_timeout or config.THROUGHPUT_IDLE_TIMEOUT
+        self._lock = threading.Lock()
+        self._samples = collections.deque(maxlen=int(self.windows[-1] / self.interval) + 2)
+        self._stations = {}
+        self._last_read = 0
+        self._thread = None
+
+    def _sample(self):
+        now = time.monotonic()
+        counters = {ifname: read_counters(ifname) for ifname in self.interfaces}
+        stations = self._sample_stations(now)
+        with self._lock:
+            self._samples.append((now, counters))
+            self._stations = stations
+
+    def _sample_stations(self, now):
+        try:
+            current = hostapd.stations()
+        except hostapd.HostapdError:
+            return {}
+        previous = self._stations
+        stations = {}
+        for station in current:
+            before = previous.get(station['mac'])
+            if before and station['rx_bytes'] is not None and before['rx_bytes'] is not None:
+                elapsed = now - before['sampled_at']
+                station['rx_bps'] = round(max(0, station['rx_bytes'] - before['rx_bytes']) * 8 / elapsed)
+                station['tx_bps'] = round(max(0, station['tx_bytes'] - before['tx_bytes']) * 8 / elapsed)
+            else:
+                station['rx_bps'] = station['tx_bps'] = None
+            station['sampled_at'] = now
+            stations[station['mac']] = station
+        return stations
+
+    def _ensure_running(self):
+        with self._lock:
+            self._last_read = time.monotonic()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='throughput', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            with self._lock:
+                if started - self._last_read > self.idle_timeout:
+                    # Nobody is reading; the next read restarts sampling
+                    self._thread = None
+                    self._samples.clear()
+                    self._stations = {}
+                    return
+            try:
+                self._sample()
+            except Exception as e:
+                print(f"Error sampling throughput: {e}")
+            time.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+    def _window_rates(self, samples, ifname, window):
+        newest_time, newest = samples[-1]
+        if newest.get(ifname) is None:
+            return None
+        for sample_time, counters in samples:
+            if newest_time - sample_time <= window + self.interval / 2:
+                if sample_time == newest_time or counters.get(ifname) is None:
+                    return None
+                elapsed = newest_time - sample_time
+                rates = counter_rates(counters[ifname], newest[ifname], elapsed)
+                rates['seconds'] = round(elapsed, 1)
+                return rates
+        return None
+
+    def snapshot(self):
+        """Counters and windowed rates per interface, and hotspot stations
+
+        Rates are None until two samples a window apart (or at least one
+        interval apart, for a window not yet filled) have been taken.
+        """
+        self._ensure_running()
+        with self._lock:
+            samples = list(self._samples)
+            stations = [dict(station) for station in self._stations.values()]
+
+        leases = hostapd.dhcp_leases() if stations else {}
+        for station in stations:
+            del station['sampled_at']
+            station.update(leases.get(station['mac'], {'ip': None, 'hostname': None}))
+
+        interfaces = {}
+        for ifname in self.interfaces:
+            latest = samples[-1][1].get(ifname) if samples else read_counters(ifname)
+            interfaces[ifname] = {
+                'exists': latest is not None,
+                'counters': latest,
+                'rates': {str(window): self._window_rates(samples, ifname, window) if samples else None
+                          for window in self.windows},
+            }
+        return {
+            'sample_interval': self.interval,
+            'interfaces': interfaces,
+            'stations': stations,
+        }
+
+
+# Shared by every request thread in this process
+throughput_meter = ThroughputMeter()
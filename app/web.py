@@ -0,0 +1,25 @@
+"""
+Web Application
+Flask application, authentication and routes; a thin layer over the core
+modules of the app package
+"""
+from flask import Flask
+from flask_httpauth import HTTPBasicAuth
+import os
+
+app = Flask(__name__)
+app.config['SECRET_KEY'] = os.urandom(24)
+auth = HTTPBasicAuth()
+
+# Authentication credentials
+USERS = {
+    "JLBMaritime": "Admin"
+}
+
+@auth.verify_password
+def verify_password(username, password):
+    if username in USERS and USERS[username] == password:
+        return username
+    return None
+
+from app import routes
@@ -1,142 +1,191 @@
 """
 WiFi Manager Module
-Handles WiFi scanning, connecting, and network management using NetworkManager (nmcli)
+Handles WiFi scanning, connecting, and network management using NetworkManager
+(over D-Bus, or nmcli as a fallback - see app.backends)
 """
-import subprocess
-import re
-from app.database import add_saved_network, forget_network as db_forget_network
+import socket
+import threading
+import time
 
-def run_command(command):
-    """Execute a shell command and return output"""
-    try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        return result.stdout.strip(), result.stderr.strip(), result.returncode
-    except subprocess.TimeoutExpired:
-        return "", "Command timed out", 1
-    except Exception as e:
-        return "", str(e), 1
-
-def run_command_with_args(args):
-    """Execute a command with argument list (no shell, safer for passwords)"""
-    try:
-        result = subprocess.run(
-            args,
-            shell=False,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        return result.stdout.strip(), result.stderr.strip(), result.returncode
-    except subprocess.TimeoutExpired:
-        return "", "Command timed out", 1
-    except Exception as e:
-        return "", str(e), 1
+from app import config, netinfo
+from app.backends import get_backend
+from app.database import (
+    add_saved_network, forget_network as db_forget_network, record_connect_attempt
+)
+from app.connect_timing import PhaseTimer
+from app.jobs import JobCancelled, get_executor
+from app.net_state import network_state
+from app.scan_cache import ScanCache
 
-def scan_networks():
-    """Scan for available WiFi networks using nmcli"""
-    command = "nmcli -t -f SSID,SIGNAL,SECURITY device wifi list ifname wlan0"
-    stdout, stderr, returncode = run_command(command)
+# Shared by every request thread (and the CLI) in this process
+scan_cache = ScanCache(config.SCAN_CACHE_TTL)
+
+def radio_executor():
+    """Executor that serializes every radio-changing operation on wlan0"""
+    return get_executor(config.WIFI_INTERFACE)
+
+def ap_score(ap):
+    """Preference score of an access point
     
-    if returncode != 0:
-        return []
+    Signal strength, plus a bonus for 5/6 GHz access points that are strong
+    enough to use, since they are faster and far less congested than 2.4 GHz.
+    """
+    bonus = config.BAND_PREFERENCE_BONUS if ap['band'] != '2.4 GHz' and ap['signal'] >= 40 else 0
+    return ap['signal'] + bonus
+
+def _build_network_list(access_points):
+    """Group access points by SSID into the network list, best AP first"""
+    by_ssid = {}
+    for ap in access_points:
+        # Skip hidden networks (empty SSIDs)
+        if ap['ssid']:
+            by_ssid.setdefault(ap['ssid'], []).append(ap)
     
     networks = []
-    seen_ssids = set()
-    
-    for line in stdout.split('\n'):
-        if line.strip():
-            parts = line.split(':')
-            if len(parts) >= 2:
-                ssid = parts[0].strip()
-                signal = parts[1].strip() if len(parts) > 1 else "0"
-                security = parts[2].strip() if len(parts) > 2 else ""
-                
-                # Skip empty SSIDs and duplicates
-                if ssid and ssid not in seen_ssids:
-                    seen_ssids.add(ssid)
-                    networks.append({
-                        'ssid': ssid,
-                        'signal': signal,
-                        'security': 'Secured' if security else 'Open'
-                    })
+    for ssid, aps in by_ssid.items():
+        best = max(aps, key=ap_score)
+        networks.append({
+            'ssid': ssid,
+            'signal': str(best['signal']),
+            'security': 'Secured' if best['security'] else 'Open',
+            'bssid': best['bssid'],
+            'band': best['band'],
+            'channel': best['channel'],
+            'frequency': best['frequency'],
+            'rate': best['rate'],
+            'ap_count': len(aps)
+        })
     
     # Sort by signal strength
     networks.sort(key=lambda x: int(x['signal']), reverse=True)
     return networks
 
+def _fetch_access_points():
+    return sorted(get_backend().scan_networks(), key=lambda ap: ap['signal'], reverse=True)
+
+def scan_access_points():
+    """Get every visible access point (one entry per BSSID), strongest first"""
+    return scan_cache.get(_fetch_access_points)
+
+def best_access_point(ssid):
+    """The preferred access point for an SSID from the current scan, or None"""
+    candidates = [ap for ap in scan_access_points() if ap['ssid'] == ssid]
+    return max(candidates, key=ap_score) if candidates else None
+
+def scan_networks():
+    """Get available WiFi networks, served from the scan cache while fresh"""
+    return _build_network_list(scan_access_points())
+
+def scan_snapshot():
+    """Get available WiFi networks with the scan version they belong to"""
+    access_points, version = scan_cache.get_versioned(_fetch_access_points)
+    return _build_network_list(access_points), version
+
+def scan_token(version):
+    """Version token sent to clients, unique across restarts"""
+    return scan_cache.token(version)
+
+def scan_etag(version):
+    """Entity tag for a scan version, unique across restarts"""
+    return f"scan-{scan_token(version)}"
+
+def diff_networks(old, new):
+    """Networks added, removed (by SSID) and changed between two scan lists"""
+    old_by_ssid = {n['ssid']: n for n in old}
+    new_by_ssid = {n['ssid']: n for n in new}
+    return {
+        'added': [n for ssid, n in new_by_ssid.items() if ssid not in old_by_ssid],
+        'removed': [ssid for ssid in old_by_ssid if ssid not in new_by_ssid],
+        'changed': [n for ssid, n in new_by_ssid.items()
+                    if ssid in old_by_ssid and old_by_ssid[ssid] != n],
+    }
+
+def scan_delta(since):
+    """Changes from the scan version token `since` to the current version
+    
+    Returns (networks, version, delta); delta is None when `since` is too old
+    to diff against or comes from before a restart, in which case the full
+    list should be sent.
+    """
+    networks, version = scan_snapshot()
+    since = scan_cache.version_from_token(since)
+    if since is None:
+        return networks, version, None
+    old = scan_cache.snapshot(since)
+    if old is None:
+        return networks, version, None
+    return networks, version, diff_networks(_build_network_list(old), networks)
+
 def get_current_connection():
     """Get currently connected WiFi network on wlan0"""
-    command = "nmcli -t -f NAME,TYPE,DEVICE connection show --active"
-    stdout, stderr, returncode = run_command(command)
-    
-    if returncode != 0:
-        return None
-    
-    for line in stdout.split('\n'):
-        if 'wlan0' in line:
-            parts = line.split(':')
-            if len(parts) >= 1:
-                connection_name = parts[0].strip()
-                
-                # Get more details about the connection
-                detail_cmd = f"nmcli -t -f 802-11-wireless.ssid connection show '{connection_name}'"
-                detail_out, _, detail_code = run_command(detail_cmd)
-                
-                if detail_code == 0 and detail_out:
-                    ssid = detail_out.split(':')[-1].strip()
-                    return {'ssid': ssid, 'connection_name': connection_name}
-                else:
-                    return {'ssid': connection_name, 'connection_name': connection_name}
-    
-    return None
+    if network_state.live:
+        return network_state.get('connection')
+    return get_backend().get_current_connection()
 
 def get_connection_ip():
     """Get IP address of wlan0 interface"""
-    command = "ip -4 addr show wlan0 | grep -oP '(?<=inet\\s)\\d+(\\.\\d+){3}'"
-    stdout, stderr, returncode = run_command(command)
-    
-    if returncode == 0 and stdout:
-        return stdout.split('\n')[0]
-    return "Not connected"
-
-def connect_to_network(ssid, password=None):
-    """Connect to a WiFi network"""
-    # If password is provided, delete any existing connection first
-    # This ensures the new password is used
-    if password:
-        check_cmd = f"nmcli connection show '{ssid}'"
-        _, _, check_code = run_command(check_cmd)
-        
-        if check_code == 0:
-            # Delete existing connection using args (safer for special chars in SSID)
-            delete_args = ['nmcli', 'connection', 'delete', ssid]
-            run_command_with_args(delete_args)
-        
-        # Create new connection with password using args (safer for special chars)
-        connect_args = ['nmcli', 'device', 'wifi', 'connect', ssid, 
-                       'password', password, 'ifname', 'wlan0']
-        stdout, stderr, returncode = run_command_with_args(connect_args)
-    else:
-        # For open networks, try to reuse existing connection
-        check_cmd = f"nmcli connection show '{ssid}'"
-        _, _, check_code = run_command(check_cmd)
-        
-        if check_code == 0:
-            # Connection exists, activate it using args
-            connect_args = ['nmcli', 'connection', 'up', ssid, 'ifname', 'wlan0']
-            stdout, stderr, returncode = run_command_with_args(connect_args)
-        else:
-            # Create new connection for open network using args
-            connect_args = ['nmcli', 'device', 'wifi', 'connect', ssid, 'ifname', 'wlan0']
-            stdout, stderr, returncode = run_command_with_args(connect_args)
-    
-    if returncode == 0:
+    if network_state.live:
+        return network_state.get('ip') or "Not connected"
+    return netinfo.interface_ipv4(config.WIFI_INTERFACE) or "Not connected"
+
+def _wait_for_address(timeout):
+    """Wait until wlan0 has an IPv4 address, returns True if it got one"""
+    deadline = time.monotonic() + timeout
+    while not netinfo.interface_ipv4(config.WIFI_INTERFACE):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+def _resolve_with_timeout(host, timeout):
+    """Look a name up, giving up after timeout seconds; returns True on success"""
+    result = []
+    
+    def lookup():
+        try:
+            result.append(socket.getaddrinfo(host, None))
+        except OSError:
+            pass
+    
+    # getaddrinfo cannot be interrupted, so it runs in a daemon thread
+    thread = threading.Thread(target=lookup, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return bool(result)
+
+def _connect(ssid, password=None, bssid=None, timer=None):
+    """Connect to a WiFi network (see connect_to_network)
+    
+    bssid pins the association to one access point; 'best' picks the
+    preferred access point for the SSID from the latest scan. Without a
+    bssid, the best one is pinned when PIN_BEST_BSSID is enabled.
+    
+    Each phase of the attempt is timed on `timer` (a PhaseTimer) and stored
+    with the attempt; see app.connect_timing.
+    """
+    # Timed from here, so time spent queued behind other jobs is not counted
+    timer = timer or PhaseTimer()
+    timer.reset()
+    if bssid is None and config.PIN_BEST_BSSID:
+        bssid = 'best'
+    if bssid == 'best':
+        timer.start('ap_select')
+        best = best_access_point(ssid)
+        bssid = best['bssid'] if best else None
+    
+    success, stderr = get_backend().connect(ssid, password, bssid, timer=timer)
+    
+    if success:
+        # Time until the network is usable, not just associated
+        timer.start('address')
+        _wait_for_address(config.CONNECT_ADDRESS_TIMEOUT)
+        if config.CONNECT_DNS_PROBE_HOST:
+            timer.start('dns')
+            _resolve_with_timeout(config.CONNECT_DNS_PROBE_HOST, config.CONNECT_DNS_TIMEOUT)
+    timer.stop()
+    record_connect_attempt(ssid, success, timer.total_ms, timer.phases)
+    
+    if success:
         # Add to saved networks database
         add_saved_network(ssid)
         return True, "Connected successfully"
@@ -144,32 +193,81 @@ def connect_to_network(ssid, password=None):
         error_msg = stderr if stderr else "Failed to connect"
         return False, error_msg
 
-def forget_network(ssid):
-    """Forget a saved network"""
+def _timings(timer):
+    return {'total_ms': timer.total_ms, 'phases': timer.phases}
+
+def connect_to_network(ssid, password=None, bssid=None, timer=None):
+    """Connect to a WiFi network and wait for the result
+    
+    Runs as a job on the wlan0 executor so it never overlaps another connect,
+    forget or rescan. Returns (success, message).
+    """
+    try:
+        return radio_executor().run(
+            'connect', lambda: _connect(ssid, password, bssid, timer), {'ssid': ssid, 'bssid': bssid}
+        )
+    except JobCancelled as e:
+        return False, str(e)
+
+def submit_connect(ssid, password=None, bssid=None, on_done=None):
+    """Queue a connect job and return it without waiting
+    
+    The job's result holds the phase timings of the attempt.
+    """
+    timer = PhaseTimer()
+    result = {}
+    
+    def run():
+        outcome = _connect(ssid, password, bssid, timer)
+        result['timings'] = _timings(timer)
+        return outcome
+    
+    return radio_executor().submit('connect', run, {'ssid': ssid, 'bssid': bssid}, on_done, result)
+
+def _forget(ssid):
+    """Forget a saved network (see forget_network)"""
     # Get current connection to prevent forgetting active network
     current = get_current_connection()
     if current and current['ssid'] == ssid:
         return False, "Cannot forget currently active network"
     
     # Delete from NetworkManager
-    command = f"nmcli connection delete '{ssid}'"
-    stdout, stderr, returncode = run_command(command)
+    get_backend().delete_connection(ssid)
     
-    # Always try to remove from database even if nmcli fails
+    # Always try to remove from database even if NetworkManager fails.
+    # If the connection doesn't exist in NetworkManager, still return success
+    # since it's removed from our database
     db_forget_network(ssid)
-    
-    if returncode == 0:
-        return True, "Network forgotten"
-    else:
-        # If the connection doesn't exist in NetworkManager, still return success
-        # since it's removed from our database
-        return True, "Network forgotten"
+    return True, "Network forgotten"
+
+def forget_network(ssid):
+    """Forget a saved network and wait for the result"""
+    try:
+        return radio_executor().run('forget', lambda: _forget(ssid), {'ssid': ssid})
+    except JobCancelled as e:
+        return False, str(e)
+
+def submit_forget(ssid, on_done=None):
+    """Queue a forget job and return it without waiting"""
+    return radio_executor().submit('forget', lambda: _forget(ssid), {'ssid': ssid}, on_done)
+
+def _rescan():
+    try:
+        access_points = radio_executor().run(
+            'rescan', lambda: get_backend().rescan(config.SCAN_TIMEOUT)
+        )
+    except JobCancelled:
+        access_points = get_backend().scan_networks()
+    return sorted(access_points, key=lambda ap: ap['signal'], reverse=True)
 
 def rescan_networks():
-    """Trigger a new WiFi scan"""
-    command = "nmcli device wifi rescan ifname wlan0"
-    run_command(command)
-    # Wait a moment for scan to complete
-    import time
-    time.sleep(2)
-    return scan_networks()
+    """Trigger a new WiFi scan and return its results once it completes
+    
+    Concurrent callers share a single in-flight scan.
+    """
+    return rescan_networks_versioned()[0]
+
+def rescan_networks_versioned():
+    """Like rescan_networks(), but returns (networks, version)"""
+    access_points, version = scan_cache.refresh_versioned(_rescan, kind='rescan')
+    return _build_network_list(access_points), version
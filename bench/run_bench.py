@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+WiFi Manager Benchmarks
+Measures latency, subprocess count and allocations of every web route and
+CLI action against stub nmcli/ip/iwconfig/ping executables
+
+Usage:
+    python3 bench/run_bench.py [--iterations N] [--only PATTERN]
+                               [--baseline FILE] [--latency-scale X]
+
+The stubs are generated from bench/scenario.json (latency and output per
+command pattern) into a temporary directory put first on PATH. Results are
+written to bench/results/ as JSON, and the run exits with status 1 if any
+benchmark exceeds bench/thresholds.json or regresses against --baseline.
+"""
+import argparse
+import base64
+import builtins
+import contextlib
+import fnmatch
+import io
+import json
+import os
+import platform
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+USERNAME = 'JLBMaritime'
+PASSWORD = 'Admin'
+
+
+def write_stubs(scenario, bin_dir, scale):
+    """Write one shell script per stubbed tool, matching "$*" against each pattern"""
+    for tool, rules in scenario['tools'].items():
+        lines = ['#!/bin/sh', 'case "$*" in']
+        for rule in rules:
+            latency = rule.get('latency_ms', 0) * scale / 1000
+            # Only * is a wildcard, everything else (spaces included) is literal
+            pattern = '*'.join(shlex.quote(part) if part else '' for part in rule['match'].split('*'))
+            lines.append(f"    {pattern})")
+            if latency > 0:
+                lines.append(f'        sleep {latency:.3f}')
+            if rule.get('stdout'):
+                lines.append(f"        printf '%s\\n' {shlex.quote(rule['stdout'])}")
+            if rule.get('stderr'):
+                lines.append(f"        printf '%s\\n' {shlex.quote(rule['stderr'])} >&2")
+            lines.append(f"        exit {rule.get('exit', 0)} ;;")
+        lines.append('esac')
+        path = os.path.join(bin_dir, tool)
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.chmod(path, 0o755)
+
+
+def write_fixtures(scenario, root):
+    """Fake /sys/class/net and /proc/net trees for app.netinfo"""
+    sysfs = os.path.join(root, 'sys')
+    procfs = os.path.join(root, 'proc')
+    for ifname, files in scenario.get('sysfs', {}).items():
+        os.makedirs(os.path.join(sysfs, ifname), exist_ok=True)
+        for name, content in files.items():
+            # Names may include a subdirectory, e.g. statistics/rx_bytes
+            os.makedirs(os.path.dirname(os.path.join(sysfs, ifname, name)), exist_ok=True)
+            with open(os.path.join(sysfs, ifname, name), 'w') as f:
+                f.write(content + '\n')
+    os.makedirs(procfs, exist_ok=True)
+    for name, content in scenario.get('procfs', {}).items():
+        with open(os.path.join(procfs, name), 'w') as f:
+            f.write(content + '\n')
+    return sysfs, procfs
+
+
+class SubprocessCounter:
+    """Counts processes spawned by this interpreter, per tool, via audit hooks"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+        sys.addaudithook(self._hook)
+
+    def _hook(self, event, args):
+        if event != 'subprocess.Popen':
+            return
+        executable, argv = args[0], args[1]
+        if isinstance(argv, (str, bytes)):
+            argv = [argv]
+        argv = [a.decode() if isinstance(a, bytes) else str(a) for a in argv or [executable]]
+        if len(argv) >= 3 and argv[1] == '-c':
+            # shell=True: the tool is the first word of the command line
+            tool = argv[2].split()[0] if argv[2].split() else argv[0]
+        else:
+            tool = argv[0]
+        tool = os.path.basename(tool)
+        with self.lock:
+            self.counts[tool] = self.counts.get(tool, 0) + 1
+
+    def take(self):
+        """Counts since the last take()"""
+        with self.lock:
+            counts, self.counts = self.counts, {}
+        return counts
+
+
+def measure(fn, iterations, warmup, counter, setup=None):
+    """Run fn repeatedly; returns latency, subprocess and allocation figures"""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+
+    latencies = []
+    spawned = {}
+    for _ in range(iterations):
+        if setup:
+            setup()
+        counter.take()
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+        for tool, count in counter.take().items():
+            spawned[tool] = spawned.get(tool, 0) + count
+
+    # Allocations are measured on a separate run, tracing slows everything down
+    if setup:
+        setup()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    fn()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    counter.take()
+
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+        'max_ms': round(latencies[-1], 2),
+        'subprocesses': round(sum(spawned.values()) / iterations, 2),
+        'subprocesses_by_tool': {tool: round(count / iterations, 2) for tool, count in sorted(spawned.items())},
+        'alloc_peak_kib': round((peak - before) / 1024, 1),
+        'alloc_retained_kib': round((after - before) / 1024, 1),
+    }
+
+
+def route_benchmarks():
+    """(name, fn, setup) for every route in app/routes.py"""
+    from app.web import app
+    from app.database import add_saved_network
+    from app.wifi_manager import radio_executor, scan_cache
+    from app.assets import build_index
+
+    asset_index = build_index()
+    client = app.test_client()
+    token = base64.b64encode(f'{USERNAME}:{PASSWORD}'.encode()).decode()
+    headers = {'Authorization': f'Basic {token}'}
+
+    def request(method, path, body=None, stream=False):
+        def call():
+            response = client.open(path, method=method, json=body, headers=headers, buffered=not stream)
+            if stream:
+                # Server-Sent Events: read up to the first real event
+                for chunk in response.response:
+                    if not chunk.startswith(b':'):
+                        break
+            response.close()
+            assert response.status_code < 500, f"{method} {path} returned {response.status_code}"
+        return call
+
+    def finished_job():
+        return radio_executor().submit('bench', lambda: (True, 'done'))
+
+    queued = {}
+
+    def queue_job():
+        # A job stuck behind a slow one, so it is still queued when cancelled
+        radio_executor().submit('bench', lambda: time.sleep(0.2) or (True, 'done'))
+        queued['job'] = radio_executor().submit('bench', lambda: (True, 'done'))
+
+    def cancel():
+        request('POST', f"/api/jobs/{queued['job'].id}/cancel")()
+
+    def cold_scan():
+        scan_cache.invalidate()
+
+    def saved_other():
+        add_saved_network('OtherNet')
+
+    job = finished_job()
+    job.wait()
+
+    # Loopback server for the bandwidth test route
+    from app.bandwidth import BandwidthServer
+    bandwidth_port = BandwidthServer('127.0.0.1', 0).start()
+
+    specs = {
+        'GET /': (request('GET', '/'), None),
+        'GET /api/scan': (request('GET', '/api/scan'), cold_scan),
+        'GET /api/access-points': (request('GET', '/api/access-points'), cold_scan),
+        'POST /api/rescan': (request('POST', '/api/rescan'), cold_scan),
+        'GET /api/current': (request('GET', '/api/current'), None),
+        'GET /api/events': (request('GET', '/api/events', stream=True), None),
+        'GET /api/saved': (request('GET', '/api/saved'), None),
+        'POST /api/connect': (request('POST', '/api/connect', {'ssid': 'BenchNet', 'wait': True}), cold_scan),
+        'GET /api/connect/timings': (request('GET', '/api/connect/timings'), None),
+        'POST /api/forget': (request('POST', '/api/forget', {'ssid': 'OtherNet', 'wait': True}), saved_other),
+        'GET /api/jobs': (request('GET', '/api/jobs'), None),
+        'GET /api/jobs/<job_id>': (request('GET', f'/api/jobs/{job.id}'), None),
+        'GET /api/jobs/<job_id>/events': (request('GET', f'/api/jobs/{job.id}/events', stream=True), None),
+        'POST /api/jobs/<job_id>/cancel': (cancel, queue_job),
+        'POST /api/ping': (request('POST', '/api/ping', {'host': '127.0.0.1', 'count': 2}), None),
+        'POST /api/bandwidth': (request('POST', '/api/bandwidth', {
+            'host': '127.0.0.1', 'port': bandwidth_port, 'duration': 0.2,
+        }), None),
+        'GET /api/ping/stream': (request('GET', '/api/ping/stream?host=127.0.0.1&count=2', stream=True), None),
+        'GET /api/diagnostics': (request('GET', '/api/diagnostics'), None),
+        'GET /api/diagnostics/stream': (request('GET', '/api/diagnostics/stream', stream=True), None),
+        'GET /api/history': (request('GET', '/api/history?metric=rssi'), None),
+        'GET /api/failover': (request('GET', '/api/failover'), None),
+        'GET /api/status': (request('GET', '/api/status'), None),
+        'GET /api/throughput': (request('GET', '/api/throughput'), None),
+        'GET /metrics': (request('GET', '/metrics'), None),
+        'GET /api/channels': (request('GET', '/api/channels'), None),
+        'POST /api/channels/apply': (request('POST', '/api/channels/apply', {'channel': 6}), None),
+        'GET /assets/<path:path>': (request('GET', f"/assets/{asset_index.url_path('js/app.js')}"), None),
+    }
+
+    routes = set()
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static':
+            continue
+        for method in rule.methods - {'HEAD', 'OPTIONS'}:
+            routes.add(f'{method} {rule.rule}')
+    missing = sorted(routes - set(specs))
+    return [(f'route {name}', fn, setup) for name, (fn, setup) in specs.items()], missing
+
+
+def cli_benchmarks():
+    """(name, fn, setup) for every CLI menu action, with scripted answers, and subcommand"""
+    sys.path.insert(0, ROOT_DIR)
+    from cli import wifi_cli
+    from app.database import add_saved_network
+    from app.wifi_manager import scan_cache
+
+    def action(fn, answers=()):
+        def call():
+            replies = iter(answers)
+            original = builtins.input
+            builtins.input = lambda prompt='': next(replies)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    fn()
+            finally:
+                builtins.input = original
+        return call
+
+    def cold_scan():
+        scan_cache.invalidate()
+
+    def cold_start():
+        # A fresh interpreter importing the CLI, which must not pull in Flask
+        code = ('import sys; sys.path.insert(0, sys.argv[1]); import cli.wifi_cli; '
+                'assert "flask" not in sys.modules, "the CLI imported Flask"')
+        subprocess.run([sys.executable, '-c', code, ROOT_DIR], check=True)
+
+    def saved_other():
+        # OtherNet is the most recently used, so it is number 1 in the list
+        add_saved_network('OtherNet')
+
+    return [
+        ('cli cold start', cold_start, None),
+        ('cli scan', action(wifi_cli.scan_and_display), cold_scan),
+        ('cli connect', action(wifi_cli.connect_to_network_cli, ['BenchNet', '']), cold_scan),
+        ('cli current', action(wifi_cli.show_current_connection), None),
+        ('cli saved', action(wifi_cli.list_saved_networks_cli), None),
+        ('cli forget', action(wifi_cli.forget_network_cli, ['1', 'y']), saved_other),
+        ('cli diagnostics', action(wifi_cli.run_diagnostics), None),
+        ('cli ping', action(wifi_cli.run_ping_test_cli, ['127.0.0.1', '2']), None),
+        ('cli scan --json', action(lambda: wifi_cli.main(['scan', '--json'])), cold_scan),
+        ('cli status --json', action(lambda: wifi_cli.main(['status', '--json'])), None),
+        ('cli saved --json', action(lambda: wifi_cli.main(['saved', '--json'])), None),
+        ('cli diag --json', action(lambda: wifi_cli.main(['diag', '--json'])), None),
+        ('cli ping --json', action(lambda: wifi_cli.main(['ping', '127.0.0.1', '-c', '2', '--json'])), None),
+    ]
+
+
+def check(results, thresholds, baseline, max_regression, latency_checked):
+    """List of threshold and regression failures"""
+    failures = []
+    defaults = thresholds.get('default', {})
+    for name, result in results.items():
+        limits = dict(defaults, **thresholds.get('benchmarks', {}).get(name, {}))
+        if latency_checked and 'max_p50_ms' in limits and result['p50_ms'] > limits['max_p50_ms']:
+            failures.append(f"{name}: p50 {result['p50_ms']} ms > {limits['max_p50_ms']} ms")
+        if 'max_subprocesses' in limits and result['subprocesses'] > limits['max_subprocesses']:
+            failures.append(f"{name}: {result['subprocesses']} subprocesses > {limits['max_subprocesses']}")
+        if 'max_alloc_peak_kib' in limits and result['alloc_peak_kib'] > limits['max_alloc_peak_kib']:
+            failures.append(f"{name}: peak allocations {result['alloc_peak_kib']} KiB > "
+                            f"{limits['max_alloc_peak_kib']} KiB")
+
+        previous = (baseline or {}).get('results', {}).get(name)
+        if not previous:
+            continue
+        if result['subprocesses'] > previous['subprocesses']:
+            failures.append(f"{name}: subprocesses went from {previous['subprocesses']} "
+                            f"to {result['subprocesses']}")
+        # A few ms of slack keeps sub-millisecond routes from flapping
+        allowed = previous['p50_ms'] * (1 + max_regression / 100) + 5
+        if latency_checked and result['p50_ms'] > allowed:
+            failures.append(f"{name}: p50 regressed from {previous['p50_ms']} ms to {result['p50_ms']} ms")
+    return failures
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--iterations', type=int, default=10, help='measured runs per benchmark')
+    parser.add_argument('--warmup', type=int, default=2, help='unmeasured runs per benchmark')
+    parser.add_argument('--only', help='only run benchmarks matching this glob (e.g. "route *scan*")')
+    parser.add_argument('--scenario', default=os.path.join(BENCH_DIR, 'scenario.json'))
+    parser.add_argument('--thresholds', default=os.path.join(BENCH_DIR, 'thresholds.json'))
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    parser.add_argument('--max-regression', type=float, default=25,
+                        help='allowed p50 slowdown against the baseline, in percent')
+    parser.add_argument('--latency-scale', type=float, default=1.0,
+                        help='multiply stub latencies (latency limits are only checked at 1.0)')
+    parser.add_argument('--output', help='results file (default: bench/results/bench-<time>.json)')
+    args = parser.parse_args()
+
+    with open(args.scenario) as f:
+        scenario = json.load(f)
+    with open(args.thresholds) as f:
+        thresholds = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix='wifi-manager-bench-')
+    bin_dir = os.path.join(workdir, 'bin')
+    os.makedirs(bin_dir)
+    write_stubs(scenario, bin_dir, args.latency_scale)
+    sysfs, procfs = write_fixtures(scenario, workdir)
+    hostapd_conf = os.path.join(workdir, 'hostapd.conf')
+    with open(hostapd_conf, 'w') as f:
+        f.write('interface=wlan1\nhw_mode=g\nchannel=7\n')
+
+    # Settings are read when app.config is imported, so they are set first
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ.get('PATH', '')
+    os.environ.update({
+        'WIFI_MANAGER_BACKEND': 'nmcli',
+        # Only results shared within one request count, not across iterations
+        'WIFI_MANAGER_COMMAND_MEMO_TTL': '0',
+        'WIFI_MANAGER_SYSFS_NET_ROOT': sysfs,
+        'WIFI_MANAGER_PROCFS_NET_ROOT': procfs,
+        'WIFI_MANAGER_CONNECT_ADDRESS_TIMEOUT': '0',
+        'WIFI_MANAGER_CONNECT_DNS_PROBE_HOST': '',
+        # Only the scenario's resolver is probed, the bench stays offline
+        'WIFI_MANAGER_DNS_PROBE_PUBLIC_SERVERS': '',
+        'WIFI_MANAGER_ASSET_BUILD_DIR': os.path.join(workdir, 'assets'),
+        # The hotspot's channel is changed in a copy of its config, never the real one
+        'WIFI_MANAGER_HOSTAPD_CONF': hostapd_conf,
+        'WIFI_MANAGER_HOSTAPD_CTRL_DIR': os.path.join(workdir, 'hostapd'),
+        'WIFI_MANAGER_CHANNEL_ANALYZER': '0',
+        'WIFI_MANAGER_FAILOVER': '0',
+        'WIFI_MANAGER_LINK_SAMPLER': '0',
+    })
+    sys.path.insert(0, ROOT_DIR)
+
+    from app import database
+    database.DB_PATH = os.path.join(workdir, 'bench.db')
+    database.init_db()
+    database.add_saved_networks(['BenchNet', 'Marina Guest'])
+    now = int(time.time())
+    database.add_link_samples([(now - i * 30, 30, -50 - i % 7, 130.0, 2.5, 0.0) for i in range(2880)])
+    for i in range(50):
+        database.record_connect_attempt('BenchNet', i % 10 != 0, 1800 + i, {'profile_lookup': 40, 'activate': 1760 + i})
+
+    counter = SubprocessCounter()
+    routes, missing = route_benchmarks()
+    benchmarks = routes + cli_benchmarks()
+    if args.only:
+        benchmarks = [b for b in benchmarks if fnmatch.fnmatch(b[0], args.only)]
+
+    results = {}
+    print(f"{'benchmark':<42} {'p50 ms':>9} {'p95 ms':>9} {'procs':>6} {'peak KiB':>9}")
+    for name, fn, setup in benchmarks:
+        try:
+            result = measure(fn, args.iterations, args.warmup, counter, setup)
+        except Exception as e:
+            print(f"{name:<42} failed: {e}")
+            results[name] = {'error': str(e)}
+            continue
+        results[name] = result
+        print(f"{name:<42} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+              f"{result['subprocesses']:>6} {result['alloc_peak_kib']:>9.1f}")
+
+    failures = [f"{name}: {result['error']}" for name, result in results.items() if 'error' in result]
+    failures += [f"route {route}: no benchmark defined" for route in missing]
+    failures += check({n: r for n, r in results.items() if 'error' not in r}, thresholds, baseline,
+                      args.max_regression, args.latency_scale == 1.0)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'scenario': os.path.relpath(args.scenario, ROOT_DIR),
+        'latency_scale': args.latency_scale,
+        'results': results,
+        'failures': failures,
+    }
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if failures:
+        print("\nFAILED:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("All benchmarks within thresholds")
+
+
+if __name__ == '__main__':
+    main()
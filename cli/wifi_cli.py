@@ -2,9 +2,18 @@
 """
 WiFi Manager CLI
 Command-line interface version for SSH access
+
+Without arguments an interactive menu is shown. Subcommands (scan, connect,
+status, saved, forget, diag, ping, bandwidth, bandwidth-server, channels,
+watch) run one action for scripts, with --json output and an exit status of
+0 on success and 1 on failure.
 """
+import argparse
+import json
+import queue
 import sys
 import os
+import time
 
 # Add parent directory to path to import app modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -13,8 +22,12 @@ from app.wifi_manager import (
     scan_networks, get_current_connection, get_connection_ip,
     connect_to_network, forget_network as wifi_forget_network, rescan_networks
 )
-from app.network_diagnostics import ping_test, get_full_diagnostics
-from app.database import get_saved_networks, init_db
+from app.network_diagnostics import (
+    iter_ping_test, format_ping_event, iter_diagnostics, get_full_diagnostics, bandwidth_test,
+    parse_bandwidth_port
+)
+from app.database import get_saved_networks
+from app.commands import begin_scope, end_scope
 
 def print_header():
     """Print CLI header"""
@@ -45,15 +58,19 @@ def scan_and_display():
         return
     
     print(f"\nFound {len(networks)} networks:")
+    print_network_table(networks)
+
+def print_network_table(networks):
+    """Print networks as a numbered table"""
     print("-"*60)
-    print(f"{'#':<4} {'SSID':<30} {'Signal':<10} {'Security':<10}")
+    print(f"{'#':<4} {'SSID':<26} {'Signal':<8} {'Security':<9} {'Band':<8} {'Ch':<4}")
     print("-"*60)
     
     for idx, network in enumerate(networks, 1):
-        ssid = network['ssid'][:28]  # Truncate long SSIDs
+        ssid = network['ssid'][:24]  # Truncate long SSIDs
         signal = f"{network['signal']}%"
         security = network['security']
-        print(f"{idx:<4} {ssid:<30} {signal:<10} {security:<10}")
+        print(f"{idx:<4} {ssid:<26} {signal:<8} {security:<9} {network['band']:<8} {network['channel']:<4}")
     
     print("-"*60)
 
@@ -168,34 +185,60 @@ def forget_network_cli():
     except ValueError:
         print("Invalid input")
 
+def format_dns_result(result):
+    """One line describing a resolver's probe result"""
+    def ms(value):
+        return f"{value} ms" if value is not None else "-"
+    line = f"{result['server']}: cold {ms(result['cold_ms'])}, cached {ms(result['cached_ms'])}"
+    if result.get('configured'):
+        line += " (configured)"
+    if result['status'] != 'ok':
+        line += f" [{result['status']}: {result['timeouts']} timeouts, {result['failures']} failures]"
+    return line
+
+def print_diagnostics_section(name, value, timed_out):
+    """Print one diagnostics section"""
+    if timed_out:
+        print(f"\n{name}: timed out")
+        return
+    
+    if name == 'interfaces':
+        # Interface status
+        print("\nInterface Status:")
+        for iface, info in value.items():
+            print(f"  {iface}: {info['status']}")
+    elif name == 'connection_stats':
+        # Connection stats
+        if value:
+            print("\nConnection Statistics:")
+            for key, stat in value.items():
+                print(f"  {key}: {stat}")
+    elif name == 'gateway':
+        print(f"\nGateway: {value}")
+    elif name == 'dns_servers':
+        print(f"\nDNS Servers: {', '.join(value)}")
+    elif name == 'dns_latency':
+        print("\nDNS Resolver Latency:")
+        for result in value.get('results', []):
+            print(f"  {format_dns_result(result)}")
+        if value.get('recommended'):
+            print(f"  Recommended: {value['recommended']}")
+
 def run_diagnostics():
     """Run and display network diagnostics"""
     print("\n--- Network Diagnostics ---")
     
-    diagnostics = get_full_diagnostics()
-    
-    # Interface status
-    print("\nInterface Status:")
-    for iface, info in diagnostics['interfaces'].items():
-        print(f"  {iface}: {info['status']}")
-    
-    # Connection stats
-    if diagnostics['connection_stats']:
-        print("\nConnection Statistics:")
-        for key, value in diagnostics['connection_stats'].items():
-            print(f"  {key}: {value}")
-    
-    # Gateway and DNS
-    print(f"\nGateway: {diagnostics['gateway']}")
-    print(f"DNS Servers: {', '.join(diagnostics['dns_servers'])}")
+    # Sections are printed as soon as each probe completes
+    for name, value, timed_out in iter_diagnostics():
+        print_diagnostics_section(name, value, timed_out)
 
 def run_ping_test_cli():
     """Run ping test via CLI"""
     print("\n--- Ping Test ---")
     
-    host = input("Enter host to ping (default: 8.8.8.8): ").strip()
-    if not host:
-        host = "8.8.8.8"
+    hosts = input("Enter host(s) to ping, separated by spaces (default: 8.8.8.8): ").replace(',', ' ').split()
+    if not hosts:
+        hosts = ["8.8.8.8"]
     
     count = input("Enter number of pings (default: 4): ").strip()
     try:
@@ -203,27 +246,23 @@ def run_ping_test_cli():
     except ValueError:
         count = 4
     
-    print(f"\nPinging {host}...")
-    result = ping_test(host, count)
+    print(f"\nPinging {', '.join(hosts)}...")
     
-    if result['success']:
+    # Replies are printed as they arrive, statistics once all hosts finish
+    any_reply = False
+    for event in iter_ping_test(hosts, count):
+        if event['type'] == 'summary':
+            print()
+            any_reply = any_reply or event['received'] > 0
+        print(format_ping_event(event))
+    
+    if any_reply:
         print(f"\n✓ Ping successful")
-        if 'packet_loss' in result:
-            print(f"Packet Loss: {result['packet_loss']}")
-        if 'min_time' in result:
-            print(f"Min: {result['min_time']}")
-            print(f"Avg: {result['avg_time']}")
-            print(f"Max: {result['max_time']}")
-        print(f"\nFull output:\n{result['output']}")
     else:
         print(f"\n✗ Ping failed")
-        print(f"Error: {result['output']}")
 
-def main():
+def interactive_menu():
     """Main CLI loop"""
-    # Initialize database
-    init_db()
-    
     # Check if running as root
     if os.geteuid() != 0:
         print("Warning: This tool should be run with sudo for full functionality")
@@ -238,6 +277,8 @@ def main():
         print_menu()
         choice = input("Enter your choice (1-8): ").strip()
         
+        # Each menu action shares the results of identical read-only commands
+        begin_scope()
         try:
             if choice == '1':
                 scan_and_display()
@@ -263,8 +304,316 @@ def main():
             sys.exit(0)
         except Exception as e:
             print(f"\nError: {e}")
+        finally:
+            end_scope()
         
         input("\nPress Enter to continue...")
 
+# Exit statuses of the subcommands (argparse exits with 2 on usage errors)
+EXIT_OK = 0
+EXIT_FAILURE = 1
+
+def print_json(data):
+    """Print one JSON document on a single line"""
+    print(json.dumps(data), flush=True)
+
+def status_snapshot():
+    """Current connection and IP address as reported by the status subcommand"""
+    current = get_current_connection()
+    connected = bool(current and current['ssid'])
+    ip = get_connection_ip()
+    return {
+        'connected': connected,
+        'ssid': current['ssid'] if connected else None,
+        'connection_name': current['connection_name'] if connected else None,
+        'ip': ip if connected and ip != "Not connected" else None,
+    }
+
+def cmd_scan(args):
+    """List visible networks"""
+    networks = rescan_networks() if args.rescan else scan_networks()
+    if args.json:
+        print_json(networks)
+    elif networks:
+        print_network_table(networks)
+    else:
+        print("No networks found.")
+    return EXIT_OK
+
+def cmd_connect(args):
+    """Connect to a network"""
+    password = args.password
+    if args.password_stdin:
+        password = sys.stdin.readline().rstrip('\n')
+    success, message = connect_to_network(args.ssid, password or None, args.bssid)
+    if args.json:
+        print_json({'success': success, 'ssid': args.ssid, 'message': message})
+    else:
+        print(f"{'✓' if success else '✗'} {message}")
+    return EXIT_OK if success else EXIT_FAILURE
+
+def cmd_status(args):
+    """Show the current connection"""
+    status = status_snapshot()
+    if args.json:
+        print_json(status)
+    elif status['connected']:
+        print(f"Network:    {status['ssid']}")
+        print(f"IP Address: {status['ip']}")
+    else:
+        print("Not connected to any network")
+    return EXIT_OK if status['connected'] else EXIT_FAILURE
+
+def cmd_saved(args):
+    """List saved networks"""
+    current = get_current_connection()
+    current_ssid = current['ssid'] if current else None
+    saved = [dict(network, connected=network['ssid'] == current_ssid) for network in get_saved_networks()]
+    if args.json:
+        print_json(saved)
+    else:
+        for network in saved:
+            print(f"{network['ssid']}{'  (Connected)' if network['connected'] else ''}")
+    return EXIT_OK
+
+def cmd_forget(args):
+    """Forget a saved network"""
+    success, message = wifi_forget_network(args.ssid)
+    if args.json:
+        print_json({'success': success, 'ssid': args.ssid, 'message': message})
+    else:
+        print(f"{'✓' if success else '✗'} {message}")
+    return EXIT_OK if success else EXIT_FAILURE
+
+def cmd_diag(args):
+    """Run network diagnostics"""
+    if args.json:
+        diagnostics = get_full_diagnostics()
+        print_json(diagnostics)
+        return EXIT_FAILURE if diagnostics['timed_out'] else EXIT_OK
+    
+    timed_out = False
+    for name, value, late in iter_diagnostics():
+        print_diagnostics_section(name, value, late)
+        timed_out = timed_out or late
+    return EXIT_FAILURE if timed_out else EXIT_OK
+
+def cmd_ping(args):
+    """Ping one or more hosts"""
+    replied = {host: False for host in args.hosts}
+    summaries = {}
+    for event in iter_ping_test(args.hosts, args.count):
+        if event['type'] == 'summary':
+            replied[event['host']] = event['received'] > 0
+            summaries[event['host']] = event
+        elif event['type'] == 'error':
+            summaries[event['host']] = event
+        if not args.json:
+            print(format_ping_event(event), flush=True)
+    if args.json:
+        print_json(summaries)
+    # Success only if every host answered
+    return EXIT_OK if all(replied.values()) else EXIT_FAILURE
+
+def format_bandwidth_result(direction, result):
+    """Text lines for one direction of a bandwidth test"""
+    if 'error' in result:
+        return [f"{direction}: {result['error']}"]
+    lines = [f"  {i['start']:5.1f}-{i['end']:5.1f} s  {i['mbps']:8.2f} Mbit/s" for i in result['intervals']]
+    retransmits = result['retransmits'] if result['retransmits'] is not None else 'unknown'
+    lines.append(f"{direction}: {result['mbps']:.2f} Mbit/s over {result['seconds']:.1f} s, "
+                 f"{retransmits} retransmits")
+    return lines
+
+def bandwidth_port(value):
+    """argparse type for a bandwidth server port"""
+    try:
+        return parse_bandwidth_port(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def cmd_bandwidth(args):
+    """Measure throughput to a bandwidth test server"""
+    directions = ('download', 'upload') if args.direction == 'both' else (args.direction,)
+    result = bandwidth_test(args.host, args.port, args.duration, directions)
+    if args.json:
+        print_json(result)
+    else:
+        for direction in directions:
+            for line in format_bandwidth_result(direction, result[direction]):
+                print(line)
+    return EXIT_OK if result['success'] else EXIT_FAILURE
+
+def cmd_bandwidth_server(args):
+    """Answer bandwidth tests until interrupted"""
+    from app.bandwidth import BandwidthServer
+    
+    server = BandwidthServer(args.bind, args.port)
+    port = server.listen()
+    if args.json:
+        print_json({'listening': True, 'host': server.host, 'port': port})
+    else:
+        print(f"Bandwidth test server listening on {server.host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return EXIT_OK
+
+def format_channel_report(report):
+    """Text lines for the channels subcommand"""
+    lines = [f"Channel congestion over {report['samples']} scan(s):"]
+    for entry in report['channels']:
+        strongest = f"{entry['strongest_signal']}%" if entry['strongest_signal'] is not None else '-'
+        marker = '*' if entry['channel'] == report['current_channel'] else ' '
+        lines.append(f" {marker}{entry['channel']:4d}  {entry['band']:8s} {entry['aps']:5.1f} APs  "
+                     f"score {entry['score']:5.2f} (peak {entry['peak_score']:.2f})  strongest {strongest}")
+    for band, channel in report['recommended'].items():
+        if channel is not None:
+            lines.append(f"Best {band} channel: {channel}")
+    if report['current_channel'] is not None:
+        lines.append(f"Hotspot channel: {report['current_channel']} (marked *)")
+    if report['switch_recommended']:
+        lines.append(f"Recommended: move the hotspot to channel {report['recommended_channel']}")
+    return lines
+
+def cmd_channels(args):
+    """Show channel congestion and optionally move the hotspot"""
+    from app.channels import channel_analyzer
+    
+    report = channel_analyzer.report()
+    if args.apply is None:
+        if args.json:
+            print_json(report)
+        else:
+            for line in format_channel_report(report):
+                print(line)
+        return EXIT_OK
+    
+    channel = args.apply or report['recommended_channel']
+    if channel is None:
+        success, message = False, "No channel to recommend yet"
+    else:
+        success, message = channel_analyzer.apply(channel)
+    if args.json:
+        print_json({'success': success, 'channel': channel, 'message': message})
+    else:
+        print(f"{'✓' if success else '✗'} {message}")
+    return EXIT_OK if success else EXIT_FAILURE
+
+def format_status_line(status):
+    """One line of text for the watch subcommand"""
+    stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+    if status['connected']:
+        return f"{stamp} connected {status['ssid']} {status['ip']}"
+    return f"{stamp} disconnected"
+
+def cmd_watch(args):
+    """Print the status now and again each time it changes, until interrupted
+    
+    One process watches NetworkManager and the kernel for events (see
+    app.net_state), so nothing is re-run while the status stays the same.
+    """
+    from app.net_state import network_state
+    
+    changes = network_state.subscribe()
+    network_state.start()
+    last = None
+    try:
+        while True:
+            status = status_snapshot()
+            if status != last:
+                if args.json:
+                    print_json(dict(status, time=time.time()))
+                else:
+                    print(format_status_line(status), flush=True)
+                last = status
+            try:
+                # Events wake this immediately; the timeout only catches the
+                # mirror falling back to direct queries while a watcher restarts
+                changes.get(timeout=args.interval)
+            except queue.Empty:
+                pass
+    except KeyboardInterrupt:
+        return EXIT_OK
+    finally:
+        network_state.stop()
+
+def build_parser():
+    """Argument parser for the scriptable subcommands"""
+    parser = argparse.ArgumentParser(
+        description='JLBMaritime WiFi Manager CLI (interactive menu when run without a command)'
+    )
+    subcommands = parser.add_subparsers(dest='command', metavar='command')
+    
+    def add(name, handler, help_text):
+        sub = subcommands.add_parser(name, help=help_text)
+        sub.add_argument('--json', action='store_true', help='print JSON instead of text')
+        sub.set_defaults(handler=handler, scoped=True)
+        return sub
+    
+    scan = add('scan', cmd_scan, 'list visible networks')
+    scan.add_argument('--rescan', action='store_true', help='run a new scan first')
+    
+    connect = add('connect', cmd_connect, 'connect to a network')
+    connect.add_argument('ssid')
+    connect.add_argument('--password', help='network password (visible to other users, see --password-stdin)')
+    connect.add_argument('--password-stdin', action='store_true', help='read the password from standard input')
+    connect.add_argument('--bssid', help="access point to use, or 'best'")
+    
+    add('status', cmd_status, 'show the current connection (exit status 1 when not connected)')
+    add('saved', cmd_saved, 'list saved networks')
+    
+    forget = add('forget', cmd_forget, 'forget a saved network')
+    forget.add_argument('ssid')
+    
+    add('diag', cmd_diag, 'run network diagnostics (exit status 1 if a probe timed out)')
+    
+    ping = add('ping', cmd_ping, 'ping hosts (exit status 1 unless every host replies)')
+    ping.add_argument('hosts', nargs='*', default=['8.8.8.8'], metavar='host')
+    ping.add_argument('-c', '--count', type=int, default=4, help='echo requests per host')
+    
+    bw = add('bandwidth', cmd_bandwidth, 'measure throughput to a bandwidth test server')
+    bw.add_argument('host')
+    bw.add_argument('-p', '--port', type=bandwidth_port, help='server port (default 5201)')
+    bw.add_argument('-t', '--duration', type=float, default=5, help='seconds per direction')
+    bw.add_argument('-d', '--direction', choices=('download', 'upload', 'both'), default='both')
+    
+    bw_server = add('bandwidth-server', cmd_bandwidth_server, 'answer bandwidth tests until interrupted')
+    bw_server.add_argument('-p', '--port', type=bandwidth_port, help='port to listen on (default 5201)')
+    bw_server.add_argument('--bind', default='0.0.0.0', help='address to listen on')
+    bw_server.set_defaults(scoped=False)
+    
+    channels = add('channels', cmd_channels, 'show channel congestion and the best hotspot channel')
+    channels.add_argument('--apply', nargs='?', type=int, const=0, metavar='CHANNEL',
+                          help='move the hotspot to CHANNEL, or to the recommended one')
+    
+    watch = add('watch', cmd_watch, 'print the status whenever it changes')
+    watch.add_argument('--interval', type=float, default=30,
+                       help='longest time between checks when no change events arrive (seconds)')
+    # Long-running, so command results must not be shared for its whole lifetime
+    watch.set_defaults(scoped=False)
+    return parser
+
+def main(argv=None):
+    """Run a subcommand, or the interactive menu without one; returns the exit status"""
+    args = build_parser().parse_args(argv)
+    
+    # The database is opened on first use, so commands that never read or
+    # write it (status, scan, ping...) do not touch it
+    if args.command is None:
+        interactive_menu()
+        return EXIT_OK
+    
+    if not args.scoped:
+        return args.handler(args)
+    begin_scope()
+    try:
+        return args.handler(args)
+    finally:
+        end_scope()
+
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -51,6 +51,8 @@ echo -e "${GREEN}Step 2: Installing required packages...${NC}"
 apt-get install -y \
     python3 \
     python3-pip \
+    python3-dbus \
+    python3-brotli \
     hostapd \
     dnsmasq \
     network-manager \
@@ -59,7 +61,7 @@ apt-get install -y \
     git
 
 echo -e "${GREEN}Step 3: Installing Python dependencies...${NC}"
-pip3 install --break-system-packages Flask Flask-HTTPAuth netifaces || pip3 install Flask Flask-HTTPAuth netifaces
+pip3 install --break-system-packages Flask Flask-HTTPAuth netifaces cheroot || pip3 install Flask Flask-HTTPAuth netifaces cheroot
 
 echo -e "${GREEN}Step 4: Creating installation directory structure...${NC}"
 # Create main directory
@@ -67,6 +69,7 @@ mkdir -p $INSTALL_DIR
 
 # Create subdirectories
 mkdir -p $INSTALL_DIR/app
+mkdir -p $INSTALL_DIR/app/backends
 mkdir -p $INSTALL_DIR/app/templates
 mkdir -p $INSTALL_DIR/app/static
 mkdir -p $INSTALL_DIR/app/static/css
@@ -82,10 +85,36 @@ cp README.md $INSTALL_DIR/ 2>/dev/null || echo "README.md not found, skipping...
 
 # Copy app directory files
 cp app/__init__.py $INSTALL_DIR/app/
+cp app/web.py $INSTALL_DIR/app/
 cp app/routes.py $INSTALL_DIR/app/
 cp app/wifi_manager.py $INSTALL_DIR/app/
 cp app/network_diagnostics.py $INSTALL_DIR/app/
 cp app/database.py $INSTALL_DIR/app/
+cp app/config.py $INSTALL_DIR/app/
+cp app/scan_cache.py $INSTALL_DIR/app/
+cp app/status_stream.py $INSTALL_DIR/app/
+cp app/netinfo.py $INSTALL_DIR/app/
+cp app/icmp.py $INSTALL_DIR/app/
+cp app/bandwidth.py $INSTALL_DIR/app/
+cp app/dns_probe.py $INSTALL_DIR/app/
+cp app/assets.py $INSTALL_DIR/app/
+cp app/link_sampler.py $INSTALL_DIR/app/
+cp app/failover.py $INSTALL_DIR/app/
+cp app/connect_timing.py $INSTALL_DIR/app/
+cp app/jobs.py $INSTALL_DIR/app/
+cp app/serving.py $INSTALL_DIR/app/
+cp app/metrics.py $INSTALL_DIR/app/
+cp app/commands.py $INSTALL_DIR/app/
+cp app/net_state.py $INSTALL_DIR/app/
+cp app/hostapd.py $INSTALL_DIR/app/
+cp app/throughput.py $INSTALL_DIR/app/
+cp app/channels.py $INSTALL_DIR/app/
+
+# Copy NetworkManager backends
+cp app/backends/__init__.py $INSTALL_DIR/app/backends/
+cp app/backends/nmcli.py $INSTALL_DIR/app/backends/
+cp app/backends/nm_dbus.py $INSTALL_DIR/app/backends/
+cp app/backends/access_point.py $INSTALL_DIR/app/backends/
 
 # Copy templates
 cp app/templates/index.html $INSTALL_DIR/app/templates/
@@ -105,6 +134,9 @@ else
     echo -e "${YELLOW}Warning: logo.png not found. Please add it to $INSTALL_DIR/app/static/ later${NC}"
 fi
 
+# Build fingerprinted, precompressed static assets (rebuilt on startup if they change)
+(cd $INSTALL_DIR && python3 -m app.assets)
+
 # Copy CLI files
 cp cli/wifi_cli.py $INSTALL_DIR/cli/
 
@@ -133,6 +165,9 @@ cat > /etc/hostapd/hostapd.conf <<EOF
 # WiFi Manager Hotspot Configuration
 interface=wlan1
 driver=nl80211
+# Control socket used by the WiFi Manager for station statistics
+ctrl_interface=/var/run/hostapd
+ctrl_interface_group=0
 ssid=$HOTSPOT_SSID
 hw_mode=g
 channel=$HOTSPOT_CHANNEL
@@ -252,7 +287,10 @@ After=network.target hostapd.service dnsmasq.service
 Type=simple
 User=root
 WorkingDirectory=$INSTALL_DIR
+Environment=WIFI_MANAGER_SERVER=production
 ExecStart=/usr/bin/python3 $INSTALL_DIR/run.py
+KillSignal=SIGTERM
+TimeoutStopSec=30
 Restart=always
 RestartSec=10
 
@@ -2,32 +2,105 @@
 """
 WiFi Manager Application Entry Point
 Run this script to start the web server
+
+Pass --production (or set WIFI_MANAGER_SERVER=production) to serve with a
+multithreaded WSGI server instead of Flask's development server.
 """
-from app import app
+from app import config
+from app.web import app
 from app.database import init_db
+from app.assets import build_index
+from app.link_sampler import link_sampler
+from app.failover import failover_supervisor
+from app.net_state import network_state
+from app.bandwidth import BandwidthServer
+from app.channels import channel_analyzer
+import argparse
 import os
 
+def stop_background_tasks():
+    """Stop background threads before the server drains"""
+    failover_supervisor.stop()
+    link_sampler.stop()
+    network_state.stop()
+    channel_analyzer.stop()
+
+def run_dev_server():
+    """Run Flask's built-in development server"""
+    # Run on all interfaces, port 80 (requires sudo)
+    try:
+        app.run(host='0.0.0.0', port=80, debug=False, threaded=True)
+    except PermissionError:
+        print("Error: Permission denied. Please run with sudo to use port 80")
+        print("Alternatively, running on port 5000...")
+        app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
+
+def run_production_server():
+    """Run the production WSGI server, falling back to the development server"""
+    from app import serving
+
+    try:
+        serving.serve(app, '0.0.0.0', 80, on_shutdown=stop_background_tasks)
+    except ImportError as e:
+        print(f"Production server unavailable ({e}), using the development server")
+        run_dev_server()
+    except ValueError as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+    except OSError as e:
+        print(f"Error: Cannot listen on port 80 ({e})")
+        print("Alternatively, running on port 5000...")
+        serving.serve(app, '0.0.0.0', 5000, on_shutdown=stop_background_tasks)
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='JLBMaritime WiFi Manager web server')
+    parser.add_argument('--production', action='store_true',
+                        help='serve with the production WSGI server')
+    parser.add_argument('--dev', action='store_true',
+                        help="serve with Flask's development server")
+    args = parser.parse_args()
+    production = args.production or (config.SERVER_MODE == 'production' and not args.dev)
+
     # Initialize database
     init_db()
-    
+
+    # Fingerprint and precompress the static files the page links to
+    build_index()
+
+    # Mirror wlan0's state from nmcli/ip monitor events instead of polling nmcli
+    if config.NET_STATE_ENABLED:
+        network_state.start()
+
+    # Record link quality history in the background
+    if config.LINK_SAMPLER_ENABLED:
+        link_sampler.start()
+
+    # Reconnect to the best saved network when the current one is lost
+    if config.FAILOVER_ENABLED:
+        failover_supervisor.start()
+
+    # Score channel congestion from scan results and recommend a hotspot channel
+    if config.CHANNEL_ANALYZER_ENABLED:
+        channel_analyzer.start()
+
+    # Answer bandwidth tests from clients on the hotspot or elsewhere
+    if config.BANDWIDTH_SERVER_ENABLED:
+        BandwidthServer().start()
+
     # Check if running as root (required for network operations)
     if os.geteuid() != 0:
         print("Warning: This application should be run with sudo for full functionality")
         print("Example: sudo python3 run.py")
         print()
-    
+
     # Run the Flask app
     print("Starting WiFi Manager...")
     print("Access the web interface at: http://wifi.local or http://192.168.4.1")
     print("Username: JLBMaritime")
     print("Password: Admin")
     print()
-    
-    # Run on all interfaces, port 80 (requires sudo)
-    try:
-        app.run(host='0.0.0.0', port=80, debug=False)
-    except PermissionError:
-        print("Error: Permission denied. Please run with sudo to use port 80")
-        print("Alternatively, running on port 5000...")
-        app.run(host='0.0.0.0', port=5000, debug=False)
+
+    if production:
+        run_production_server()
+    else:
+        run_dev_server()
@@ -0,0 +1,103 @@
+"""
+Tests for the static asset pipeline
+"""
+import gzip
+import os
+
+import pytest
+
+from app import assets, config
+
+CSS = b'body { margin: 0; }\n' * 50
+
+
+@pytest.fixture
+def static(tmp_path):
+    """A static directory with the page's assets, and an empty build directory"""
+    source = tmp_path / 'static'
+    (source / 'css').mkdir(parents=True)
+    (source / 'js').mkdir()
+    (source / 'css' / 'style.css').write_bytes(CSS)
+    (source / 'js' / 'app.js').write_bytes(b'console.log("wifi");\n' * 50)
+    (source / 'logo.png').write_bytes(b'\x89PNG' + os.urandom(64))
+    return str(source), str(tmp_path / 'build')
+
+
+def test_build_fingerprints_and_compresses(static):
+    source, output = static
+    manifest = assets.build(source, output)
+    css = manifest['css/style.css']
+    assert css['path'] == f"css/style.{css['etag']}.css"
+    assert len(css['etag']) == assets.HASH_LENGTH
+    assert 'gzip' in css['encodings']
+    with open(os.path.join(output, css['path'] + '.gz'), 'rb') as f:
+        assert gzip.decompress(f.read()) == CSS
+    # PNG is not compressed again
+    assert manifest['logo.png']['encodings'] == []
+    assert assets.load_manifest(output) == manifest
+
+
+def test_rebuild_keeps_unchanged_names_and_prunes_old_ones(static):
+    source, output = static
+    first = assets.build(source, output)
+    assert assets.build(source, output) == first
+
+    with open(os.path.join(source, 'css', 'style.css'), 'ab') as f:
+        f.write(b'p { color: red; }\n')
+    second = assets.build(source, output)
+    assert second['css/style.css']['path'] != first['css/style.css']['path']
+    assert second['js/app.js'] == first['js/app.js']
+    old = os.path.basename(first['css/style.css']['path'])
+    remaining = os.listdir(os.path.join(output, 'css'))
+    assert os.path.basename(second['css/style.css']['path']) in remaining
+    assert not [entry for entry in remaining if entry.startswith(old)]
+
+
+def test_missing_source_is_left_out(static):
+    source, output = static
+    os.unlink(os.path.join(source, 'logo.png'))
+    index = assets.AssetIndex(assets.build(source, output), output)
+    assert index.url_path('logo.png') is None
+    assert index.url_path('js/app.js').startswith('js/app.')
+
+
+@pytest.mark.parametrize('header, available, expected', [
+    ('gzip, deflate, br', ['br', 'gzip'], 'br'),
+    ('gzip', ['br', 'gzip'], 'gzip'),
+    ('br;q=0, gzip;q=0.5', ['br', 'gzip'], 'gzip'),
+    ('*', ['gzip'], 'gzip'),
+    ('*, gzip;q=0', ['gzip'], None),
+    ('identity', ['br', 'gzip'], None),
+    ('', ['gzip'], None),
+    (None, ['gzip'], None),
+    ('br', [], None),
+])
+def test_negotiate(header, available, expected):
+    assert assets.negotiate(header, available) == expected
+
+
+def test_resolve_gives_each_encoding_its_own_etag(static):
+    source, output = static
+    index = assets.AssetIndex(assets.build(source, output), output)
+    path = index.url_path('css/style.css')
+    digest = index.manifest['css/style.css']['etag']
+
+    file_path, name, encoding, etag = index.resolve(path, 'gzip')
+    assert (name, encoding, etag) == ('css/style.css', 'gzip', f'{digest}-gzip')
+    assert file_path == os.path.join(output, path + '.gz')
+
+    file_path, _, encoding, etag = index.resolve(path, None)
+    assert (encoding, etag) == (None, digest)
+    assert file_path == os.path.join(output, path)
+
+    assert index.resolve('css/style.000000000000.css', 'gzip') is None
+
+
+def test_loading_the_index_writes_nothing(tmp_path, monkeypatch):
+    output = tmp_path / 'build'
+    monkeypatch.setattr(config, 'ASSET_BUILD_DIR', str(output))
+    monkeypatch.setattr(assets, '_index', None)
+    index = assets.get_index()
+    assert index.manifest == {}
+    assert index.url_path('css/style.css') is None
+    assert not output.exists()
@@ -0,0 +1,90 @@
+"""
+Loopback tests for the bandwidth test engine, including a slow reader
+"""
+import socket
+import threading
+import time
+
+import pytest
+
+from app import bandwidth, network_diagnostics
+
+SMALL_BUFFER = 64 * 1024
+
+
+@pytest.fixture
+def server():
+    server = bandwidth.BandwidthServer('127.0.0.1', 0, max_duration=5)
+    port = server.start()
+    yield port
+    server.stop()
+
+
+def throttled_reader(sock, bytes_per_second, stop):
+    """Read from sock at about bytes_per_second until the sender closes"""
+    chunk = 8 * 1024
+    total = 0
+    while not stop.is_set():
+        data = sock.recv(chunk)
+        if not data:
+            break
+        total += len(data)
+        time.sleep(len(data) / bytes_per_second)
+    return total
+
+
+def test_send_for_stops_near_deadline_on_slow_reader():
+    listener = socket.create_server(('127.0.0.1', 0))
+    sender = socket.socket()
+    # Small kernel buffers, so the reader's pace is what the sender sees
+    sender.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SMALL_BUFFER)
+    sender.connect(listener.getsockname())
+    receiver, _ = listener.accept()
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SMALL_BUFFER)
+    stop = threading.Event()
+    # About 5 Mbit/s
+    reader = threading.Thread(target=throttled_reader, args=(receiver, 625_000, stop), daemon=True)
+    reader.start()
+    try:
+        started = time.monotonic()
+        sent = bandwidth.send_for(sender, 0.5)
+        elapsed = time.monotonic() - started
+    finally:
+        stop.set()
+        sender.close()
+        receiver.close()
+        listener.close()
+    assert sent > 0
+    # One 4 MiB sendfile() alone would take over 6 s at this rate
+    assert elapsed < 2.0
+
+
+@pytest.mark.parametrize('direction', bandwidth.DIRECTIONS)
+def test_run_test_loopback(server, direction):
+    result = bandwidth.run_test('127.0.0.1', server, duration=0.3, direction=direction)
+    assert result['direction'] == direction
+    assert result['bytes'] > 0
+    assert result['mbps'] > 0
+    assert sum(interval['bytes'] for interval in result['intervals']) == result['bytes']
+
+
+def test_refuses_duration_over_limit(server):
+    with pytest.raises(bandwidth.BandwidthError, match='Duration'):
+        bandwidth.run_test('127.0.0.1', server, duration=10)
+
+
+def test_unreachable_server():
+    listener = socket.create_server(('127.0.0.1', 0))
+    port = listener.getsockname()[1]
+    listener.close()
+    with pytest.raises(bandwidth.BandwidthError, match='Cannot connect'):
+        bandwidth.run_test('127.0.0.1', port, duration=0.1)
+
+
+def test_parse_port():
+    assert network_diagnostics.parse_bandwidth_port(None) is None
+    assert network_diagnostics.parse_bandwidth_port(5201) == 5201
+    assert network_diagnostics.parse_bandwidth_port('5201') == 5201
+    for port in (0, 65536, -1, '52o1', 52.5, True, [5201]):
+        with pytest.raises(ValueError):
+            network_diagnostics.parse_bandwidth_port(port)
@@ -0,0 +1,107 @@
+"""
+Tests for moving the hotspot between channels
+"""
+import pytest
+
+from app import channels, commands, config, hostapd
+
+CONF = "interface=wlan1\nhw_mode=g\nchannel=7\nssid=Pi\n"
+
+
+@pytest.fixture
+def hotspot(tmp_path, monkeypatch):
+    """hostapd on channel 7 with a temporary hostapd.conf; records requests and restarts"""
+    conf = tmp_path / 'hostapd.conf'
+    conf.write_text(CONF)
+    state = {'requests': [], 'restarts': 0, 'switch_error': None, 'restart_code': 0, 'stations': []}
+
+    def request(command, interface=None, timeout=1.0):
+        state['requests'].append(command)
+        if command == 'STATUS':
+            return 'state=ENABLED\nchannel=7\n'
+        if state['switch_error']:
+            raise hostapd.HostapdError(state['switch_error'])
+        return 'OK'
+
+    def stations(interface=None):
+        if isinstance(state['stations'], Exception):
+            raise state['stations']
+        return state['stations']
+
+    def run_command(args, timeout=None, read_only=False):
+        state['restarts'] += 1
+        state['conf_at_restart'] = conf.read_text()
+        return '', 'Job for hostapd.service failed' if state['restart_code'] else '', state['restart_code']
+
+    monkeypatch.setattr(config, 'HOSTAPD_CONF', str(conf))
+    monkeypatch.setattr(config, 'CHANNEL_CANDIDATES', [1, 6, 11])
+    monkeypatch.setattr(config, 'HOTSPOT_BANDS', [channels.BAND_24])
+    monkeypatch.setattr(hostapd, 'request', request)
+    monkeypatch.setattr(hostapd, 'stations', stations)
+    monkeypatch.setattr(commands, 'run_command', run_command)
+    state['conf'] = conf
+    return state
+
+
+def test_live_switch_saves_channel(hotspot):
+    success, _ = channels.apply_channel(11)
+    assert success
+    assert hotspot['requests'][-1] == 'CHAN_SWITCH 5 2462'
+    assert 'channel=11\n' in hotspot['conf'].read_text()
+    assert hotspot['restarts'] == 0
+
+
+def test_failed_switch_without_restart_leaves_config(hotspot):
+    hotspot['switch_error'] = 'FAIL'
+    success, _ = channels.apply_channel(11, allow_restart=False)
+    assert not success
+    assert hotspot['conf'].read_text() == CONF
+    assert hotspot['restarts'] == 0
+
+
+def test_restart_reads_new_channel(hotspot):
+    hotspot['switch_error'] = 'FAIL'
+    success, _ = channels.apply_channel(11)
+    assert success
+    assert 'channel=11\n' in hotspot['conf_at_restart']
+    assert 'channel=11\n' in hotspot['conf'].read_text()
+
+
+def test_failed_restart_restores_config(hotspot):
+    hotspot['switch_error'] = 'FAIL'
+    hotspot['restart_code'] = 1
+    success, message = channels.apply_channel(11)
+    assert not success
+    assert 'failed' in message
+    assert hotspot['conf'].read_text() == CONF
+
+
+def maintenance_analyzer(monkeypatch, switch=True):
+    analyzer = channels.ChannelAnalyzer(interval=300)
+    monkeypatch.setattr(channels, 'in_window', lambda window, now=None: True)
+    monkeypatch.setattr(config, 'CHANNEL_MIN_SAMPLES', 1)
+    monkeypatch.setattr(analyzer, 'report', lambda: {'switch_recommended': switch, 'recommended_channel': 11})
+    analyzer._samples.append((0, {}))
+    return analyzer
+
+
+def test_unknown_clients_are_not_idle(hotspot, monkeypatch):
+    hotspot['switch_error'] = 'FAIL'
+    hotspot['stations'] = hostapd.HostapdError('No hostapd control socket')
+    analyzer = maintenance_analyzer(monkeypatch)
+    analyzer._maybe_apply(channels.time.time())
+    assert hotspot['restarts'] == 0
+    assert analyzer._last_attempt['success'] is False
+
+
+def test_failed_maintenance_move_is_not_retried(hotspot, monkeypatch):
+    hotspot['switch_error'] = 'FAIL'
+    hotspot['stations'] = [{'mac': 'AA:BB:CC:DD:EE:FF'}]
+    analyzer = maintenance_analyzer(monkeypatch)
+    now = channels.time.time()
+    analyzer._maybe_apply(now)
+    switches = hotspot['requests'].count('CHAN_SWITCH 5 2462')
+    analyzer._maybe_apply(now + 300)
+    assert hotspot['requests'].count('CHAN_SWITCH 5 2462') == switches == 1
+    assert analyzer._last_applied is None
+    assert hotspot['conf'].read_text() == CONF
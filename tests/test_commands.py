@@ -0,0 +1,120 @@
+"""
+Tests for the command runner: shared read-only results, scopes, timeouts
+and the concurrency limit
+"""
+import threading
+import time
+
+import pytest
+
+from app import commands, config
+
+# Prints a different value on every run, so equal results mean one run
+CLOCK = ['date', '+%s%N']
+
+
+@pytest.fixture(autouse=True)
+def fresh_memo():
+    commands.invalidate()
+    yield
+    commands.invalidate()
+    commands.end_scope()
+
+
+def test_rejects_shell_strings():
+    with pytest.raises(TypeError):
+        commands.run_command('echo hello')
+
+
+def test_result_and_exit_status():
+    assert commands.run_command(['sh', '-c', 'echo out; echo err >&2; exit 3']) == ('out', 'err', 3)
+    assert commands.run_command(['/nonexistent/tool'])[2] == 1
+
+
+def test_read_only_results_are_shared_for_the_ttl(monkeypatch):
+    monkeypatch.setattr(config, 'COMMAND_MEMO_TTL', 0.3)
+    first = commands.run_command(CLOCK, read_only=True)
+    assert commands.run_command(CLOCK, read_only=True) == first
+    time.sleep(0.4)
+    assert commands.run_command(CLOCK, read_only=True) != first
+
+
+def test_other_commands_clear_shared_results(monkeypatch):
+    monkeypatch.setattr(config, 'COMMAND_MEMO_TTL', 60)
+    first = commands.run_command(CLOCK, read_only=True)
+    commands.run_command(['true'])
+    assert commands.run_command(CLOCK, read_only=True) != first
+
+
+def test_concurrent_identical_queries_run_once(monkeypatch):
+    monkeypatch.setattr(config, 'COMMAND_MEMO_TTL', 0)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(
+            commands.run_command(['sh', '-c', 'sleep 0.2; date +%s%N'], read_only=True)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 5 and len(set(results)) == 1
+
+
+def test_scope_keeps_results_past_the_ttl(monkeypatch):
+    monkeypatch.setattr(config, 'COMMAND_MEMO_TTL', 0)
+    commands.begin_scope()
+    first = commands.run_command(CLOCK, read_only=True)
+    time.sleep(0.05)
+    assert commands.run_command(CLOCK, read_only=True) == first
+
+    # bind_scope carries the scope to another thread
+    seen = []
+    scoped = commands.bind_scope(lambda: seen.append(commands.run_command(CLOCK, read_only=True)))
+    worker = threading.Thread(target=scoped)
+    worker.start()
+    worker.join()
+    assert seen == [first]
+
+    commands.end_scope()
+    assert commands.run_command(CLOCK, read_only=True) != first
+
+
+def test_timeout_kills_the_process_group(tmp_path):
+    marker = tmp_path / 'survived'
+    started = time.monotonic()
+    result = commands.run_command(['sh', '-c', f'(sleep 0.5; touch {marker}) & sleep 30'], timeout=0.2)
+    assert result == ('', 'Command timed out', 1)
+    assert time.monotonic() - started < 2
+    # The background child was killed with the shell
+    time.sleep(0.8)
+    assert not marker.exists()
+
+
+def test_concurrency_is_limited(monkeypatch):
+    monkeypatch.setattr(commands, '_slots', threading.BoundedSemaphore(2))
+    threads = [threading.Thread(target=commands.run_command, args=(['sleep', '0.3'],)) for _ in range(4)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Two rounds of two
+    assert 0.55 < time.monotonic() - started < 1.5
+
+
+def test_start_process_takes_an_argument_list():
+    with pytest.raises(TypeError):
+        commands.start_process('nmcli monitor')
+
+
+def test_stop_process_ends_the_process_group(tmp_path):
+    marker = tmp_path / 'survived'
+    process = commands.start_process(['sh', '-c', f'echo ready; (sleep 0.5; touch {marker}) & sleep 30'])
+    assert process.stdout.readline() == 'ready\n'
+    commands.stop_process(process)
+    assert process.wait(2) != 0
+    time.sleep(0.8)
+    assert not marker.exists()
+    # Stopping again after it exited is harmless
+    commands.stop_process(process)
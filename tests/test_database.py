@@ -0,0 +1,122 @@
+"""
+Tests for the SQLite connection pool and the batch queries
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh database file as the process-wide DB_PATH"""
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'wifi_manager.db'))
+    database.init_db()
+    yield database
+    database.get_pool().close()
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = database.ConnectionPool(str(tmp_path / 'pool.db'), size=2)
+    yield pool
+    pool.close()
+
+
+def test_connections_use_wal(pool):
+    with pool.connection() as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+
+def test_connection_is_reused(pool):
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+
+
+def test_threads_share_at_most_size_connections(pool):
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE hits (thread TEXT)')
+    used = set()
+    in_use = []
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        for _ in range(5):
+            with pool.connection() as conn:
+                with lock:
+                    used.add(id(conn))
+                    in_use.append(conn)
+                    peak.append(len(in_use))
+                conn.execute('INSERT INTO hits VALUES (?)', (threading.current_thread().name,))
+                time.sleep(0.005)
+                with lock:
+                    in_use.remove(conn)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(used) <= 2 and max(peak) <= 2
+    with pool.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM hits').fetchone()[0] == 40
+
+
+def test_error_rolls_back_and_returns_the_connection(pool):
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE t (x)')
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            conn.execute('INSERT INTO t VALUES (1)')
+            raise RuntimeError('boom')
+    with pool.connection() as again:
+        assert again is conn
+        assert again.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+
+
+def test_saved_networks_batch(db):
+    db.add_saved_networks(['Home', 'Cafe', 'Office'])
+    assert db.count_saved_networks() == 3
+    db.add_saved_network('Home')
+    assert db.get_saved_networks()[0]['ssid'] == 'Home'
+    assert db.count_saved_networks() == 3
+
+    assert db.forget_networks(['Cafe', 'Office', 'Unknown'])
+    assert [n['ssid'] for n in db.get_saved_networks()] == ['Home']
+    assert db.network_exists('Home') and not db.network_exists('Cafe')
+
+
+def test_link_samples_batch_and_history(db):
+    db.add_link_samples([(ts, 1, -50 - ts % 2, 72.0, 5.0, 0.0) for ts in range(1000, 1020)])
+    # Replaces rather than duplicates
+    db.add_link_sample(1000, 1, -60, 72.0, 5.0, 0.0)
+    history = db.get_link_history('rssi', 1000, 1019, 10)
+    assert history == [[1000, -51.5], [1010, -50.5]]
+    with pytest.raises(ValueError):
+        db.get_link_history('ssid', 1000, 1019, 10)
+
+
+def test_downsample_link_samples(db):
+    db.add_link_samples([(ts, 1, -50.0, None, None, None) for ts in range(0, 120)])
+    db.downsample_link_samples(now=200, tiers=[(1, 100), (60, 1000)])
+    # Whole minutes older than 100 s are rolled up into one 60 s row
+    with db.get_pool().connection() as conn:
+        rows = conn.execute('SELECT ts, resolution, rssi FROM link_samples WHERE resolution = 60').fetchall()
+    assert rows == [(0, 60, -50.0)]
+
+
+def test_connect_attempts(db):
+    db.record_connect_attempt('Home', True, 1200.5, {'associate': 800.0, 'ip_config': 400.5})
+    db.record_connect_attempt('Home', False)
+    db.record_connect_attempt('Cafe', True)
+    attempts = db.get_connect_attempts('Home')
+    assert [a['success'] for a in attempts] == [False, True]
+    assert attempts[1]['phases'] == {'associate': 800.0, 'ip_config': 400.5}
+    rates = db.get_connect_success_rates(datetime.now() - timedelta(hours=1))
+    assert rates == {'Home': {'attempts': 2, 'success_rate': 0.5}, 'Cafe': {'attempts': 1, 'success_rate': 1.0}}
@@ -0,0 +1,151 @@
+"""
+Tests for the DNS resolver probe against local UDP stub resolvers
+"""
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from app import config, dns_probe, network_diagnostics
+
+
+class StubResolver:
+    """Answers A queries on a loopback port
+
+    The first query for a name waits cold_delay, as a resolver would while
+    asking upstream; repeats wait cached_delay. rcode is returned in every
+    answer, and a silent stub never answers.
+    """
+
+    def __init__(self, cold_delay=0.0, cached_delay=0.0, rcode=0, silent=False):
+        self.cold_delay = cold_delay
+        self.cached_delay = cached_delay
+        self.rcode = rcode
+        self.silent = silent
+        self.seen = set()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.server = f"127.0.0.1:{self.sock.getsockname()[1]}"
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                data, address = self.sock.recvfrom(512)
+            except OSError:
+                return
+            if self.silent:
+                continue
+            question = data[12:]
+            time.sleep(self.cached_delay if question in self.seen else self.cold_delay)
+            self.seen.add(question)
+            query_id, _ = struct.unpack('!HH', data[:4])
+            answers = 1 if self.rcode == 0 else 0
+            header = struct.pack('!HHHHHH', query_id, 0x8180 | self.rcode, 1, answers, 0, 0)
+            self.sock.sendto(header + question, address)
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def stubs():
+    created = []
+
+    def make(**kwargs):
+        stub = StubResolver(**kwargs)
+        created.append(stub)
+        return stub
+
+    yield make
+    for stub in created:
+        stub.close()
+
+
+def test_build_and_parse():
+    packet = dns_probe.build_query('example.com', 0x1234)
+    assert packet[12:] == b'\x07example\x03com\x00\x00\x01\x00\x01'
+    response = struct.pack('!HHHHHH', 0x1234, 0x8183, 1, 0, 0, 0)
+    assert dns_probe.parse_response(response, 0x1234) == (3, 0)
+    # Wrong ID, or a query rather than a response
+    assert dns_probe.parse_response(response, 0x4321) is None
+    assert dns_probe.parse_response(packet, 0x1234) is None
+
+
+def test_parse_server():
+    assert dns_probe.parse_server('192.168.1.1') == ('192.168.1.1', 53)
+    assert dns_probe.parse_server('127.0.0.1:5353') == ('127.0.0.1', 5353)
+    assert dns_probe.parse_server('[::1]:5353') == ('::1', 5353)
+    assert dns_probe.parse_server('fe80::1') == ('fe80::1', 53)
+
+
+def test_cold_and_cached_latency(stubs):
+    stub = stubs(cold_delay=0.1, cached_delay=0.0)
+    result = dns_probe.probe_server(stub.server, timeout=0.5)
+    assert result['status'] == 'ok'
+    assert result['cold_ms'] >= 100
+    assert result['cached_ms'] < 50
+    assert result['queries'] == 1 + 1 + 3
+    assert result['timeouts'] == result['failures'] == 0
+
+
+def test_silent_resolver_is_unreachable(stubs):
+    stub = stubs(silent=True)
+    started = time.monotonic()
+    result = dns_probe.probe_server(stub.server, timeout=0.2)
+    # Not asked again after the first query times out
+    assert time.monotonic() - started < 0.5
+    assert result['status'] == 'unreachable'
+    assert result['timeouts'] == 1
+    assert result['cold_ms'] is None and result['cached_ms'] is None
+
+
+def test_servfail_is_failing(stubs):
+    stub = stubs(rcode=2)
+    result = dns_probe.probe_server(stub.server, timeout=0.2)
+    assert result['status'] == 'failing'
+    assert result['errors'] == ['SERVFAIL']
+    assert result['failures'] == result['queries']
+
+
+def test_recommends_fastest_working_resolver(stubs):
+    slow = stubs(cold_delay=0.15, cached_delay=0.05)
+    fast = stubs(cold_delay=0.02)
+    broken = stubs(rcode=5)
+    silent = stubs(silent=True)
+    started = time.monotonic()
+    report = dns_probe.probe_resolvers(
+        [slow.server, silent.server, broken.server, fast.server, fast.server], timeout=0.3
+    )
+    # Resolvers are probed at once, not one after another
+    assert time.monotonic() - started < 1.0
+    assert report['recommended'] == fast.server
+    order = [result['server'] for result in report['results']]
+    assert order == [fast.server, slow.server, broken.server, silent.server]
+    assert [result['status'] for result in report['results']] == ['ok', 'ok', 'failing', 'unreachable']
+
+
+def test_without_extra_resolvers_only_configured_are_probed(stubs, monkeypatch):
+    configured = stubs()
+    monkeypatch.setattr(config, 'DNS_PROBE_PUBLIC_SERVERS', [])
+    report = network_diagnostics.get_dns_latency([configured.server])
+    assert [(r['server'], r['configured']) for r in report['results']] == [(configured.server, True)]
+
+
+def test_extra_resolvers_are_compared(stubs, monkeypatch):
+    configured, extra = stubs(cold_delay=0.1), stubs()
+    monkeypatch.setattr(config, 'DNS_PROBE_PUBLIC_SERVERS', [extra.server])
+    report = network_diagnostics.get_dns_latency([configured.server])
+    assert [(r['server'], r['configured']) for r in report['results']] == [
+        (extra.server, False), (configured.server, True)
+    ]
+    assert report['recommended'] == extra.server
+
+
+def test_no_working_resolver(stubs):
+    silent = stubs(silent=True)
+    report = dns_probe.probe_resolvers([silent.server], timeout=0.1)
+    assert report['recommended'] is None
+    assert dns_probe.probe_resolvers([]) == {'results': [], 'recommended': None}
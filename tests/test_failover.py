@@ -0,0 +1,49 @@
+"""
+Tests for the failover supervisor's health checks
+"""
+from app import config, failover, icmp, netinfo
+
+
+def fake_ping(results):
+    return lambda hosts, **kwargs: {host: results[host] for host in hosts}
+
+
+def setup(monkeypatch, results):
+    monkeypatch.setattr(config, 'FAILOVER_UPSTREAM_TARGETS', ['8.8.8.8', '1.1.1.1'])
+    monkeypatch.setattr(netinfo, 'default_gateway', lambda ifname=None: None)
+    monkeypatch.setattr(netinfo, 'interface_operstate', lambda ifname: 'up')
+    monkeypatch.setattr(netinfo, 'interface_ipv4', lambda ifname: '192.168.1.20')
+    monkeypatch.setattr(icmp, 'ping_many', fake_ping(results))
+
+
+def summary(host, received):
+    return {'type': 'summary', 'host': host, 'sent': 1, 'received': received}
+
+
+def error(host):
+    return {'type': 'error', 'host': host, 'error': 'Cannot open ICMP socket: Operation not permitted'}
+
+
+def test_one_target_answering_is_healthy(monkeypatch):
+    setup(monkeypatch, {'8.8.8.8': summary('8.8.8.8', 0), '1.1.1.1': summary('1.1.1.1', 1)})
+    assert failover.check_upstream() is None
+
+
+def test_no_replies_is_a_failure(monkeypatch):
+    setup(monkeypatch, {'8.8.8.8': summary('8.8.8.8', 0), '1.1.1.1': summary('1.1.1.1', 0)})
+    supervisor = failover.FailoverSupervisor(threshold=2)
+    assert supervisor.check() == 'upstream unreachable'
+    assert supervisor.failures == 1
+
+
+def test_probe_errors_are_unknown(monkeypatch):
+    setup(monkeypatch, {'8.8.8.8': error('8.8.8.8'), '1.1.1.1': error('1.1.1.1')})
+    assert failover.check_upstream() == failover.UPSTREAM_UNKNOWN
+
+    supervisor = failover.FailoverSupervisor(threshold=2)
+    supervisor.failures = 1
+    assert supervisor.check() is None
+    # Neither counted as a failure nor as a recovery
+    assert supervisor.failures == 1
+    assert supervisor.last_reason == failover.UPSTREAM_UNKNOWN
+
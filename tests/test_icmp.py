@@ -0,0 +1,116 @@
+"""
+Tests for the ICMP ping engine, including pings to 127.0.0.1
+"""
+import socket
+import threading
+
+import pytest
+
+from app import icmp
+
+
+def icmp_permitted():
+    try:
+        sock, _ = icmp.open_icmp_socket()
+    except OSError:
+        return False
+    sock.close()
+    return True
+
+
+needs_icmp = pytest.mark.skipif(not icmp_permitted(), reason='neither datagram nor raw ICMP sockets are permitted')
+
+
+def test_checksum_of_echo_request():
+    packet = icmp._echo_request(0x1234, 7)
+    assert icmp._checksum(packet) == 0
+
+
+def test_summarize():
+    stats = icmp.summarize([10.0, 20.0, 30.0], sent=4)
+    assert stats['received'] == 3
+    assert stats['packet_loss'] == 25.0
+    assert (stats['min_ms'], stats['avg_ms'], stats['max_ms']) == (10.0, 20.0, 30.0)
+    assert stats['jitter_ms'] == 10.0
+    assert stats['p50_ms'] == 20.0
+    assert icmp.summarize([], sent=2) == {'sent': 2, 'received': 0, 'packet_loss': 100.0}
+
+
+class CrossedRawSocket:
+    """Raw ICMP socket stand-in that receives only another ping's replies
+
+    Each echo request sent is answered, with the IP header a raw socket
+    would include, on the peer socket instead of this one.
+    """
+
+    def __init__(self):
+        self.reader, self.writer = socket.socketpair()
+        self.peer = None
+
+    def fileno(self):
+        return self.reader.fileno()
+
+    def sendto(self, packet, address):
+        _, _, _, ident, seq = icmp.ICMP_HEADER.unpack_from(packet)
+        reply = icmp.ICMP_HEADER.pack(icmp.ICMP_ECHO_REPLY, 0, 0, ident, seq)
+        self.peer.writer.send(bytes([0x45]) + bytes(19) + reply)
+
+    def recvfrom(self, size):
+        return self.reader.recv(size), ('127.0.0.1', 0)
+
+    def close(self):
+        self.reader.close()
+        self.writer.close()
+
+
+def test_replies_to_another_ping_are_ignored(monkeypatch):
+    first, second = CrossedRawSocket(), CrossedRawSocket()
+    first.peer, second.peer = second, first
+    sockets = iter([first, second])
+    monkeypatch.setattr(icmp, 'open_icmp_socket', lambda: (next(sockets), True))
+    # Started together, so each is still waiting when the other's reply arrives
+    started = threading.Barrier(2)
+    results = {}
+
+    def ping(name):
+        events = icmp.iter_ping(['127.0.0.1'], count=1, timeout=0.3)
+        started.wait()
+        results[name] = [event['type'] for event in events]
+
+    threads = [threading.Thread(target=ping, args=(name,)) for name in ('first', 'second')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {'first': ['timeout', 'summary'], 'second': ['timeout', 'summary']}
+
+
+def test_unresolvable_host():
+    events = list(icmp.iter_ping(['host.invalid'], count=1))
+    assert [event['type'] for event in events] == ['error']
+
+
+@needs_icmp
+def test_ping_loopback():
+    events = list(icmp.iter_ping(['127.0.0.1', 'localhost'], count=3, interval=0.05, timeout=1.0))
+    replies = [event for event in events if event['type'] == 'reply' and event['host'] == '127.0.0.1']
+    assert [event['seq'] for event in replies] == [0, 1, 2]
+    summaries = {event['host']: event for event in events if event['type'] == 'summary'}
+    # Both names resolve to 127.0.0.1 and share one probe stream
+    assert summaries['127.0.0.1']['received'] == summaries['localhost']['received'] == 3
+    assert summaries['127.0.0.1']['packet_loss'] == 0.0
+
+
+@needs_icmp
+def test_concurrent_pings_only_count_their_own_replies():
+    results = []
+
+    def ping():
+        results.append(icmp.ping_many(['127.0.0.1'], count=5, interval=0.02, timeout=1.0)['127.0.0.1'])
+
+    threads = [threading.Thread(target=ping) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [(result['sent'], result['received']) for result in results] == [(5, 5)] * 4
@@ -0,0 +1,125 @@
+"""
+Tests for the per-interface radio job queue
+"""
+import threading
+import time
+
+import pytest
+
+from app import jobs
+
+
+@pytest.fixture
+def executor():
+    return jobs.InterfaceExecutor('wlan-test')
+
+
+def blocker():
+    """A job function that runs until released, and an event set once it started"""
+    started, release = threading.Event(), threading.Event()
+
+    def fn():
+        started.set()
+        release.wait(5)
+        return True, 'released'
+
+    return fn, started, release
+
+
+def test_jobs_run_one_at_a_time_in_order(executor):
+    log = []
+    lock = threading.Lock()
+
+    def step(name):
+        def fn():
+            with lock:
+                log.append(('start', name))
+            time.sleep(0.02)
+            with lock:
+                log.append(('end', name))
+        return fn
+
+    submitted = [executor.submit('rescan', step(name)) for name in 'abc']
+    for job in submitted:
+        job.wait(5)
+    assert log == [('start', 'a'), ('end', 'a'), ('start', 'b'), ('end', 'b'), ('start', 'c'), ('end', 'c')]
+    assert [job.state for job in submitted] == [jobs.SUCCEEDED] * 3
+
+
+def test_cancel_while_queued(executor):
+    fn, started, release = blocker()
+    running = executor.submit('connect', fn)
+    assert started.wait(5)
+    ran = []
+    queued = executor.submit('forget', lambda: ran.append(True))
+    assert executor.pending() == 1
+
+    assert executor.cancel(queued.id) == (True, 'Job cancelled')
+    assert executor.cancel(running.id) == (False, 'Job is already running')
+    assert executor.cancel('missing') == (False, 'Job not found')
+    release.set()
+    assert running.wait(5) == (True, 'released')
+    with pytest.raises(jobs.JobCancelled):
+        queued.wait(5)
+    # The worker moves past the cancelled job without running it
+    assert executor.run('rescan', lambda: 'after') == 'after'
+    assert ran == []
+    assert queued.state == jobs.CANCELLED
+
+
+def test_run_inside_a_job_is_inline(executor):
+    def outer():
+        # Queueing behind itself would deadlock the single worker
+        return True, executor.run('rescan', lambda: threading.current_thread().name)
+
+    job = executor.submit('connect', outer)
+    assert job.wait(5) == (True, 'radio-wlan-test')
+    assert job.message == 'radio-wlan-test'
+    assert [j.kind for j in executor.jobs()] == ['connect']
+
+
+def test_results_and_callbacks(executor):
+    done = threading.Event()
+    seen = []
+
+    def on_done(job):
+        seen.append((job.state, job.message, job.result))
+        done.set()
+
+    def fn():
+        result['phase'] = 'associate'
+        return False, 'Wrong password'
+
+    result = {}
+    job = executor.submit('connect', fn, {'ssid': 'Home'}, on_done, result)
+    assert job.wait(5) == (False, 'Wrong password')
+    assert done.wait(5)
+    assert seen == [(jobs.FAILED, 'Wrong password', {'phase': 'associate'})]
+    assert job.to_dict()['params'] == {'ssid': 'Home'}
+    assert jobs.find_job(job.id) == (None, None)
+
+
+def test_exceptions_reach_the_caller(executor):
+    def fail():
+        raise RuntimeError('nmcli crashed')
+
+    with pytest.raises(RuntimeError, match='nmcli crashed'):
+        executor.run('forget', fail)
+    [job] = executor.jobs()
+    assert (job.state, job.message) == (jobs.FAILED, 'nmcli crashed')
+
+
+def test_callback_errors_do_not_stop_the_worker(executor):
+    def on_done(job):
+        raise ValueError('broken callback')
+
+    executor.submit('rescan', lambda: None, on_done=on_done).wait(5)
+    assert executor.run('rescan', lambda: 42) == 42
+
+
+def test_executor_per_interface():
+    assert jobs.get_executor('wlan-a') is jobs.get_executor('wlan-a')
+    assert jobs.get_executor('wlan-a') is not jobs.get_executor('wlan-b')
+    job = jobs.get_executor('wlan-a').submit('rescan', lambda: None)
+    job.wait(5)
+    assert jobs.find_job(job.id) == (job, jobs.get_executor('wlan-a'))
@@ -0,0 +1,60 @@
+"""
+Tests for the network state mirror
+"""
+import time
+
+import pytest
+
+from app import net_state, netinfo
+
+
+class FakeBackend:
+    def get_current_connection(self):
+        return {'connection_name': 'Home'}
+
+
+@pytest.fixture
+def kernel(monkeypatch):
+    """The uplink's address and gateway as netinfo reports them"""
+    current = {'ip': '192.168.1.20', 'gateway': '192.168.1.1'}
+    monkeypatch.setattr(netinfo, 'interface_ipv4', lambda ifname, with_prefix=False: current['ip'])
+    monkeypatch.setattr(netinfo, 'default_gateway', lambda ifname=None: current['gateway'])
+    monkeypatch.setattr(net_state, 'get_backend', FakeBackend)
+    monkeypatch.setattr(net_state, 'read_device', lambda interface: {
+        'device_state': '100 (connected)', 'dns_servers': ['192.168.1.1'],
+    })
+    return current
+
+
+def test_resync_keeps_one_address_field(kernel):
+    state = net_state.NetworkState('wlan0')
+    state.resync()
+    snapshot = state.snapshot()
+    assert set(snapshot) == set(net_state.empty_state())
+    assert snapshot['ip'] == '192.168.1.20'
+    assert snapshot['connection'] == {'connection_name': 'Home'}
+
+
+def test_ip_monitor_event_updates_the_address(kernel):
+    state = net_state.NetworkState('wlan0')
+    state.resync()
+    kernel['ip'] = '10.0.0.7'
+    state._on_line('ip', '3: wlan0    inet 10.0.0.7/24 brd 10.0.0.255 scope global dynamic wlan0')
+    assert state.get('ip') == '10.0.0.7'
+    # Other interfaces are ignored
+    kernel['ip'] = '172.16.0.1'
+    state._on_line('ip', '4: ap0    inet 172.16.0.1/24 scope global ap0')
+    assert state.get('ip') == '10.0.0.7'
+
+
+def test_stop_ends_the_monitors(kernel):
+    state = net_state.NetworkState('wlan0', monitors={'ip': ['sh', '-c', 'echo "3: wlan0 inet"; sleep 30']})
+    state.start()
+    deadline = time.monotonic() + 5
+    while not state.live and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert state.live
+    state.stop()
+    for thread in state._threads:
+        thread.join(5)
+        assert not thread.is_alive()
@@ -0,0 +1,106 @@
+"""
+Tests for app.netinfo against fixture /sys/class/net and /proc/net trees
+"""
+import pytest
+
+from app import config, netinfo
+
+ROUTE_HEADER = "Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\t\tMTU\tWindow\tIRTT\n"
+
+WIRELESS = (
+    "Inter-| sta-|   Quality        |   Discarded packets               | Missed | WE\n"
+    " face | tus | link level noise |  nwid  crypt   frag  retry   misc | beacon | 22\n"
+    " wlan0: 0000   56.  -54.  -256        0      0      0      0      0        0\n"
+)
+
+
+@pytest.fixture
+def roots(tmp_path, monkeypatch):
+    """Empty sysfs and procfs trees, returned as (sysfs, procfs)"""
+    sysfs = tmp_path / 'sys'
+    procfs = tmp_path / 'proc'
+    sysfs.mkdir()
+    procfs.mkdir()
+    monkeypatch.setattr(config, 'SYSFS_NET_ROOT', str(sysfs))
+    monkeypatch.setattr(config, 'PROCFS_NET_ROOT', str(procfs))
+    return sysfs, procfs
+
+
+def write_routes(procfs, *lines):
+    (procfs / 'route').write_text(ROUTE_HEADER + ''.join(line + '\n' for line in lines))
+
+
+def test_operstate(roots):
+    sysfs, _ = roots
+    (sysfs / 'wlan0').mkdir()
+    (sysfs / 'wlan0' / 'operstate').write_text('up\n')
+    assert netinfo.interface_exists('wlan0')
+    assert netinfo.interface_operstate('wlan0') == 'up'
+
+
+def test_missing_interface(roots):
+    assert not netinfo.interface_exists('wlan9')
+    assert netinfo.interface_operstate('wlan9') is None
+    assert netinfo.wireless_link('wlan9') is None
+
+
+def test_default_gateway_lowest_metric(roots):
+    _, procfs = roots
+    write_routes(
+        procfs,
+        # 192.168.1.1 via wlan0 (metric 600), 10.0.0.1 via eth0 (metric 100)
+        "wlan0\t00000000\t0101A8C0\t0003\t0\t0\t600\t00000000\t0\t0\t0",
+        "eth0\t00000000\t0100000A\t0003\t0\t0\t100\t00000000\t0\t0\t0",
+        "wlan0\t0001A8C0\t00000000\t0001\t0\t0\t600\t00FFFFFF\t0\t0\t0",
+    )
+    assert netinfo.default_gateway() == '10.0.0.1'
+    assert netinfo.default_gateway('wlan0') == '192.168.1.1'
+    assert netinfo.default_gateway('wlan1') is None
+
+
+def test_default_gateway_ignores_routes_that_are_down(roots):
+    _, procfs = roots
+    # RTF_GATEWAY without RTF_UP
+    write_routes(procfs, "wlan0\t00000000\t0101A8C0\t0002\t0\t0\t600\t00000000\t0\t0\t0")
+    assert netinfo.default_gateway('wlan0') is None
+
+
+def test_no_default_route(roots):
+    _, procfs = roots
+    write_routes(procfs, "wlan0\t0001A8C0\t00000000\t0001\t0\t0\t600\t00FFFFFF\t0\t0\t0")
+    assert netinfo.default_gateway() is None
+
+
+def test_empty_route_table(roots):
+    _, procfs = roots
+    write_routes(procfs)
+    assert netinfo.default_gateway() is None
+    (procfs / 'route').write_text('')
+    assert netinfo.default_gateway() is None
+
+
+def test_missing_route_table(roots):
+    assert netinfo.default_gateway() is None
+
+
+def test_wireless_link(roots):
+    _, procfs = roots
+    (procfs / 'wireless').write_text(WIRELESS)
+    assert netinfo.wireless_link('wlan0') == {'quality': 56, 'signal_dbm': -54, 'noise_dbm': -256}
+    assert netinfo.wireless_link('wlan1') is None
+
+
+def test_wireless_link_without_stations(roots):
+    _, procfs = roots
+    (procfs / 'wireless').write_text(WIRELESS.rsplit('\n', 2)[0] + '\n')
+    assert netinfo.wireless_link('wlan0') is None
+
+
+def test_interface_ipv4(monkeypatch):
+    monkeypatch.setattr(netinfo, 'ipv4_addresses', lambda: [
+        {'index': 1, 'ifname': 'lo', 'address': '127.0.0.1', 'prefixlen': 8},
+        {'index': 3, 'ifname': 'wlan0', 'address': '192.168.1.20', 'prefixlen': 24},
+    ])
+    assert netinfo.interface_ipv4('wlan0') == '192.168.1.20'
+    assert netinfo.interface_ipv4('wlan0', with_prefix=True) == '192.168.1.20/24'
+    assert netinfo.interface_ipv4('wlan1') is None
@@ -0,0 +1,273 @@
+"""
+Tests for the D-Bus backend against a fake NetworkManager on a private bus
+
+The fake service is served with jeepney from a thread. The tests are
+skipped unless dbus-python, jeepney and dbus-daemon are installed.
+"""
+import shutil
+import subprocess
+import threading
+import time
+
+import pytest
+
+dbus = pytest.importorskip('dbus')
+pytest.importorskip('jeepney')
+if shutil.which('dbus-daemon') is None:
+    pytest.skip('dbus-daemon is not installed', allow_module_level=True)
+
+from jeepney import HeaderFields, MessageType, new_error, new_method_return
+from jeepney.bus_messages import message_bus
+from jeepney.io.blocking import open_dbus_connection
+
+from app.backends import nm_dbus
+
+DEVICE = '/org/freedesktop/NetworkManager/Devices/1'
+
+# Argument types of the methods whose arguments dbus-python cannot guess
+INTROSPECTION = """<node>
+  <interface name="org.freedesktop.NetworkManager">
+    <method name="GetDeviceByIpIface">
+      <arg type="s" direction="in"/><arg type="o" direction="out"/>
+    </method>
+    <method name="ActivateConnection">
+      <arg type="o" direction="in"/><arg type="o" direction="in"/><arg type="o" direction="in"/>
+      <arg type="o" direction="out"/>
+    </method>
+    <method name="AddAndActivateConnection">
+      <arg type="a{sa{sv}}" direction="in"/><arg type="o" direction="in"/><arg type="o" direction="in"/>
+      <arg type="o" direction="out"/><arg type="o" direction="out"/>
+    </method>
+  </interface>
+</node>"""
+
+
+class FakeNetworkManager:
+    """Just enough of NetworkManager's D-Bus API for the backend
+
+    Property values and settings are kept as jeepney variants, i.e.
+    (signature, value) tuples.
+    """
+
+    def __init__(self, address):
+        self.conn = open_dbus_connection(bus=address)
+        self.conn.send_and_get_reply(message_bus.RequestName(nm_dbus.NM_BUS_NAME))
+        self.access_points = {}
+        self.connections = {}
+        self.active = {}
+        self.active_connection = '/'
+        self.device_state = 30
+        self.last_scan = 1000
+        self.activation_state = nm_dbus.ACTIVE_STATE_ACTIVATED
+        self.activated = []
+        self.calls = []
+        self._count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.conn.close()
+
+    def _path(self, kind):
+        self._count += 1
+        return f'{nm_dbus.NM_PATH}/{kind}/{self._count}'
+
+    def add_access_point(self, ssid, bssid, strength, frequency, rsn_flags=0):
+        path = self._path('AccessPoint')
+        self.access_points[path] = {
+            'Ssid': ('ay', ssid.encode()),
+            'HwAddress': ('s', bssid),
+            'Strength': ('y', strength),
+            'Frequency': ('u', frequency),
+            'MaxBitrate': ('u', 54000),
+            'Flags': ('u', nm_dbus.NM_802_11_AP_FLAGS_PRIVACY if rsn_flags else 0),
+            'WpaFlags': ('u', 0),
+            'RsnFlags': ('u', rsn_flags),
+        }
+        return path
+
+    def add_connection(self, ssid, name=None):
+        path = self._path('Settings')
+        self.connections[path] = {
+            'connection': {'id': ('s', name or ssid), 'type': ('s', '802-11-wireless')},
+            '802-11-wireless': {'ssid': ('ay', ssid.encode())},
+        }
+        return path
+
+    def _activate(self, connection, specific_object):
+        path = self._path('ActiveConnection')
+        self.activated.append((connection, specific_object))
+        self.active[path] = {
+            'Id': self.connections[connection]['connection']['id'],
+            'Connection': ('o', connection),
+            'State': ('u', self.activation_state),
+        }
+        if self.activation_state == nm_dbus.ACTIVE_STATE_ACTIVATED:
+            self.active_connection = path
+            self.device_state = 100
+        return path
+
+    def _properties(self, path, interface):
+        if path == DEVICE:
+            return {
+                nm_dbus.NM_DEVICE_IFACE: {
+                    'State': ('u', self.device_state),
+                    'ActiveConnection': ('o', self.active_connection),
+                },
+                nm_dbus.NM_WIRELESS_IFACE: {'LastScan': ('x', self.last_scan), 'Bitrate': ('u', 54000)},
+            }[interface]
+        if path in self.access_points:
+            return self.access_points[path]
+        return self.active[path]
+
+    def _handle(self, path, interface, member, args):
+        """(signature, body) of the reply; LookupError for unknown objects"""
+        if member == 'Introspect':
+            return 's', (INTROSPECTION if path == nm_dbus.NM_PATH else '<node/>',)
+        if interface == nm_dbus.PROPS_IFACE:
+            properties = self._properties(path, args[0])
+            if member == 'GetAll':
+                return 'a{sv}', (properties,)
+            return 'v', (properties[args[1]],)
+        if member == 'GetDeviceByIpIface':
+            return 'o', (DEVICE,)
+        if member == 'GetAllAccessPoints':
+            return 'ao', (list(self.access_points),)
+        if member == 'RequestScan':
+            self.last_scan += 1
+            return '', ()
+        if member == 'ListConnections':
+            return 'ao', (list(self.connections),)
+        if member == 'GetSettings':
+            return 'a{sa{sv}}', (self.connections[path],)
+        if member == 'Delete':
+            del self.connections[path]
+            return '', ()
+        if member == 'ActivateConnection':
+            return 'o', (self._activate(args[0], args[2]),)
+        if member == 'AddAndActivateConnection':
+            connection = self._path('Settings')
+            self.connections[connection] = args[0]
+            return 'oo', (connection, self._activate(connection, args[2]))
+        raise LookupError(member)
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                msg = self.conn.receive(timeout=0.1)
+            except TimeoutError:
+                continue
+            if msg.header.message_type != MessageType.method_call:
+                continue
+            fields = msg.header.fields
+            path, member = fields[HeaderFields.path], fields[HeaderFields.member]
+            self.calls.append((path, member))
+            try:
+                reply = new_method_return(msg, *self._handle(path, fields.get(HeaderFields.interface), member, msg.body))
+            except LookupError:
+                reply = new_error(msg, 'org.freedesktop.DBus.Error.UnknownObject', 's', (f"No {member} on {path}",))
+            self.conn.send(reply)
+
+
+@pytest.fixture
+def bus_address(tmp_path):
+    daemon = subprocess.Popen(
+        ['dbus-daemon', '--session', '--nofork', '--print-address', f'--address=unix:path={tmp_path}/bus'],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    yield daemon.stdout.readline().strip()
+    daemon.terminate()
+    daemon.wait()
+
+
+@pytest.fixture
+def fake(bus_address):
+    service = FakeNetworkManager(bus_address)
+    yield service
+    service.stop()
+
+
+@pytest.fixture
+def backend(fake, bus_address):
+    backend = nm_dbus.NetworkManagerDBusBackend('wlan0', bus_address)
+    yield backend
+    backend.bus.close()
+
+
+def test_scan_networks(fake, backend):
+    fake.add_access_point('Home', 'aa:bb:cc:00:00:01', 70, 2437, rsn_flags=0x188)
+    fake.add_access_point('Cafe', 'aa:bb:cc:00:00:02', 40, 5180)
+    networks = sorted(backend.scan_networks(), key=lambda n: n['ssid'])
+    assert networks == [
+        {'ssid': 'Cafe', 'bssid': 'AA:BB:CC:00:00:02', 'signal': 40, 'security': '',
+         'frequency': 5180, 'channel': 36, 'band': '5 GHz', 'rate': 54.0},
+        {'ssid': 'Home', 'bssid': 'AA:BB:CC:00:00:01', 'signal': 70, 'security': 'WPA2',
+         'frequency': 2437, 'channel': 6, 'band': '2.4 GHz', 'rate': 54.0},
+    ]
+
+
+def test_rescan_requests_a_scan(fake, backend):
+    fake.add_access_point('Home', 'aa:bb:cc:00:00:01', 70, 2437)
+    networks = backend.rescan(timeout=2)
+    assert (DEVICE, 'RequestScan') in fake.calls
+    assert [n['ssid'] for n in networks] == ['Home']
+
+
+def test_connect_adds_profile(fake, backend):
+    assert backend.connect('Home', 'secret123') == (True, '')
+    [settings] = fake.connections.values()
+    assert settings['802-11-wireless']['ssid'] == ('ay', b'Home')
+    assert settings['802-11-wireless-security']['psk'] == ('s', 'secret123')
+    assert backend.get_current_connection() == {'ssid': 'Home', 'connection_name': 'Home'}
+
+
+def test_connect_activates_saved_profile_on_access_point(fake, backend):
+    ap = fake.add_access_point('Home', 'aa:bb:cc:00:00:01', 70, 2437)
+    profile = fake.add_connection('Home', name='Home network')
+    assert backend.connect('Home', bssid='AA:BB:CC:00:00:01') == (True, '')
+    assert fake.activated == [(profile, ap)]
+    assert backend.get_current_connection() == {'ssid': 'Home', 'connection_name': 'Home network'}
+
+
+def test_connect_with_password_replaces_profile(fake, backend):
+    old = fake.add_connection('Home')
+    assert backend.connect('Home', 'newpass123') == (True, '')
+    assert old not in fake.connections
+    assert len(fake.connections) == 1
+
+
+def test_scan_does_not_wait_for_activation(fake, backend):
+    fake.add_access_point('Home', 'aa:bb:cc:00:00:01', 70, 2437)
+    fake.activation_state = 1
+    result = []
+    connecting = threading.Thread(target=lambda: result.append(backend.connect('Home', 'secret123')))
+    connecting.start()
+    while not fake.active:
+        time.sleep(0.01)
+
+    started = time.monotonic()
+    assert [n['ssid'] for n in backend.scan_networks()] == ['Home']
+    assert time.monotonic() - started < 1
+    assert backend.get_current_connection() is None
+
+    [active] = fake.active.values()
+    active['State'] = ('u', nm_dbus.ACTIVE_STATE_ACTIVATED)
+    connecting.join(timeout=5)
+    assert result == [(True, '')]
+
+
+def test_failed_activation(fake, backend):
+    fake.activation_state = nm_dbus.ACTIVE_STATE_DEACTIVATED
+    assert backend.connect('Home', 'wrongpass') == (False, 'Connection activation failed')
+    assert backend.get_current_connection() is None
+
+
+def test_delete_connection(fake, backend):
+    fake.add_connection('Home')
+    fake.add_connection('Cafe')
+    assert backend.delete_connection('Home') is True
+    assert [s['connection']['id'] for s in fake.connections.values()] == [('s', 'Cafe')]
+    assert backend.delete_connection('Home') is False
@@ -0,0 +1,125 @@
+"""
+Tests for single-flight scans, and scan versions and deltas across restarts
+"""
+import threading
+import time
+
+from app import wifi_manager
+from app.scan_cache import ScanCache
+
+
+def ap(ssid, signal):
+    return {'ssid': ssid, 'bssid': f'AA:BB:CC:00:00:{signal:02X}', 'signal': signal, 'security': 'WPA2',
+            'frequency': 2437, 'channel': 6, 'band': '2.4 GHz', 'rate': 54}
+
+
+def test_token_round_trip():
+    cache = ScanCache(10)
+    assert cache.version_from_token(cache.token(3)) == 3
+
+
+def test_token_from_another_process_is_rejected():
+    old, new = ScanCache(10), ScanCache(10)
+    assert new.version_from_token(old.token(3)) is None
+    assert new.version_from_token('3') is None
+    assert new.version_from_token(f'{new.epoch}-x') is None
+
+
+def test_delta_after_restart_sends_full_list(monkeypatch):
+    results = [[ap('Old', 50)], [ap('Old', 50), ap('New', 60)]]
+    before = ScanCache(0)
+    monkeypatch.setattr(wifi_manager, 'scan_cache', before)
+    monkeypatch.setattr(wifi_manager, '_fetch_access_points', lambda: results[0])
+    _, version = wifi_manager.scan_snapshot()
+    stale = wifi_manager.scan_token(version)
+
+    # A restarted process numbers its versions from 1 again
+    after = ScanCache(0)
+    monkeypatch.setattr(wifi_manager, 'scan_cache', after)
+    monkeypatch.setattr(wifi_manager, '_fetch_access_points', lambda: results[1])
+    networks, version, delta = wifi_manager.scan_delta(stale)
+    assert version == 1
+    assert delta is None
+    assert {n['ssid'] for n in networks} == {'Old', 'New'}
+
+
+def test_delta_within_process(monkeypatch):
+    results = [[ap('Old', 50)]]
+    monkeypatch.setattr(wifi_manager, 'scan_cache', ScanCache(0))
+    monkeypatch.setattr(wifi_manager, '_fetch_access_points', lambda: results[-1])
+    _, version = wifi_manager.scan_snapshot()
+    token = wifi_manager.scan_token(version)
+
+    results.append([ap('Old', 50), ap('New', 60)])
+    _, _, delta = wifi_manager.scan_delta(token)
+    assert [n['ssid'] for n in delta['added']] == ['New']
+    assert delta['removed'] == [] and delta['changed'] == []
+
+
+def run_together(count, target):
+    """Call target from count threads at once, returns their results"""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def call(i):
+        barrier.wait()
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def slow_fetch(calls, value=None, error=None):
+    def fetch():
+        calls.append(1)
+        # Long enough for every thread to join the flight
+        time.sleep(0.2)
+        if error:
+            raise error
+        return value
+    return fetch
+
+
+def test_concurrent_refreshes_fetch_once():
+    cache = ScanCache(0)
+    calls = []
+    results = run_together(8, lambda: cache.refresh_versioned(slow_fetch(calls, [ap('Home', 70)])))
+    assert len(calls) == 1
+    assert results == [([ap('Home', 70)], 1)] * 8
+
+    # A later refresh fetches again
+    cache.refresh(slow_fetch(calls, [ap('Home', 70)]))
+    assert len(calls) == 2
+
+
+def test_fetch_error_reaches_every_caller():
+    cache = ScanCache(0)
+    calls = []
+    results = run_together(4, lambda: cache.refresh(slow_fetch(calls, error=OSError('nmcli failed'))))
+    assert len(calls) == 1
+    assert all(isinstance(result, OSError) for result in results)
+
+
+def test_kinds_do_not_share_a_flight():
+    cache = ScanCache(0)
+    calls = []
+    run_together(2, lambda: cache.refresh(slow_fetch(calls, []), kind=threading.current_thread().name))
+    assert len(calls) == 2
+
+
+def test_get_uses_the_cache_within_the_ttl():
+    cache = ScanCache(60)
+    calls = []
+    assert cache.get(slow_fetch(calls, [ap('Home', 70)])) == [ap('Home', 70)]
+    assert cache.get(slow_fetch(calls, [])) == [ap('Home', 70)]
+    assert len(calls) == 1
+    cache.invalidate()
+    assert cache.get(slow_fetch(calls, [])) == []
+    assert len(calls) == 2
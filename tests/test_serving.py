@@ -0,0 +1,86 @@
+"""
+Tests for the capacity limiter in front of the production server
+"""
+import threading
+
+import pytest
+
+from app import serving
+
+
+@pytest.fixture(autouse=True)
+def not_draining():
+    serving.draining.clear()
+    yield
+    serving.draining.clear()
+
+
+def wsgi_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return iter([b'one', b'two', b'three'])
+
+
+def call(limiter, path):
+    statuses = []
+    body = limiter({'PATH_INFO': path}, lambda status, headers: statuses.append((status, dict(headers))))
+    return statuses[0], body
+
+
+def test_request_class():
+    assert serving.request_class('/api/events') == 'stream'
+    assert serving.request_class('/api/jobs/42/events') == 'stream'
+    assert serving.request_class('/api/rescan') == 'slow'
+    assert serving.request_class('/api/scan') == 'fast'
+    assert serving.request_class('/api/jobs/42') == 'fast'
+    assert serving.request_class('/') == 'fast'
+
+
+def test_full_pool_is_rejected_at_once():
+    limiter = serving.CapacityLimiter(wsgi_app, slow_slots=1, stream_slots=1)
+    (status, _), held = call(limiter, '/api/rescan')
+    assert status == '200 OK'
+
+    # Answered without waiting, from another thread as a worker would be
+    result = []
+    worker = threading.Thread(target=lambda: result.append(call(limiter, '/api/connect')))
+    worker.start()
+    worker.join(timeout=1)
+    assert not worker.is_alive()
+    (status, headers), _ = result[0]
+    assert status == '503 Service Unavailable'
+    assert headers['Retry-After'] == '5'
+
+    # Other classes are unaffected, and closing the response frees the slot
+    assert call(limiter, '/api/status')[0][0] == '200 OK'
+    assert call(limiter, '/api/events')[0][0] == '200 OK'
+    held.close()
+    assert call(limiter, '/api/connect')[0][0] == '200 OK'
+
+
+def test_draining_ends_streams_and_refuses_new_ones():
+    limiter = serving.CapacityLimiter(wsgi_app, slow_slots=1, stream_slots=1)
+    _, stream = call(limiter, '/api/events')
+    chunks = iter(stream)
+    assert next(chunks) == b'one'
+    serving.draining.set()
+    assert list(chunks) == []
+    stream.close()
+
+    assert call(limiter, '/api/events')[0][0] == '503 Service Unavailable'
+    assert call(limiter, '/api/rescan')[0][0] == '503 Service Unavailable'
+    # Fast requests still finish while draining
+    assert call(limiter, '/api/status')[0][0] == '200 OK'
+
+
+def test_slow_response_is_not_cut_short_by_draining():
+    limiter = serving.CapacityLimiter(wsgi_app, slow_slots=1, stream_slots=1)
+    _, body = call(limiter, '/api/rescan')
+    serving.draining.set()
+    assert list(body) == [b'one', b'two', b'three']
+    body.close()
+
+
+def test_slots_must_leave_fast_workers():
+    serving.check_capacity(16, 4, 6)
+    with pytest.raises(ValueError):
+        serving.check_capacity(10, 4, 6)